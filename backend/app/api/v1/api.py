@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import events, funnels, analyze, openai, analytics, users
+from app.api.v1.endpoints import events, funnels, analyze, openai, analytics, users, jobs, segments, metrics
 
 api_router = APIRouter()
 
@@ -9,6 +9,9 @@ api_router.include_router(events.router, prefix="/events", tags=["events"])
 # Funnel endpoints
 api_router.include_router(funnels.router, prefix="/funnels", tags=["funnels"])
 
+# Segment endpoints
+api_router.include_router(segments.router, prefix="/segments", tags=["segments"])
+
 # Analysis endpoints
 api_router.include_router(analyze.router, prefix="/analyze", tags=["analyze"])
 
@@ -19,4 +22,10 @@ api_router.include_router(openai.router, prefix="/openai", tags=["openai"])
 api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
 
 # Users endpoints
-api_router.include_router(users.router, prefix="/users", tags=["users"]) 
\ No newline at end of file
+api_router.include_router(users.router, prefix="/users", tags=["users"])
+
+# Background job endpoints
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+
+# Process metrics
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
@@ -1,13 +1,29 @@
-from fastapi import APIRouter, Depends
-from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional, List
+from datetime import datetime
 from app.services.openai_service import OpenAIService
 from app.services.prompts.funnel import FunnelCreationHandler
 from app.services.prompts.flow_analysis import FlowAnalysisPrompt
+from app.services.prompts.flow_insights import FlowInsightsHandler, MAX_FLOWS_TO_ANALYZE
 from app.services.prompts.segment import SegmentCreationHandler
-from app.dependencies import get_openai_service
+from app.services.user_behavior import UserBehaviorAnalyzer
+from app.services.analytics.paths import PathAnalyzer
+from app.services.analytics.sessions import Sessionizer
+from app.services.flows import FlowMetricsService
+from app.services.comparison import VersionComparisonService
+from app.services.retention import RetentionService
+from app.services.attributes import AttributeBreakdownService
+from app.data_access.interfaces import EventDataAccess, UserDataAccess
+from app.core.cancellation import ClientDisconnected, DisconnectGuard
+from app.core.singleflight import Coalescer
+from app.dependencies import (
+    get_openai_service, get_event_dao, get_user_dao, get_segment_user_ids, get_sessionizer, get_disconnect_guard,
+    get_coalescer
+)
 from fastapi import HTTPException
-import random
+import json
 
 router = APIRouter()
 
@@ -22,15 +38,39 @@ class SegmentCreationRequest(BaseModel):
     description: str
     context: Optional[Dict[str, Any]] = None
 
-MAX_FLOWS_TO_ANALYZE = 100  # Limit the number of flows to analyze
+class BatchUserBehaviorRequest(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    requests_per_minute: Optional[int] = Field(None, ge=1)
+    refresh: bool = False
+
+class VersionFlowAnalysisRequest(BaseModel):
+    question: str
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    max_flows: int = Field(MAX_FLOWS_TO_ANALYZE, ge=1, le=500)
+
+def openai_http_error(error: Exception) -> HTTPException:
+    """Map an OpenAI failure to the HTTP error returned to the client."""
+    error_message = str(error)
+    if "rate_limit_exceeded" in error_message or "tokens" in error_message.lower():
+        return HTTPException(
+            status_code=429,
+            detail="The analysis request was too large. Please try with a smaller time range or fewer events."
+        )
+    return HTTPException(
+        status_code=500,
+        detail=f"OpenAI service error: {error_message}"
+    )
 
 @router.post("/funnels/create")
 async def create_funnel(
     request: FunnelCreationRequest,
-    openai_service: OpenAIService = Depends(get_openai_service)
+    openai_service: OpenAIService = Depends(get_openai_service),
+    event_dao: EventDataAccess = Depends(get_event_dao)
 ):
-    """Create a new funnel based on the provided description."""
-    handler = FunnelCreationHandler(openai_service)
+    """Create a new funnel based on the provided description and the matching events."""
+    handler = FunnelCreationHandler(openai_service, event_dao)
     result = await handler.create_funnel(
         description=request.description,
         context=request.context
@@ -40,9 +80,16 @@ async def create_funnel(
 @router.post("/flows/analyze")
 async def analyze_flow(
     request: FlowAnalysisRequest,
-    openai_service: OpenAIService = Depends(get_openai_service)
+    openai_service: OpenAIService = Depends(get_openai_service),
+    guard: DisconnectGuard = Depends(get_disconnect_guard),
+    coalescer: Coalescer = Depends(get_coalescer)
 ):
-    """Analyze flow data and provide insights."""
+    """
+    Analyze flow data and provide insights.
+    
+    Identical concurrent requests share one OpenAI call, which is aborted once
+    every client waiting for it has disconnected.
+    """
     try:
         # Log the incoming request for debugging
         print("Received flow analysis request:", request.flow_data.keys())
@@ -56,191 +103,19 @@ async def analyze_flow(
         flows = request.flow_data["flows"]
         prompt = request.flow_data["prompt"]
         
-        # Sample flows if there are too many
-        if len(flows) > MAX_FLOWS_TO_ANALYZE:
-            print(f"Sampling {MAX_FLOWS_TO_ANALYZE} flows from {len(flows)} total flows")
-            # Sort flows by length to get a representative sample
-            flows.sort(key=lambda x: len(x["flow"]), reverse=True)
-            # Take a stratified sample: some from the top (longest flows), some from the middle, and some random
-            top_flows = flows[:MAX_FLOWS_TO_ANALYZE // 3]
-            middle_flows = flows[len(flows)//2 - MAX_FLOWS_TO_ANALYZE//6:len(flows)//2 + MAX_FLOWS_TO_ANALYZE//6]
-            remaining_count = MAX_FLOWS_TO_ANALYZE - len(top_flows) - len(middle_flows)
-            other_flows = random.sample(
-                [f for f in flows if f not in top_flows and f not in middle_flows],
-                min(remaining_count, len(flows) - len(top_flows) - len(middle_flows))
-            )
-            flows = top_flows + middle_flows + other_flows
-            random.shuffle(flows)  # Shuffle to avoid bias in the order
-        
-        # Format the flow data for analysis
-        formatted_flows = []
-        for flow in flows:
-            # Only include essential event data to reduce token count
-            formatted_flow = {
-                "user_id": flow["user_id"],
-                "events": [
-                    {
-                        "name": event["event_name"],
-                        "timestamp": event["timestamp"]
-                    }
-                    for event in flow["flow"]
-                ]
-            }
-            formatted_flows.append(formatted_flow)
-        
-        # Create a system message for the analysis
-        system_message = """You are an expert in analyzing user behavior flows, calculating conversion rates, and analyzing time-based patterns. 
-        Your task is to analyze the provided flow data and provide detailed insights about aggregate user behavior patterns.
-        
-        Important guidelines for time calculations:
-        1. FIRST calculate times for each individual flow:
-           - For each user flow, calculate:
-             * Total duration (time between first and last event)
-             * Duration of each step (time between consecutive events)
-             * Time between steps
-           - Explicitly identify and note:
-             * The first event in each flow
-             * The last event in each flow
-             * Whether the flow reached a completion event
-        2. THEN aggregate these individual calculations to get:
-           - Average and median times across all flows
-           - Time distributions and patterns
-           - Outlier detection and handling
-        3. Time calculation rules:
-           - Convert all timestamps to seconds/minutes for calculation
-           - Handle missing or invalid timestamps appropriately
-           - Exclude unreasonable time gaps (e.g., >24 hours) from calculations
-           - Note any time calculation assumptions made
-        
-        Other important guidelines:
-        1. ALWAYS calculate and include:
-           - Conversion rates between each step in the flow
-           - Time metrics for the entire flow and each step
-           - First and last events for each flow
-        2. Focus ONLY on aggregate patterns and trends across all users
-        3. NEVER mention individual user IDs or specific user behaviors
-        4. Use percentages and averages to describe patterns
-        5. Group similar behaviors into categories
-        6. Identify common paths and drop-off points
-        7. Provide actionable insights based on the overall data
-        
-        Format your response in a clear, structured way with emojis for better readability.
-        Note: The data provided is a sample of the total flows, so focus on patterns and trends rather than absolute numbers."""
-        
-        # Generate the analysis using OpenAI
-        prompt = f"""Please analyze the following user flow data and answer this specific question: {prompt}
-
-Flow Data (Sample of {len(formatted_flows)} flows from a larger dataset):
-{formatted_flows}
-
-Follow these steps for analysis:
-
-1. Flow Event Analysis (Do this first):
-   For each individual flow:
-   - Identify and note the first event
-   - Identify and note the last event
-   - Determine if the flow reached a completion event
-   - Calculate total flow duration (last event timestamp - first event timestamp)
-   - Calculate duration of each step (time between consecutive events)
-   - Calculate time between steps
-   - Note any unusual time gaps or patterns
-   - Convert all times to minutes for consistency
-
-2. Aggregate the individual calculations to get:
-   - Overall flow metrics
-   - Step-specific time metrics
-   - Time distributions
-   - Identify and handle outliers
-   - Common first and last events
-   - Completion rates
-
-3. Provide a detailed analysis with the following structure:
-
-📊 Overall Flow Metrics:
-- First Event Analysis:
-  * Most common first events
-  * Distribution of first events
-  * Average time from first event to next step
-- Last Event Analysis:
-  * Most common last events
-  * Distribution of last events
-  * Completion rate (flows ending with a completion event)
-- Total number of users who started the flow
-- Total number of users who completed the flow
-- Overall conversion rate (start to completion)
-- Time Metrics (based on individual flow calculations):
-  * Average total flow duration (in minutes)
-  * Median total flow duration (in minutes)
-  * 25th and 75th percentile durations
-  * Distribution of flow durations
-  * Any notable outliers or time patterns
-
-📈 Step-by-Step Analysis:
-For each step in the flow:
-- Number of users who reached this step
-- Conversion rate from previous step
-- Drop-off rate from previous step
-- Time Metrics (based on individual calculations):
-  * Average step duration (in minutes)
-  * Median step duration (in minutes)
-  * Time from flow start to this step
-  * Time between this step and next step
-  * Distribution of step durations
-  * Any notable time patterns or outliers
-
-⏱️ Time-Based Patterns:
-- Most common time patterns in the flow
-- Steps where users spend the most/least time
-- Correlation between time spent and conversion rates
-- Time-based drop-off patterns
-- Optimal flow duration for highest conversion
-- Any unusual time patterns or outliers
-- Time patterns from first to last event
-
-⚠️ Critical Drop-off Points:
-- Identify steps with highest drop-off rates
-- Calculate percentage of users lost at each critical point
-- Time spent before drop-off (based on individual calculations)
-- Analyze potential reasons for drop-offs
-- Common last events before drop-off
-
-💡 Key Insights:
-- Main patterns in user behavior
-- Most common paths through the flow
-- Time-based patterns and engagement metrics
-- Specific recommendations for improvement
-- Time optimization opportunities
-- Insights about flow completion and abandonment
-
-Format your response with clear sections and use emojis for better readability.
-Remember: Focus ONLY on aggregate patterns and NEVER mention individual users or user IDs.
-Note: This is a sample of the data, so focus on patterns and trends rather than absolute numbers.
-Include a note about any assumptions made in time calculations."""
-
-        print(f"Sending prompt to OpenAI with {len(formatted_flows)} flows")
-        
         try:
-            result = await openai_service.generate_completion(
-                prompt=prompt,
-                system_message=system_message,
-                temperature=0.7,
-                max_tokens=2000
-            )
+            handler = FlowInsightsHandler(openai_service)
+            result = await guard.run(coalescer.run(
+                lambda: handler.analyze(flows, prompt), "flow_analysis", payload=request.flow_data
+            ), "flow_analysis")
             
             print("Successfully received response from OpenAI")
             return {"result": result}
             
+        except ClientDisconnected:
+            raise
         except Exception as openai_error:
-            error_message = str(openai_error)
-            if "rate_limit_exceeded" in error_message or "tokens" in error_message.lower():
-                raise HTTPException(
-                    status_code=429,
-                    detail="The analysis request was too large. Please try with a smaller time range or fewer events."
-                )
-            raise HTTPException(
-                status_code=500,
-                detail=f"OpenAI service error: {error_message}"
-            )
+            raise openai_http_error(openai_error)
             
     except HTTPException as he:
         raise he
@@ -251,6 +126,45 @@ Include a note about any assumptions made in time calculations."""
             detail=f"Failed to analyze flows: {str(e)}"
         )
 
+@router.post("/flows/{version}/analyze")
+async def analyze_version_flows(
+    version: str,
+    request: VersionFlowAnalysisRequest,
+    user_ids: Optional[List[str]] = Depends(get_segment_user_ids),
+    sessionizer: Sessionizer = Depends(get_sessionizer),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    openai_service: OpenAIService = Depends(get_openai_service),
+    guard: DisconnectGuard = Depends(get_disconnect_guard)
+):
+    """
+    Answer a question about an app version's flows.
+    
+    Flows are sampled in the database and the prompt is built here, so the
+    request stays small no matter how many flows the version has. Sampling and
+    the OpenAI request are cancelled if the client disconnects.
+    """
+    flows = await guard.run(event_dao.sample_user_flows_by_version(
+        version,
+        request.max_flows,
+        start_ms=int(request.start_date.timestamp() * 1000) if request.start_date else None,
+        end_ms=int(request.end_date.timestamp() * 1000) if request.end_date else None,
+        user_ids=user_ids,
+        sessionizer=sessionizer
+    ), "version_flow_analysis")
+    if not flows:
+        raise HTTPException(status_code=404, detail=f"No flows found for version {version}")
+    
+    try:
+        result = await guard.run(
+            FlowInsightsHandler(openai_service).analyze(flows, request.question),
+            "version_flow_analysis"
+        )
+    except ClientDisconnected:
+        raise
+    except Exception as e:
+        raise openai_http_error(e)
+    return {"result": result, "sampled_flows": len(flows)}
+
 @router.post("/segments/create")
 async def create_segment(
     request: SegmentCreationRequest,
@@ -262,4 +176,186 @@ async def create_segment(
         description=request.description,
         context=request.context
     )
-    return {"result": result} 
\ No newline at end of file
+    return {"result": result} 
+
+@router.post("/users/behavior/batch")
+async def analyze_user_behavior_batch(
+    request: BatchUserBehaviorRequest,
+    openai_service: OpenAIService = Depends(get_openai_service),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    user_dao: UserDataAccess = Depends(get_user_dao)
+):
+    """
+    Analyze many users' behaviour concurrently.
+    
+    Results are streamed as newline-delimited JSON, one object per user, in
+    completion order. Users with a fresh cached analysis are returned first
+    with status "cached".
+    """
+    analyzer = UserBehaviorAnalyzer(openai_service, event_dao, user_dao)
+    
+    async def stream():
+        async for item in analyzer.analyze_batch(
+            request.user_ids,
+            max_concurrency=request.max_concurrency,
+            requests_per_minute=request.requests_per_minute,
+            refresh=request.refresh
+        ):
+            yield json.dumps(item) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.post("/users/{user_id}/behavior")
+async def analyze_user_behavior(
+    user_id: str,
+    refresh: bool = False,
+    openai_service: OpenAIService = Depends(get_openai_service),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    user_dao: UserDataAccess = Depends(get_user_dao)
+):
+    """Analyze one user's behaviour from a compact summary of their full event history."""
+    analyzer = UserBehaviorAnalyzer(openai_service, event_dao, user_dao)
+    analysis = await analyzer.analyze(user_id, refresh=refresh)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="No events found for user")
+    return analysis
+
+
+@router.get("/paths/{version}")
+async def analyze_paths(
+    version: str,
+    n: int = Query(3, ge=2, le=6, description="Longest event sequence to count"),
+    top_k: int = Query(10, ge=1, le=100, description="Entries to keep per ranking"),
+    depth: int = Query(5, ge=1, le=20, description="Steps from flow start shown in the Sankey diagram"),
+    user_ids: Optional[List[str]] = Depends(get_segment_user_ids),
+    sessionizer: Sessionizer = Depends(get_sessionizer),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    guard: DisconnectGuard = Depends(get_disconnect_guard)
+):
+    """
+    Top paths and transitions over all flows of an app version.
+    
+    Every flow is counted (no sampling). Returns Sankey-ready nodes and edges by
+    step position, the most common next/previous events for each event, and the
+    most frequent event sequences of length 2..n.
+    """
+    async def analyze():
+        analyzer = PathAnalyzer(n=n, top_k=top_k, depth=depth)
+        async for flow in event_dao.iter_user_flows_by_version(
+            version, user_ids=user_ids, include_attributes=False, sessionizer=sessionizer
+        ):
+            analyzer.add_names(event["event_name"] for event in flow["flow"])
+        return analyzer.to_dict()
+    
+    return await guard.run(analyze(), "paths")
+
+@router.get("/flows/{version}/metrics")
+async def get_flow_metrics(
+    version: str,
+    top_k: int = Query(10, ge=1, le=100, description="Entry, exit and overall events to report"),
+    parallel: Optional[bool] = Query(None, description="Force or disable multi-process execution (default: by input size)"),
+    user_ids: Optional[List[str]] = Depends(get_segment_user_ids),
+    sessionizer: Sessionizer = Depends(get_sessionizer),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    guard: DisconnectGuard = Depends(get_disconnect_guard)
+):
+    """
+    Flow metrics over every flow of an app version: flow and user counts,
+    events per flow, flow durations and the most common entry and exit events.
+    """
+    return await guard.run(FlowMetricsService(event_dao).compute(
+        version,
+        user_ids=user_ids,
+        sessionizer=sessionizer,
+        parallel=parallel,
+        top_k=top_k
+    ), "flow_metrics")
+
+@router.get("/compare")
+async def compare_versions(
+    base: str = Query(..., description="Baseline app version"),
+    candidate: str = Query(..., description="App version to compare against the baseline"),
+    top_k: int = Query(10, ge=1, le=50, description="Entries per ranked delta"),
+    narrative: bool = Query(False, description="Also generate an LLM summary of the diff"),
+    user_ids: Optional[List[str]] = Depends(get_segment_user_ids),
+    sessionizer: Sessionizer = Depends(get_sessionizer),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    openai_service: OpenAIService = Depends(get_openai_service),
+    guard: DisconnectGuard = Depends(get_disconnect_guard)
+):
+    """
+    Compare the flows of two app versions.
+    
+    Both versions are summarised concurrently on the server. Returns each
+    version's summary and the deltas in step conversion, flow length, path
+    distribution and entry/exit events; with narrative=true the LLM explains
+    the diff (raw flows are never sent).
+    """
+    service = VersionComparisonService(event_dao, openai_service)
+    return await guard.run(service.compare(
+        base,
+        candidate,
+        sessionizer=sessionizer,
+        user_ids=user_ids,
+        top_k=top_k,
+        narrative=narrative
+    ), "version_comparison")
+
+@router.get("/attributes")
+async def get_attribute_breakdown(
+    event_name: str = Query(..., description="Event whose attributes to summarise"),
+    version: Optional[str] = Query(None, description="Only events of users who launched this app version"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    top_k: int = Query(10, ge=1, le=100, description="Most frequent values to report per attribute"),
+    bins: int = Query(10, ge=1, le=100, description="Histogram bins for numeric attributes"),
+    user_ids: Optional[List[str]] = Depends(get_segment_user_ids),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    guard: DisconnectGuard = Depends(get_disconnect_guard),
+    coalescer: Coalescer = Depends(get_coalescer)
+):
+    """
+    Attribute breakdown of an event: for each attribute key, the most frequent
+    values with counts, the share of events where it is missing or null and,
+    for numeric values, percentiles and a histogram.
+    
+    Computed in one pass over the matching events with bounded-size sketches;
+    value counts are exact unless an attribute has more than 1000 distinct values.
+    """
+    return await guard.run(coalescer.run(
+        lambda: AttributeBreakdownService(event_dao).compute(
+            event_name,
+            version=version,
+            user_ids=user_ids,
+            start_date=start_date,
+            end_date=end_date,
+            top_k=top_k,
+            bins=bins
+        ),
+        "attribute_breakdown"
+    ), "attribute_breakdown")
+
+@router.get("/retention")
+async def get_retention(
+    weeks: int = Query(8, ge=1, le=104, description="Weekly first-seen cohorts to report, ending with the current week"),
+    offsets: List[int] = Query([1, 7, 30], description="Days after first seen to report (D1, D7, ...)"),
+    versions: Optional[List[str]] = Query(None, description="App versions to report separately (default: all users)"),
+    user_ids: Optional[List[str]] = Depends(get_segment_user_ids),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    guard: DisconnectGuard = Depends(get_disconnect_guard)
+):
+    """
+    Retention cohort matrix: for each week's newly seen users (per app version
+    if requested), the share active again exactly N days after their first event.
+    
+    Rates only count users whose day N has passed; cohorts marked final can no
+    longer change and are served from cache.
+    """
+    if not offsets or any(offset < 1 for offset in offsets):
+        raise HTTPException(status_code=400, detail="Offsets must be positive numbers of days")
+    return await guard.run(RetentionService(event_dao).compute(
+        versions=versions,
+        weeks=weeks,
+        offsets=offsets,
+        user_ids=user_ids
+    ), "retention")
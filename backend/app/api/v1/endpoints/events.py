@@ -1,25 +1,144 @@
-from fastapi import APIRouter, Depends, Query
-from typing import Optional
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from datetime import datetime
 from app.data_access.base import EventDataAccess
-from app.dependencies import get_event_dao
+from app.core.cancellation import DisconnectGuard
+from app.core.conditional import ConditionalGet
+from app.core.singleflight import Coalescer
+from app.dependencies import (
+    get_coalescer, get_conditional_get, get_disconnect_guard, get_event_dao, get_segment_user_ids, get_sessionizer
+)
+from app.services.analytics.sessions import Sessionizer
+from app.services.flow_cache import FlowCacheService
+from app.services.export import FILE_EXTENSIONS, MEDIA_TYPES, ExportFormat, export_available, export_events
+from app.services.wire import ContentEncoding, WireFormat, encode_flows, negotiate
 
 router = APIRouter()
 
 @router.get("/names")
-async def get_event_names(event_dao: EventDataAccess = Depends(get_event_dao)):
-    """Get all unique event names."""
-    return await event_dao.get_event_names() 
+async def get_event_names(
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    coalescer: Coalescer = Depends(get_coalescer),
+    conditional: ConditionalGet = Depends(get_conditional_get)
+):
+    """
+    Get all unique event names. Concurrent requests share one scan.
+    
+    Returns 304 if If-None-Match holds the current ETag (no event inserted since).
+    """
+    watermark = await event_dao.get_insert_watermark()
+    not_modified = conditional.check(watermark, "event_names")
+    if not_modified:
+        return not_modified
+    # Shared and cached results are keyed by the watermark the ETag was built from
+    return await coalescer.run(event_dao.primary_reads().get_event_names, "event_names", payload=watermark)
 
 @router.get("/versions")
-async def get_app_versions(event_dao: EventDataAccess = Depends(get_event_dao)):
-    """Get all unique app versions from App Launched events."""
-    return await event_dao.get_app_versions()
+async def get_app_versions(
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    coalescer: Coalescer = Depends(get_coalescer),
+    conditional: ConditionalGet = Depends(get_conditional_get)
+):
+    """
+    Get all unique app versions from App Launched events. Concurrent requests share one scan.
+    
+    Returns 304 if If-None-Match holds the current ETag (no event inserted since).
+    """
+    watermark = await event_dao.get_insert_watermark()
+    not_modified = conditional.check(watermark, "app_versions")
+    if not_modified:
+        return not_modified
+    return await coalescer.run(event_dao.primary_reads().get_app_versions, "app_versions", payload=watermark)
 
 @router.get("/flows/{version}")
-async def get_user_flows(version: str, event_dao: EventDataAccess = Depends(get_event_dao)):
-    """Get all user flows for a specific app version."""
-    return await event_dao.get_user_flows_by_version(version)
+async def get_user_flows(
+    version: str,
+    request: Request,
+    response: Response,
+    user_ids: Optional[List[str]] = Depends(get_segment_user_ids),
+    sessionizer: Sessionizer = Depends(get_sessionizer),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    guard: DisconnectGuard = Depends(get_disconnect_guard),
+    coalescer: Coalescer = Depends(get_coalescer),
+    conditional: ConditionalGet = Depends(get_conditional_get)
+):
+    """
+    Get all user flows for a specific app version, optionally restricted to a segment.
+    
+    Flows are served from the flow cache, which only rescans users with new
+    events. Identical concurrent requests share one computation, which is
+    cancelled once every client waiting for it has disconnected.
+    
+    Without a segment, returns 304 if If-None-Match holds the current ETag (no
+    event inserted since). Segment members can change without new events, so
+    segment-filtered responses are not conditional.
+
+    Clients sending ``Accept: application/msgpack`` get the flows as columnar
+    MessagePack (see app.services.wire), compressed if Accept-Encoding allows.
+    """
+    wire_format, encoding = negotiate(request.headers.get("accept"), request.headers.get("accept-encoding"))
+    vary = {"Vary": "Accept, Accept-Encoding"}
+    response.headers.update(vary)
+    watermark = await event_dao.get_insert_watermark()
+    if user_ids is None:
+        not_modified = conditional.check(
+            watermark, "user_flows", variant=f"{wire_format.value}+{encoding.value}"
+        )
+        if not_modified:
+            not_modified.headers.update(vary)
+            return not_modified
+    flows = await guard.run(coalescer.run(
+        lambda: FlowCacheService(event_dao).get_user_flows_by_version(
+            version, user_ids=user_ids, sessionizer=sessionizer
+        ),
+        "user_flows",
+        payload=watermark
+    ), "user_flows")
+    if wire_format == WireFormat.JSON:
+        return flows
+
+    body = await asyncio.to_thread(encode_flows, flows, encoding)
+    # A returned Response doesn't inherit headers set on the injected one
+    headers = {**conditional.headers, **vary}
+    if encoding != ContentEncoding.IDENTITY:
+        headers["Content-Encoding"] = encoding.value
+    return Response(content=body, media_type="application/msgpack", headers=headers)
+
+@router.get("/export")
+async def export_events_endpoint(
+    format: ExportFormat = Query(ExportFormat.ARROW, description="arrow (IPC stream) or parquet"),
+    user_id: Optional[str] = Query(None, description="Filter events by user ID"),
+    name: Optional[str] = Query(None, description="Filter events by name"),
+    start_date: Optional[datetime] = Query(None, description="Filter events after this date"),
+    end_date: Optional[datetime] = Query(None, description="Filter events before this date"),
+    batch_size: int = Query(10000, ge=1, le=100000, description="Events per record batch / row group"),
+    event_dao: EventDataAccess = Depends(get_event_dao)
+):
+    """
+    Stream all matching events as an Arrow IPC stream or a Parquet file.
+    
+    Attributes are flattened into typed attr.<key> columns; values that don't
+    fit a column are kept as JSON in attributes_other.
+    """
+    if not export_available():
+        raise HTTPException(status_code=501, detail="Event export requires pyarrow to be installed")
+    
+    stream = export_events(
+        event_dao,
+        format,
+        start_date=start_date,
+        end_date=end_date,
+        name=name,
+        user_id=user_id,
+        batch_size=batch_size
+    )
+    return StreamingResponse(
+        stream,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="events.{FILE_EXTENSIONS[format]}"'}
+    )
 
 @router.get("/")
 async def get_events(
@@ -1,49 +1,78 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Optional
-from pydantic import BaseModel
-from datetime import datetime
+from typing import List
+from app.data_access.interfaces import EventDataAccess, FunnelDataAccess
+from app.dependencies import get_event_dao, get_funnel_dao, get_job_manager
+from app.models.funnel import Funnel, FunnelStep
+from app.models.job import Job
+from app.services.funnels import FunnelService
+from app.services.jobs import JobManager
 
 router = APIRouter()
 
-class FunnelStep(BaseModel):
-    name: str
-    count: int
-    conversion_rate: float
-
-class Funnel(BaseModel):
-    id: Optional[str] = None
-    name: str
-    description: Optional[str] = None
-    steps: List[FunnelStep]
-    created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
+def get_funnel_service(
+    funnel_dao: FunnelDataAccess = Depends(get_funnel_dao),
+    event_dao: EventDataAccess = Depends(get_event_dao)
+) -> FunnelService:
+    return FunnelService(funnel_dao, event_dao)
 
 @router.post("/", response_model=Funnel)
-async def create_funnel(funnel: Funnel):
-    """Create a new funnel."""
-    # TODO: Implement funnel creation logic
-    return funnel
+async def create_funnel(
+    funnel: Funnel,
+    service: FunnelService = Depends(get_funnel_service),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """
+    Create a new funnel.
+    
+    Only the step names of the submitted steps are used; counts and conversion
+    rates are computed by a background refresh job queued here.
+    """
+    created = await service.create(funnel)
+    await job_manager.submit("funnel_refresh", {"funnel_id": created.id})
+    return created
 
 @router.get("/{funnel_id}", response_model=Funnel)
-async def get_funnel(funnel_id: str):
-    """Get a funnel by ID."""
-    # TODO: Implement funnel retrieval logic
-    raise HTTPException(status_code=404, detail="Funnel not found")
+async def get_funnel(funnel_id: str, service: FunnelService = Depends(get_funnel_service)):
+    """Get a funnel by ID, with its results as of its last refresh."""
+    funnel = await service.funnel_dao.get_funnel(funnel_id)
+    if funnel is None:
+        raise HTTPException(status_code=404, detail="Funnel not found")
+    return funnel
 
 @router.get("/", response_model=List[Funnel])
-async def list_funnels():
+async def list_funnels(service: FunnelService = Depends(get_funnel_service)):
     """List all funnels."""
-    # TODO: Implement funnel listing logic
-    return []
+    return await service.funnel_dao.list_funnels()
 
 @router.put("/{funnel_id}", response_model=Funnel)
-async def update_funnel(funnel_id: str, funnel: Funnel):
-    """Update a funnel."""
-    # TODO: Implement funnel update logic
-    raise HTTPException(status_code=404, detail="Funnel not found")
+async def update_funnel(
+    funnel_id: str,
+    funnel: Funnel,
+    service: FunnelService = Depends(get_funnel_service),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """Update a funnel. Changing steps, window or version recomputes its results."""
+    updated, needs_refresh = await service.update(funnel_id, funnel)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Funnel not found")
+    if needs_refresh:
+        await job_manager.submit("funnel_refresh", {"funnel_id": funnel_id})
+    return updated
 
 @router.delete("/{funnel_id}")
-async def delete_funnel(funnel_id: str):
+async def delete_funnel(funnel_id: str, service: FunnelService = Depends(get_funnel_service)):
     """Delete a funnel."""
-    # TODO: Implement funnel deletion logic
-    raise HTTPException(status_code=404, detail="Funnel not found") 
\ No newline at end of file
+    if not await service.delete(funnel_id):
+        raise HTTPException(status_code=404, detail="Funnel not found")
+    return {"message": "Funnel deleted"}
+
+@router.post("/{funnel_id}/refresh", response_model=Job, status_code=202)
+async def refresh_funnel(
+    funnel_id: str,
+    service: FunnelService = Depends(get_funnel_service),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """Queue an incremental refresh of the funnel's results from new events."""
+    if await service.funnel_dao.get_funnel(funnel_id) is None:
+        raise HTTPException(status_code=404, detail="Funnel not found")
+    return await job_manager.submit("funnel_refresh", {"funnel_id": funnel_id})
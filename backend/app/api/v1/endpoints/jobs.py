@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Any
+from app.models.job import Job
+from app.services.jobs import JobManager, UnknownJobKind
+from app.dependencies import get_job_manager
+from app.services.job_handlers import job_manager as registered_jobs
+
+router = APIRouter()
+
+class JobSubmitRequest(BaseModel):
+    kind: str = Field(..., description=f"Job kind: {', '.join(sorted(registered_jobs.handlers))}")
+    params: Dict[str, Any] = Field(default_factory=dict)
+    priority: int = Field(0, description="Higher priority jobs are started first")
+
+@router.post("/", response_model=Job, status_code=202)
+async def submit_job(
+    request: JobSubmitRequest,
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """
+    Submit a long-running analysis.
+    
+    If an identical job is already queued or running, that job is returned instead.
+    """
+    try:
+        return await job_manager.submit(request.kind, request.params, request.priority)
+    except UnknownJobKind as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """Get a job's status and progress."""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}/events")
+async def subscribe_job(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """Stream status and progress updates as server-sent events until the job finishes."""
+    if await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def stream():
+        async for job in job_manager.subscribe(job_id):
+            yield f"event: status\ndata: {job.model_dump_json()}\n\n"
+    
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """Get the result of a finished job."""
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job.status.finished:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status.value}")
+    if job.error:
+        raise HTTPException(status_code=500, detail=job.error)
+    return await job_manager.get_result(job_id)
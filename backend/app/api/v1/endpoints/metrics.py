@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from app.core.metrics import metrics
+
+router = APIRouter()
+
+@router.get("/")
+async def get_metrics():
+    """Process-wide counters and gauges, e.g. cancelled requests, killed database operations and the OpenAI queue."""
+    return metrics.snapshot()
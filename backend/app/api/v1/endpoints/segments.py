@@ -0,0 +1,96 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List
+from app.data_access.interfaces import EventDataAccess, SegmentDataAccess
+from app.dependencies import get_event_dao, get_segment_dao, get_job_manager
+from app.models.job import Job
+from app.models.segment import Segment, SegmentCombination
+from app.services.jobs import JobManager
+from app.services.segments import SegmentService, SegmentNotReady
+
+router = APIRouter()
+
+def get_segment_service(
+    segment_dao: SegmentDataAccess = Depends(get_segment_dao),
+    event_dao: EventDataAccess = Depends(get_event_dao)
+) -> SegmentService:
+    return SegmentService(segment_dao, event_dao)
+
+@router.post("/", response_model=Segment)
+async def create_segment(
+    segment: Segment,
+    service: SegmentService = Depends(get_segment_service),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """
+    Create a segment from conditions or from a combination of other segments.
+    
+    Members are computed by a background job queued here; user_count is set once it finishes.
+    """
+    segment = segment.model_copy(update={
+        "id": None, "user_count": None, "computed_at": None, "created_at": datetime.utcnow()
+    })
+    created = await service.segment_dao.create_segment(segment)
+    await job_manager.submit("segment_compute", {"segment_id": created.id})
+    return created
+
+@router.get("/", response_model=List[Segment])
+async def list_segments(service: SegmentService = Depends(get_segment_service)):
+    """List all segments."""
+    return await service.segment_dao.list_segments()
+
+@router.post("/combine")
+async def combine_segments(
+    combination: SegmentCombination,
+    service: SegmentService = Depends(get_segment_service)
+):
+    """Count the users of an AND/OR/NOT/ANDNOT combination of computed segments without saving it."""
+    try:
+        bitmap = await service.combine(combination)
+    except SegmentNotReady as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"user_count": bitmap.cardinality()}
+
+@router.get("/{segment_id}", response_model=Segment)
+async def get_segment(segment_id: str, service: SegmentService = Depends(get_segment_service)):
+    """Get a segment by ID, including its user count."""
+    segment = await service.segment_dao.get_segment(segment_id)
+    if segment is None:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return segment
+
+@router.get("/{segment_id}/users", response_model=List[str])
+async def get_segment_users(
+    segment_id: str,
+    limit: int = Query(100, ge=1, le=10000, description="Maximum number of user ids to return"),
+    service: SegmentService = Depends(get_segment_service)
+):
+    """List user ids in a computed segment."""
+    try:
+        bitmap = await service.get_bitmap(segment_id)
+    except SegmentNotReady as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    indices = []
+    for index in bitmap.indices():
+        if len(indices) >= limit:
+            break
+        indices.append(index)
+    return await service.segment_dao.get_user_ids(indices)
+
+@router.post("/{segment_id}/refresh", response_model=Job, status_code=202)
+async def refresh_segment(
+    segment_id: str,
+    service: SegmentService = Depends(get_segment_service),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    """Queue a recomputation of the segment's members."""
+    if await service.segment_dao.get_segment(segment_id) is None:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return await job_manager.submit("segment_compute", {"segment_id": segment_id})
+
+@router.delete("/{segment_id}")
+async def delete_segment(segment_id: str, service: SegmentService = Depends(get_segment_service)):
+    """Delete a segment."""
+    if not await service.segment_dao.delete_segment(segment_id):
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return {"message": "Segment deleted"}
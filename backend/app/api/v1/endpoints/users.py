@@ -21,13 +21,8 @@ async def search_user(
     Returns:
         The user if found, None otherwise
     """
-    # Try to find by user_id first
-    user = await user_dao.get_user_by_id(query)
-    if user:
-        return user
-        
-    # If not found by ID, try phone number
-    user = await user_dao.get_user_by_phone(query)
+    # Single lookup over user_id and phone_number (user_id match wins)
+    user = await user_dao.find_user(query)
     if user:
         return user
         
@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+# Returned by TTLCache.get when a key is absent or expired, so that ``None`` can be cached
+MISSING = object()
+
+
+class TTLCache(Generic[V]):
+    """
+    Bounded in-process LRU cache with per-entry time-to-live.
+
+    Entries are evicted least-recently-used first once ``max_size`` is reached,
+    and lazily dropped when read after their TTL. ``None`` is a valid cached
+    value, which makes the cache usable for negative caching; use ``MISSING``
+    to detect a miss.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for ``key``, or ``MISSING``."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V, ttl_seconds: Optional[float] = None) -> None:
+        """Cache ``value`` under ``key``, optionally overriding the default TTL."""
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SizedLRUCache(Generic[V]):
+    """
+    In-process LRU cache bounded by the total size of its entries.
+
+    Each entry is stored with a caller-supplied size (e.g. its serialised
+    length in bytes); least-recently-used entries are evicted until the total
+    fits in ``max_bytes``. An entry larger than ``max_bytes`` is not cached.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, V]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for ``key``, or ``MISSING``."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: V, size: int) -> None:
+        self.delete(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (size, value)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (evicted_size, _) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def delete(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,81 @@
+import asyncio
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import HTTPException, Request
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# Id of the guarded operation the current task works for. Data access objects
+# tag their database commands with it so that they can be killed server-side.
+current_operation: ContextVar[Optional[str]] = ContextVar("current_operation", default=None)
+
+class ClientDisconnected(HTTPException):
+    """The client went away before the response was ready; the work was cancelled."""
+
+    def __init__(self, operation: str):
+        # 499 (client closed request); nobody is left to read it
+        super().__init__(status_code=499, detail=f"Client disconnected during {operation}")
+
+class DisconnectGuard:
+    """
+    Runs an endpoint's work as a task and cancels it when the client disconnects.
+
+    Cancelling the task closes open database cursors and aborts in-flight OpenAI
+    requests (the HTTP connection is dropped). Database commands started by the
+    task are tagged with the operation id, and ``on_cancel`` is called with that
+    id to kill any that are still running on the server.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        on_cancel: Optional[Callable[[str], Awaitable[int]]] = None,
+        poll_interval: Optional[float] = None
+    ):
+        self.request = request
+        self.on_cancel = on_cancel
+        self.poll_interval = poll_interval or settings.DISCONNECT_POLL_INTERVAL_SECONDS
+
+    async def run(self, awaitable: Awaitable[Any], operation: str) -> Any:
+        """
+        Await ``awaitable``, checking every poll interval whether the client is still connected.
+
+        Raises:
+            ClientDisconnected: If the client disconnected and the work was cancelled
+        """
+        operation_id = f"{operation}:{uuid.uuid4().hex}"
+        token = current_operation.set(operation_id)
+        try:
+            # The task copies the current context, including the operation id
+            task = asyncio.ensure_future(awaitable)
+        finally:
+            current_operation.reset(token)
+
+        started = time.monotonic()
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.poll_interval)
+                if done:
+                    return task.result()
+                if await self.request.is_disconnected():
+                    break
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+        task.cancel()
+        killed = 0
+        if self.on_cancel:
+            try:
+                killed = await self.on_cancel(operation_id)
+            except Exception as e:
+                print(f"Error killing database operations of {operation_id}:", str(e))
+        await asyncio.gather(task, return_exceptions=True)
+
+        metrics.increment("requests_cancelled", operation=operation)
+        metrics.increment("cancelled_work_seconds", round(time.monotonic() - started, 3), operation=operation)
+        metrics.increment("database_operations_killed", killed, operation=operation)
+        print(f"Client disconnected; cancelled {operation} after {time.monotonic() - started:.1f}s")
+        raise ClientDisconnected(operation)
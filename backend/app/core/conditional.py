@@ -0,0 +1,67 @@
+import hashlib
+import json
+from typing import Dict, Optional
+from fastapi import Request, Response
+from app.core.metrics import metrics
+
+class ConditionalGet:
+    """
+    ETag and If-None-Match handling for responses that only depend on the
+    request and a data watermark (e.g. the id of the newest event).
+
+    The ETag is derived from the path, the sorted query parameters, the
+    watermark and the negotiated representation, so it is known before any
+    data is read. ``check`` sets the ETag and Cache-Control headers on the
+    response (and in ``headers``, for endpoints returning their own Response)
+    and returns a 304 response when the client already holds the current version.
+    """
+
+    def __init__(self, request: Request, response: Response, max_age: int = 0):
+        self.request = request
+        self.response = response
+        self.max_age = max_age
+        self.headers: Dict[str, str] = {}
+
+    def cache_control(self) -> str:
+        # Clients may reuse the response for max_age seconds, then must revalidate
+        if self.max_age > 0:
+            return f"private, max-age={self.max_age}, must-revalidate"
+        return "private, no-cache"
+
+    def etag(self, watermark: str, variant: str = "") -> str:
+        parts = [self.request.url.path, sorted(self.request.query_params.multi_items()), watermark, variant]
+        digest = hashlib.sha256(json.dumps(parts, separators=(",", ":")).encode()).hexdigest()[:32]
+        # Weak: equal watermarks mean equivalent data, not byte-identical encodings
+        return f'W/"{digest}"'
+
+    def _matches(self, etag: str) -> bool:
+        header = self.request.headers.get("if-none-match")
+        if not header:
+            return False
+        if header.strip() == "*":
+            return True
+        # Weak comparison (RFC 9110): ignore the W/ prefix on both sides
+        opaque = etag.removeprefix("W/")
+        return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+    def check(self, watermark: Optional[str], operation: str, variant: str = "") -> Optional[Response]:
+        """
+        Args:
+            watermark: Current data watermark; None (e.g. no data) disables caching
+            operation: Name used in metrics
+            variant: Negotiated representation (format, encoding), if the endpoint has several
+
+        Returns:
+            A 304 Not Modified response if the client's copy is current, else None
+            (the ETag is then set on the response being built)
+        """
+        if watermark is None:
+            self.headers = {"Cache-Control": "no-store"}
+        else:
+            etag = self.etag(watermark, variant)
+            self.headers = {"ETag": etag, "Cache-Control": self.cache_control()}
+            if self._matches(etag):
+                metrics.increment("http_not_modified", operation=operation)
+                return Response(status_code=304, headers=self.headers)
+        self.response.headers.update(self.headers)
+        return None
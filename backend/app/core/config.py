@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
@@ -12,7 +13,87 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "gpt-3.5-turbo"
     OPENAI_MAX_TOKENS: int = 1000
     OPENAI_TEMPERATURE: float = 0.7
+    OPENAI_BASE_URL: Optional[str] = None  # e.g. http://localhost:8001/v1 for the load-test stub
+    # Account budgets shared by all OpenAI calls in the process; 0 disables a limit.
+    # Calls queue by priority (interactive, batch, background) until budget is available.
+    OPENAI_REQUESTS_PER_MINUTE: int = 500
+    OPENAI_TOKENS_PER_MINUTE: int = 200_000
+    OPENAI_BURST_SECONDS: float = 10.0  # bucket size, in seconds of budget
+    OPENAI_RATE_LIMIT_RETRIES: int = 2  # requeues after a rate_limit_exceeded response
+    OPENAI_RATE_LIMIT_BACKOFF_SECONDS: float = 2.0  # pause when the response has no Retry-After
     
+    # User lookup cache
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 300
+    USER_CACHE_NEGATIVE_TTL_SECONDS: float = 30
+    
+    # Flow sessionisation: "launch", "inactivity" or "hybrid"
+    FLOW_SESSION_MODE: str = "launch"
+    FLOW_SESSION_GAP_MINUTES: int = 30
+    
+    # Flow metrics run on a process pool above this many events (workers: 0 = one per core)
+    FLOW_PARALLEL_WORKERS: int = 0
+    FLOW_PARALLEL_MIN_EVENTS: int = 2_000_000
+    
+    # In-memory cache of every flow of recently requested versions, updated incrementally
+    # as events arrive. Bounded by serialised (or compressed, with FLOW_CACHE_COMPRESS) size.
+    FLOW_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    FLOW_CACHE_COMPRESS: bool = False
+    
+    # User behaviour analysis
+    USER_BEHAVIOR_SESSION_GAP_MINUTES: int = 30
+    USER_BEHAVIOR_RECENT_EVENTS: int = 50
+    USER_BEHAVIOR_CACHE_TTL_SECONDS: float = 6 * 3600
+    USER_BEHAVIOR_CACHE_MAX_SIZE: int = 50000
+    USER_BEHAVIOR_BATCH_CONCURRENCY: int = 8
+    USER_BEHAVIOR_BATCH_REQUESTS_PER_MINUTE: int = 120
+    USER_BEHAVIOR_BATCH_FETCH_SIZE: int = 200
+    
+    # Background jobs
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_RESULT_TTL_SECONDS: int = 24 * 3600
+    JOB_OWNER_LEASE_SECONDS: int = 60  # unfinished jobs of a process silent for this long are taken over
+    
+    # Saved funnels
+    FUNNEL_STATE_BATCH_SIZE: int = 500
+    FUNNEL_REFRESH_INTERVAL_SECONDS: int = 300  # 0 disables periodic refresh
+    
+    # Event store used for reads: "mongodb", or "sqlite" for the local replica synced from MongoDB
+    EVENT_BACKEND: str = "mongodb"
+    SQLITE_EVENTS_PATH: str = "data/events.sqlite3"
+    EVENT_SYNC_BATCH_SIZE: int = 5000
+    EVENT_SYNC_INTERVAL_SECONDS: int = 0  # 0 disables periodic sync
+    
+    # MongoDB workload isolation: point lookups and analytical scans use separate clients
+    # (and connection pools) so that large aggregations can't starve interactive requests.
+    # Time budgets are server-side maxTimeMS limits; 0 disables the limit.
+    MONGODB_INTERACTIVE_MAX_POOL_SIZE: int = 100
+    MONGODB_INTERACTIVE_MAX_TIME_MS: int = 5000
+    MONGODB_ANALYTICS_URL: Optional[str] = None  # defaults to MONGODB_URL
+    MONGODB_ANALYTICS_MAX_POOL_SIZE: int = 10
+    MONGODB_ANALYTICS_MAX_TIME_MS: int = 300_000
+    MONGODB_ANALYTICS_ALLOW_DISK_USE: bool = True
+    MONGODB_ANALYTICS_READ_PREFERENCE: str = "primary"  # e.g. "secondaryPreferred"
+    # Per-operation budgets overriding the defaults above, keyed by DAO method name,
+    # e.g. MONGODB_MAX_TIME_MS_OVERRIDES='{"iter_event_batches": 0}'
+    MONGODB_MAX_TIME_MS_OVERRIDES: Dict[str, int] = {}
+    
+    # How often long-running requests check whether the client is still connected
+    DISCONNECT_POLL_INTERVAL_SECONDS: float = 1.0
+    
+    # Identical concurrent requests to expensive endpoints share one computation,
+    # and the result is reused for a few seconds to absorb the rest of the burst
+    COALESCE_RESULT_TTL_SECONDS: float = 10
+    COALESCE_CACHE_MAX_SIZE: int = 32
+    
+    # Catalogue and flow responses carry an ETag derived from the newest event id;
+    # clients may reuse them this long before revalidating (0: always revalidate)
+    HTTP_CACHE_MAX_AGE_SECONDS: int = 0
+
+    # Retention cohorts whose measurement window has closed are cached in-process
+    RETENTION_CACHE_MAX_SIZE: int = 10000
+    RETENTION_CACHE_TTL_SECONDS: float = 24 * 3600
+
     # Add more configuration variables as needed
     
     class Config:
@@ -0,0 +1,39 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+class Counters:
+    """
+    Process-wide counters and gauges, reported by GET /metrics.
+
+    Counters only increase; gauges (e.g. queue depths) are set to their
+    current value. Both are keyed by name and optional labels, rendered as
+    ``name{label="value"}``. Safe to update from worker threads.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> str:
+        if not labels:
+            return name
+        rendered = ",".join(f'{label}="{value}"' for label, value in sorted(labels.items()))
+        return f"{name}{{{rendered}}}"
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] += value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(sorted(self._values.items()))
+
+metrics = Counters()
@@ -0,0 +1,29 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from app.core.config import settings
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def worker_count() -> int:
+    """Configured number of CPU worker processes (defaults to the number of cores)."""
+    return settings.FLOW_PARALLEL_WORKERS or os.cpu_count() or 1
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Return the process-wide pool for CPU-bound analytics.
+
+    Created on first use so that API processes which never run large
+    computations don't start worker processes.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=worker_count())
+    return _pool
+
+def shutdown_process_pool():
+    """Stop the worker processes, e.g. on application shutdown."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
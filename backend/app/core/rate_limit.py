@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import List, Optional, Tuple
+from app.core.metrics import metrics
+
+class Priority(IntEnum):
+    """Scheduling class of a rate-limited call; lower values are served first."""
+    INTERACTIVE = 0  # a user is waiting for the response
+    BATCH = 1        # bulk work started by a user, e.g. batch behaviour analysis
+    BACKGROUND = 2   # jobs and periodic work
+
+class _Bucket:
+    """Token bucket refilled continuously at ``per_minute / 60`` per second, up to ``capacity``."""
+
+    def __init__(self, per_minute: float, capacity: float):
+        self.rate = per_minute / 60
+        self.capacity = capacity
+        self.level = capacity
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def refill(self, elapsed: float) -> None:
+        self.level = min(self.capacity, self.level + elapsed * self.rate)
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` is available (0 if it is, or if the bucket is disabled)."""
+        if not self.enabled or self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+class RateLimitScheduler:
+    """
+    Admits calls to a rate-limited API against requests-per-minute and
+    tokens-per-minute budgets, shared by every caller in the process.
+
+    Each budget is a token bucket holding ``burst_seconds`` worth of its rate,
+    so bursts are queued and released at the sustained rate instead of being
+    sent and rejected upstream. Waiting calls are served strictly by priority,
+    then in arrival order. A budget of 0 disables that limit.
+
+    Token costs are estimates made before the call; ``settle`` corrects the
+    bucket with the actual usage afterwards. Queue depth, scheduled calls and
+    total wait time per priority are reported as ``<name>_*`` metrics.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        burst_seconds: float = 10.0
+    ):
+        self.name = name
+        self.requests = _Bucket(requests_per_minute, max(1.0, requests_per_minute * burst_seconds / 60))
+        self.tokens = _Bucket(tokens_per_minute, max(1.0, tokens_per_minute * burst_seconds / 60))
+        self._queue: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, tokens: float, priority: Priority = Priority.INTERACTIVE) -> float:
+        """
+        Wait until one request and ``tokens`` tokens can be spent.
+
+        A call costing more than the token bucket holds is charged the full
+        bucket, so it waits for a full bucket instead of forever.
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.tokens.enabled:
+            tokens = min(tokens, self.tokens.capacity)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), tokens, future))
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            if not future.done():
+                self._report_depth()
+                await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the caller was cancelled; give the capacity back
+                self.requests.level += 1
+                self.tokens.level += tokens
+            self._dispatch()
+            raise
+        finally:
+            self._report_depth()
+
+        waited = time.monotonic() - started
+        label = priority.name.lower()
+        metrics.increment(f"{self.name}_requests_scheduled", priority=label)
+        metrics.increment(f"{self.name}_queue_wait_seconds", round(waited, 3), priority=label)
+        return waited
+
+    def settle(self, estimated: float, actual: float) -> None:
+        """Correct the token bucket once a call's actual token usage is known."""
+        if self.tokens.enabled and actual != estimated:
+            self.tokens.level += min(estimated, self.tokens.capacity) - actual
+            self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every waiting call for ``seconds``, e.g. after the API reported a rate limit."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        metrics.increment(f"{self.name}_rate_limited")
+
+    def _dispatch(self) -> None:
+        """Grant queued calls in priority order while capacity lasts, then arm a timer for the next."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        self.requests.refill(now - self._updated)
+        self.tokens.refill(now - self._updated)
+        self._updated = now
+
+        while self._queue:
+            _, _, tokens, future = self._queue[0]
+            if future.done():
+                # Cancelled while waiting
+                heapq.heappop(self._queue)
+                continue
+            delay = max(self._paused_until - now, self.requests.delay(1), self.tokens.delay(tokens))
+            if delay > 0:
+                self._timer = future.get_loop().call_later(delay, self._dispatch)
+                break
+            heapq.heappop(self._queue)
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+            future.set_result(None)
+
+    def _report_depth(self) -> None:
+        depths = {priority: 0 for priority in Priority}
+        for priority, _, _, future in self._queue:
+            if not future.done():
+                depths[Priority(priority)] += 1
+        for priority, depth in depths.items():
+            metrics.set(f"{self.name}_queue_depth", depth, priority=priority.name.lower())
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from fastapi import Request
+from app.core.cache import TTLCache, MISSING
+from app.core.cancellation import current_operation
+from app.core.metrics import metrics
+
+class _Flight:
+    """One in-flight computation and the number of callers waiting for it."""
+
+    def __init__(self, task: asyncio.Task, operation_id: str):
+        self.task = task
+        self.operation_id = operation_id
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one computation.
+
+    The first caller starts the work as a task; callers arriving while it runs
+    wait for the same task and all receive its result (or exception).
+    Successful results are kept for ``ttl_seconds`` so that the tail of a
+    burst is served from memory.
+
+    The task is only cancelled when every waiting caller has been cancelled
+    (e.g. all clients disconnected). It runs under its own operation id (see
+    app.core.cancellation), so one caller disconnecting never kills database
+    operations the others still wait for; ``on_cancel`` is called with that id
+    once the work is abandoned.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float,
+        max_size: int,
+        on_cancel: Optional[Callable[[str], Awaitable[int]]] = None
+    ):
+        self.name = name
+        self.results: TTLCache[Any] = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.on_cancel = on_cancel
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]], operation: str) -> Any:
+        """
+        Return the result for ``key``, from the cache, a running computation, or a new one.
+
+        Args:
+            key: Normalised identity of the request
+            factory: Starts the computation; only called when nothing is cached or running
+            operation: Name used in metrics and operation ids
+        """
+        cached = self.results.get(key)
+        if cached is not MISSING:
+            metrics.increment(f"{self.name}_cache_hits", operation=operation)
+            return cached
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._start(key, factory, operation)
+        else:
+            metrics.increment(f"{self.name}_coalesced", operation=operation)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                await self._abandon(key, flight, operation)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _start(self, key: Hashable, factory: Callable[[], Awaitable[Any]], operation: str) -> _Flight:
+        operation_id = f"{operation}:{uuid.uuid4().hex}"
+        token = current_operation.set(operation_id)
+        try:
+            # The task copies the current context, including the operation id
+            task = asyncio.ensure_future(factory())
+        finally:
+            current_operation.reset(token)
+        flight = _Flight(task, operation_id)
+        self._flights[key] = flight
+        task.add_done_callback(lambda done: self._finish(key, flight))
+        metrics.increment(f"{self.name}_started", operation=operation)
+        return flight
+
+    def _finish(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Reading the exception also marks it retrieved when no caller is left
+        if not flight.task.cancelled() and flight.task.exception() is None:
+            self.results.set(key, flight.task.result())
+
+    async def _abandon(self, key: Hashable, flight: _Flight, operation: str) -> None:
+        """Cancel work nobody waits for any more, and kill its database operations."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        flight.task.cancel()
+        if self.on_cancel:
+            try:
+                await self.on_cancel(flight.operation_id)
+            except Exception as e:
+                print(f"Error killing database operations of {flight.operation_id}:", str(e))
+        metrics.increment(f"{self.name}_abandoned", operation=operation)
+
+def request_key(request: Request, payload: Any = None) -> str:
+    """
+    Normalised identity of a request: its path, its query parameters in sorted
+    order and, if given, its parsed body with sorted keys.
+    """
+    parts = [request.url.path, sorted(request.query_params.multi_items())]
+    if payload is not None:
+        parts.append(payload)
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+class Coalescer:
+    """Runs an endpoint's work through a SingleFlight, keyed by the normalised request."""
+
+    def __init__(self, request: Request, flights: SingleFlight):
+        self.request = request
+        self.flights = flights
+
+    async def run(self, factory: Callable[[], Awaitable[Any]], operation: str, payload: Any = None) -> Any:
+        return await self.flights.run(request_key(self.request, payload), factory, operation)
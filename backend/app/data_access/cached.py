@@ -0,0 +1,81 @@
+from typing import Dict, List, Optional
+from app.core.cache import TTLCache, MISSING
+from app.core.config import settings
+from app.models.user import User
+from .interfaces import UserDataAccess
+
+# Shared across requests; holds both found users and "not found" (None) results
+user_cache: TTLCache[Optional[User]] = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS
+)
+
+class CachedUserDataAccess(UserDataAccess):
+    """
+    Read-through cache in front of another UserDataAccess implementation.
+    
+    Lookups are cached in the process-wide ``user_cache``. Not-found results are
+    cached too, with the shorter USER_CACHE_NEGATIVE_TTL_SECONDS, so repeated
+    searches for unknown ids or phone numbers don't reach the database.
+    """
+    
+    def __init__(self, dao: UserDataAccess, cache: TTLCache[Optional[User]] = user_cache):
+        self.dao = dao
+        self.cache = cache
+    
+    async def close(self):
+        await self.dao.close()
+    
+    def _store(self, key, user: Optional[User]):
+        if user is None:
+            self.cache.set(key, None, ttl_seconds=settings.USER_CACHE_NEGATIVE_TTL_SECONDS)
+        else:
+            self.cache.set(key, user)
+    
+    async def _cached(self, key, load) -> Optional[User]:
+        user = self.cache.get(key)
+        if user is MISSING:
+            user = await load()
+            self._store(key, user)
+        return user
+    
+    async def get_user_by_id(self, user_id: str) -> Optional[User]:
+        """Retrieve a user by their user_id."""
+        return await self._cached(("id", user_id), lambda: self.dao.get_user_by_id(user_id))
+    
+    async def get_user_by_phone(self, phone_number: str) -> Optional[User]:
+        """Retrieve a user by their phone number."""
+        return await self._cached(("phone", phone_number), lambda: self.dao.get_user_by_phone(phone_number))
+    
+    async def find_user(self, query: str) -> Optional[User]:
+        """Retrieve a user whose user_id or phone number matches the query."""
+        return await self._cached(("query", query), lambda: self.dao.find_user(query))
+    
+    async def get_users_by_ids(self, user_ids: List[str]) -> Dict[str, User]:
+        """Retrieve several users at once, fetching only cache misses from the database."""
+        users: Dict[str, User] = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            user = self.cache.get(("id", user_id))
+            if user is MISSING:
+                missing.append(user_id)
+            elif user is not None:
+                users[user_id] = user
+        
+        if missing:
+            found = await self.dao.get_users_by_ids(missing)
+            for user_id in missing:
+                user = found.get(user_id)
+                self._store(("id", user_id), user)
+                if user is not None:
+                    users[user_id] = user
+        return users
+    
+    async def create_user(self, user: User) -> User:
+        """Create a new user and replace any cached not-found results for it."""
+        created = await self.dao.create_user(user)
+        for key in (("id", created.user_id), ("phone", created.phone_number),
+                    ("query", created.user_id), ("query", created.phone_number)):
+            self.cache.delete(key)
+        self.cache.set(("id", created.user_id), created)
+        return created
@@ -0,0 +1,76 @@
+import random
+from collections import Counter
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from bson import ObjectId
+from app.services.analytics.sessions import Sessionizer, SessionMode
+
+# Event type constants
+APP_LAUNCHED_EVENT = "App Launched"
+APP_VERSION_ATTRIBUTE = "CT App Version"
+
+# Event ids are ObjectIds, which are only ordered to the second across writers;
+# changes are looked up from this long before an insert watermark
+INSERT_WATERMARK_SLACK_SECONDS = 5
+
+def insert_watermark_floor(watermark: str) -> ObjectId:
+    """Smallest event id that may have been inserted after ``watermark``."""
+    generated_at = ObjectId(watermark).generation_time
+    return ObjectId.from_datetime(generated_at - timedelta(seconds=INSERT_WATERMARK_SLACK_SECONDS))
+
+def split_user_flows(
+    user_id: str,
+    events: List[Dict[str, Any]],
+    sessionizer: Optional[Sessionizer] = None
+) -> List[Dict[str, Any]]:
+    """
+    Split one user's time-ordered events into flows, by default at App Launched events.
+    Duplicate events (same event name and timestamp) are removed.
+    """
+    sessionizer = sessionizer or Sessionizer(SessionMode.LAUNCH)
+    return [
+        {
+            "user_id": user_id,
+            "flow": [
+                {
+                    "event_name": event["name"],
+                    "event_attributes": event.get("attributes", {}),
+                    "timestamp": event["timestamp"]
+                }
+                for event in session
+            ]
+        }
+        for session in sessionizer.split(events)
+    ]
+
+def draw_launches(launch_counts: Dict[str, int], max_flows: int) -> Dict[str, int]:
+    """
+    Draw up to ``max_flows`` App Launched events uniformly without replacement,
+    given each user's number of launches.
+
+    Returns:
+        Number of launches drawn per user
+    """
+    users = list(launch_counts)
+    counts = [launch_counts[user_id] for user_id in users]
+    drawn = random.sample(users, min(max_flows, sum(counts)), counts=counts) if users else []
+    return dict(Counter(drawn))
+
+async def sample_flows_per_user(
+    user_event_groups: AsyncIterator[Tuple[str, List[Dict[str, Any]]]],
+    draws: Dict[str, int],
+    sessionizer: Optional[Sessionizer] = None
+) -> List[Dict[str, Any]]:
+    """
+    Sample ``draws[user_id]`` flows of each user from a stream of (user_id, events) groups.
+
+    With draws from uniformly drawn launch events (see draw_launches), users are
+    picked in proportion to their launch count, i.e. their flow count under the
+    default sessionizer, so every flow is about equally likely to be sampled
+    instead of low-activity users being over-represented.
+    """
+    sample = []
+    async for user_id, events in user_event_groups:
+        flows = split_user_flows(user_id, events, sessionizer)
+        sample.extend(random.sample(flows, min(draws.get(user_id, 0), len(flows))))
+    return sample
@@ -0,0 +1,17 @@
+from enum import Enum
+from typing import Optional, Union
+from app.core.config import settings
+from .interfaces import EventDataAccess
+from .mongodb import MongoEventDataAccess
+from .sqlite import SQLiteEventDataAccess
+
+class EventBackend(str, Enum):
+    MONGODB = "mongodb"  # primary store
+    SQLITE = "sqlite"    # local replica populated by the event sync job
+
+def create_event_dao(backend: Optional[Union[EventBackend, str]] = None) -> EventDataAccess:
+    """Create the event data access object for ``backend`` (default: the EVENT_BACKEND setting)."""
+    backend = EventBackend(backend or settings.EVENT_BACKEND)
+    if backend == EventBackend.SQLITE:
+        return SQLiteEventDataAccess()
+    return MongoEventDataAccess()
@@ -1,8 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 from datetime import datetime
 from app.models.event import Event
 from app.models.user import User
+from app.models.job import Job
+from app.models.funnel import Funnel
+from app.models.segment import Segment
+from app.services.analytics.sessions import Sessionizer
 
 class EventDataAccess(ABC):
     """Abstract base class for event data access implementations."""
@@ -52,13 +56,20 @@ class EventDataAccess(ABC):
         pass
 
     @abstractmethod
-    async def get_user_flows_by_version(self, version: str) -> List[Dict[str, Any]]:
+    async def get_user_flows_by_version(
+        self,
+        version: str,
+        user_ids: Optional[List[str]] = None,
+        sessionizer: Optional[Sessionizer] = None
+    ) -> List[Dict[str, Any]]:
         """
         Get all user flows for a specific app version.
-        A flow is a sequence of events from one App Launched to the next.
+        By default a flow is a sequence of events from one App Launched to the next.
         
         Args:
             version: The app version to filter by
+            user_ids: Optionally restrict to these users (e.g. a segment's members)
+            sessionizer: How to split histories into flows (launch, inactivity or hybrid rules)
             
         Returns:
             List of flows, where each flow contains:
@@ -74,7 +85,204 @@ class EventDataAccess(ABC):
                 ]
             }
         """
-        pass 
+        pass
+
+    @abstractmethod
+    def iter_user_flows_by_version(
+        self,
+        version: str,
+        user_ids: Optional[List[str]] = None,
+        include_attributes: bool = True,
+        sessionizer: Optional[Sessionizer] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the flows of get_user_flows_by_version one at a time.
+        
+        Args:
+            version: The app version to filter by
+            user_ids: Optionally restrict to these users
+            include_attributes: If False, event_attributes are left empty to reduce transfer
+            sessionizer: How to split histories into flows
+        """
+        pass
+
+    @abstractmethod
+    async def sample_user_flows_by_version(
+        self,
+        version: str,
+        max_flows: int,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        user_ids: Optional[List[str]] = None,
+        sessionizer: Optional[Sessionizer] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Randomly sample at most ``max_flows`` flows of an app version without reading all of them.
+        
+        Args:
+            version: The app version to filter by
+            max_flows: Maximum number of flows to return
+            start_ms: Only use events at or after this timestamp
+            end_ms: Only use events at or before this timestamp
+            user_ids: Optionally restrict to these users
+            sessionizer: How to split histories into flows
+            
+        Returns:
+            Flows in the format of get_user_flows_by_version, without event attributes
+        """
+        pass
+
+    @abstractmethod
+    def iter_event_batches(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        name: Optional[str] = None,
+        user_id: Optional[str] = None,
+        batch_size: int = 10000,
+        user_ids: Optional[List[str]] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Stream events matching the get_events filters as lists of raw dictionaries
+        (name, user_id, timestamp, attributes), for bulk export. No models are built.
+
+        With ``user_ids``, only events of these users are returned (queried in
+        batches of users, so batches follow no particular order).
+        """
+        pass
+
+    @abstractmethod
+    def iter_user_events(
+        self,
+        user_id: str,
+        fields: Optional[List[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a user's events in timestamp order.
+        
+        Args:
+            user_id: The user whose history to read
+            fields: Event fields to return (e.g. ["name", "timestamp"]); all fields if None
+        """
+        pass
+
+    @abstractmethod
+    def iter_events_for_users(
+        self,
+        user_ids: List[str],
+        fields: Optional[List[str]] = None,
+        batch_size: int = 200
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the events of many users, ordered by user_id and then timestamp.
+        
+        Args:
+            user_ids: The users whose histories to read
+            fields: Event fields to return; "user_id" is always included
+            batch_size: Number of users fetched per query
+        """
+        pass
+
+    @abstractmethod
+    async def get_version_user_ids(self, version: str, user_ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Retrieve the ids of all users with an App Launched event for the given app version.
+        
+        With ``user_ids``, only those of these users are returned.
+        """
+        pass
+
+    def primary_reads(self) -> "EventDataAccess":
+        """
+        A data access object whose reads see every event up to get_insert_watermark.
+
+        Results kept up to date incrementally from a watermark must be built
+        through it: a replica that lags behind the watermark would make them
+        skip events for good. The default is this object itself.
+        """
+        return self
+
+    @abstractmethod
+    async def get_insert_watermark(self) -> Optional[str]:
+        """Id of the most recently inserted event (ids increase in insertion order); None if empty."""
+        pass
+
+    @abstractmethod
+    async def get_users_inserted_after(self, watermark: str) -> List[str]:
+        """
+        Ids of users with events inserted after ``watermark`` (from get_insert_watermark).
+        
+        May include users whose events were inserted shortly before it, to allow
+        for concurrent writers whose ids are not strictly ordered.
+        """
+        pass
+
+    @abstractmethod
+    def iter_user_event_groups(
+        self,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        names: Optional[List[str]] = None,
+        user_ids: Optional[List[str]] = None,
+        fields: Optional[List[str]] = None,
+        inserted_after: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Stream matching events grouped by user.
+        
+        Yields (user_id, events) with each user's events in timestamp order, so
+        memory is bounded by one user's matching events.
+        
+        Args:
+            start_ms: Only events at or after this timestamp (ms)
+            end_ms: Only events at or before this timestamp (ms)
+            names: Only events with one of these names
+            user_ids: Only events of these users
+            fields: Event fields to return ("id" is the event id as a string); "user_id" is always included
+            inserted_after: Only events inserted after this event id, minus
+                INSERT_WATERMARK_SLACK_SECONDS (as in get_users_inserted_after)
+        """
+        pass
+
+    @abstractmethod
+    def iter_user_ids_by_event_count(
+        self,
+        name: Optional[str] = None,
+        start_ms: Optional[int] = None,
+        min_count: int = 1,
+        max_count: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the ids of users who performed an event between min_count and max_count times.
+        
+        With no name, any event counts (i.e. all users active since start_ms).
+        """
+        pass
+
+    @abstractmethod
+    def iter_user_active_days(
+        self,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        user_ids: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, List[int]]]:
+        """
+        Stream the days on which each user had at least one event.
+        
+        Yields (user_id, days) with days as sorted UTC day indices
+        (timestamp // 86_400_000), one entry per active day.
+        
+        Args:
+            start_ms: Only events at or after this timestamp (ms)
+            end_ms: Only events at or before this timestamp (ms)
+            user_ids: Only events of these users
+        """
+        pass
+
+    @abstractmethod
+    async def get_first_seen(self, user_ids: List[str]) -> Dict[str, int]:
+        """Timestamp (ms) of each user's earliest event; users without events are omitted."""
+        pass
 
 class UserDataAccess(ABC):
     """Abstract base class for user data access implementations."""
@@ -89,7 +297,187 @@ class UserDataAccess(ABC):
         """Retrieve a user by their phone number."""
         pass
     
+    @abstractmethod
+    async def find_user(self, query: str) -> Optional[User]:
+        """Retrieve a user whose user_id or phone number matches the query."""
+        pass
+    
+    @abstractmethod
+    async def get_users_by_ids(self, user_ids: List[str]) -> Dict[str, User]:
+        """Retrieve several users at once, keyed by user_id."""
+        pass
+    
     @abstractmethod
     async def create_user(self, user: User) -> User:
         """Create a new user."""
-        pass 
\ No newline at end of file
+        pass 
+
+class JobDataAccess(ABC):
+    """Abstract base class for background job storage implementations."""
+    
+    @abstractmethod
+    async def create_job(self, job: Job) -> Job:
+        """Store a new job."""
+        pass
+    
+    @abstractmethod
+    async def update_job(self, job: Job, result: Any = None) -> None:
+        """Persist the job's current state, and its result if given."""
+        pass
+    
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        """Retrieve a job by its ID."""
+        pass
+    
+    @abstractmethod
+    async def get_job_result(self, job_id: str) -> Any:
+        """Retrieve the stored result of a finished job, or None."""
+        pass
+    
+    @abstractmethod
+    async def get_unfinished_jobs(self) -> List[Job]:
+        """Retrieve the jobs that are still queued or running, oldest first."""
+        pass
+    
+    @abstractmethod
+    async def claim_job(self, job_id: str, previous_owner: Optional[str], owner: str) -> Optional[Job]:
+        """
+        Atomically re-queue an unfinished job under ``owner``, if it is still
+        owned by ``previous_owner``. Returns the claimed job, or None if it
+        finished or another process claimed it first.
+        """
+        pass
+    
+    @abstractmethod
+    async def renew_owner_lease(self, owner: str, expires_at: datetime) -> None:
+        """Record that the job manager ``owner`` is alive until ``expires_at``."""
+        pass
+    
+    @abstractmethod
+    async def release_owner_lease(self, owner: str) -> None:
+        """Drop the lease of a job manager that is shutting down."""
+        pass
+    
+    @abstractmethod
+    async def get_live_owners(self) -> List[str]:
+        """Job managers whose lease has not expired."""
+        pass
+
+
+class FunnelDataAccess(ABC):
+    """Abstract base class for saved funnel storage implementations."""
+    
+    @abstractmethod
+    async def create_funnel(self, funnel: Funnel) -> Funnel:
+        """Store a new funnel."""
+        pass
+    
+    @abstractmethod
+    async def get_funnel(self, funnel_id: str) -> Optional[Funnel]:
+        """Retrieve a funnel by its ID."""
+        pass
+    
+    @abstractmethod
+    async def list_funnels(self) -> List[Funnel]:
+        """Retrieve all funnels."""
+        pass
+    
+    @abstractmethod
+    async def update_funnel(self, funnel: Funnel) -> Optional[Funnel]:
+        """Replace a stored funnel. Returns None if it does not exist."""
+        pass
+    
+    @abstractmethod
+    async def delete_funnel(self, funnel_id: str) -> bool:
+        """Delete a funnel and its per-user progress. Returns False if it does not exist."""
+        pass
+    
+    @abstractmethod
+    async def get_user_states(self, funnel_id: str, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Retrieve per-user funnel progress, keyed by user_id."""
+        pass
+    
+    @abstractmethod
+    async def save_user_states(self, funnel_id: str, states: Dict[str, Dict[str, Any]]) -> None:
+        """Insert or replace per-user funnel progress."""
+        pass
+    
+    @abstractmethod
+    async def clear_user_states(self, funnel_id: str) -> None:
+        """Remove all per-user funnel progress and duration sketches, e.g. when the definition changes."""
+        pass
+    
+    @abstractmethod
+    async def get_duration_sketches(self, funnel_id: str) -> Dict[str, bytes]:
+        """Retrieve the funnel's serialised duration sketches, keyed by name."""
+        pass
+    
+    @abstractmethod
+    async def save_duration_sketches(self, funnel_id: str, sketches: Dict[str, bytes]) -> None:
+        """Replace the funnel's serialised duration sketches."""
+        pass
+
+
+class SegmentDataAccess(ABC):
+    """Abstract base class for segment storage and the user index mapping."""
+    
+    @abstractmethod
+    async def create_segment(self, segment: Segment) -> Segment:
+        """Store a new segment definition."""
+        pass
+    
+    @abstractmethod
+    async def get_segment(self, segment_id: str) -> Optional[Segment]:
+        """Retrieve a segment definition by its ID."""
+        pass
+    
+    @abstractmethod
+    async def list_segments(self) -> List[Segment]:
+        """Retrieve all segment definitions."""
+        pass
+    
+    @abstractmethod
+    async def delete_segment(self, segment_id: str) -> bool:
+        """Delete a segment. Returns False if it does not exist."""
+        pass
+    
+    @abstractmethod
+    async def save_segment_members(self, segment: Segment, bitmap: bytes) -> None:
+        """Store a segment's computed membership bitmap and counts."""
+        pass
+    
+    @abstractmethod
+    async def get_segment_members(self, segment_id: str) -> Optional[bytes]:
+        """Retrieve a segment's serialised membership bitmap, or None if not computed."""
+        pass
+    
+    @abstractmethod
+    async def get_user_indices(self, user_ids: List[str]) -> Dict[str, int]:
+        """Map user ids to dense integer indices, assigning new indices as needed."""
+        pass
+    
+    @abstractmethod
+    async def get_user_ids(self, indices: List[int]) -> List[str]:
+        """Map integer indices back to user ids."""
+        pass
+    
+    @abstractmethod
+    async def get_assigned_user_indices(self) -> List[int]:
+        """All indices mapped to a user (indices reserved by a losing concurrent caller are not)."""
+        pass
+    
+    @abstractmethod
+    async def get_user_index_size(self) -> int:
+        """Number of user indices assigned so far (all indices are below this)."""
+        pass
+    
+    @abstractmethod
+    async def get_user_index_watermark(self) -> Optional[str]:
+        """Insert watermark (EventDataAccess.get_insert_watermark) up to which all users with events have an index."""
+        pass
+    
+    @abstractmethod
+    async def set_user_index_watermark(self, watermark: str) -> None:
+        """Record that all users with events inserted up to watermark have an index."""
+        pass
@@ -1,29 +1,208 @@
+import json
+import random
+import zlib
+from enum import Enum
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
-from bson import ObjectId
+from pymongo import ASCENDING, ReadPreference, ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+from bson import ObjectId, Binary
 from .base import EventDataAccess
-from .interfaces import UserDataAccess
+from .interfaces import UserDataAccess, JobDataAccess, FunnelDataAccess, SegmentDataAccess
 from app.models.event import Event
 from app.models.user import User
+from app.models.job import Job, JobStatus
+from app.models.funnel import Funnel
+from app.models.segment import Segment
 from app.core.config import settings
+from app.core.cancellation import current_operation
+from app.core.metrics import metrics
+from app.services.analytics.retention import DAY_MS
+from app.services.analytics.sessions import Sessionizer
+from .common import (
+    APP_LAUNCHED_EVENT, APP_VERSION_ATTRIBUTE, insert_watermark_floor, split_user_flows, draw_launches,
+    sample_flows_per_user
+)
 
-# Event type constants
-APP_LAUNCHED_EVENT = "App Launched"
-APP_VERSION_ATTRIBUTE = "CT App Version"
+# Maximum number of user ids in a single $in query
+USER_ID_BATCH_SIZE = 1000
+
+class Workload(str, Enum):
+    """Kinds of database traffic that get their own connection pool and time budget."""
+    INTERACTIVE = "interactive"  # point lookups and small pages
+    ANALYTICS = "analytics"      # scans and aggregations over many events
+
+_clients: Dict[Workload, AsyncIOMotorClient] = {}
+
+def get_mongo_client(workload: Workload = Workload.INTERACTIVE) -> AsyncIOMotorClient:
+    """
+    Return the process-wide MongoDB client for a workload.
+
+    Each client owns a connection pool, so clients are created once and shared
+    by all data access objects instead of opening a new pool per request.
+    Interactive and analytical traffic use separate clients: long scans can only
+    exhaust the (smaller) analytics pool, and the analytics client can read from
+    secondaries or another host.
+    """
+    client = _clients.get(workload)
+    if client is None:
+        if workload == Workload.ANALYTICS:
+            client = AsyncIOMotorClient(
+                settings.MONGODB_ANALYTICS_URL or settings.MONGODB_URL,
+                maxPoolSize=settings.MONGODB_ANALYTICS_MAX_POOL_SIZE,
+                readPreference=settings.MONGODB_ANALYTICS_READ_PREFERENCE,
+                appname=f"{settings.PROJECT_NAME}-analytics"
+            )
+        else:
+            client = AsyncIOMotorClient(
+                settings.MONGODB_URL,
+                maxPoolSize=settings.MONGODB_INTERACTIVE_MAX_POOL_SIZE,
+                appname=settings.PROJECT_NAME
+            )
+        _clients[workload] = client
+    return client
+
+def close_mongo_client():
+    """Close the shared MongoDB clients, e.g. on application shutdown."""
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
+
+def max_time_ms(operation: str, workload: Workload) -> Optional[int]:
+    """
+    Server-side time budget (maxTimeMS) for a DAO operation, or None for no limit.
+    
+    MONGODB_MAX_TIME_MS_OVERRIDES takes precedence over the workload default.
+    """
+    if workload == Workload.ANALYTICS:
+        default = settings.MONGODB_ANALYTICS_MAX_TIME_MS
+    else:
+        default = settings.MONGODB_INTERACTIVE_MAX_TIME_MS
+    return settings.MONGODB_MAX_TIME_MS_OVERRIDES.get(operation, default) or None
+
+def _time_budget(operation: str, workload: Workload) -> Dict[str, int]:
+    """maxTimeMS keyword argument for commands (aggregate, count), if a budget applies."""
+    budget = max_time_ms(operation, workload)
+    return {"maxTimeMS": budget} if budget else {}
+
+def _operation_comment() -> Dict[str, str]:
+    """Tag commands with the current guarded operation (see app.core.cancellation), if any."""
+    operation_id = current_operation.get()
+    return {"comment": operation_id} if operation_id else {}
+
+async def _iterate(cursor):
+    """Iterate a cursor, killing it on the server if iteration stops early (e.g. on cancellation)."""
+    exhausted = False
+    try:
+        async for document in cursor:
+            yield document
+        exhausted = True
+    finally:
+        if not exhausted:
+            await cursor.close()
+            metrics.increment("mongo_cursors_closed_early")
+
+async def kill_operations(operation_id: str) -> int:
+    """
+    Kill the server-side operations tagged with ``operation_id`` on every client.
+    
+    Used when a client disconnects while a long aggregation or getMore is still
+    running. Requires the inprog and killop privileges.
+    
+    Operation ids are only meaningful on the server that reported them, so
+    operations are listed and killed on the same member, the primary. Reads
+    the analytics client sent to a secondary are not listed; they are bounded
+    by maxTimeMS, and their cursors are closed when iteration stops early.
+    
+    Returns:
+        Number of operations killed
+    """
+    pipeline = [
+        {"$currentOp": {}},
+        {"$match": {"$or": [
+            {"command.comment": operation_id},
+            {"cursor.originatingCommand.comment": operation_id}
+        ]}}
+    ]
+    killed = set()
+    for client in list(_clients.values()):
+        admin = client.get_database("admin", read_preference=ReadPreference.PRIMARY)
+        async for op in admin.aggregate(pipeline):
+            # Both clients may point at the same primary
+            key = (op.get("host"), op["opid"])
+            if key not in killed:
+                await admin.command("killOp", op=op["opid"], read_preference=ReadPreference.PRIMARY)
+                killed.add(key)
+    return len(killed)
 
 class MongoEventDataAccess(EventDataAccess):
-    """MongoDB implementation of event data access."""
+    """
+    MongoDB implementation of event data access.
     
-    def __init__(self):
+    Writes, single-user reads and paged queries run on the interactive client;
+    scans and aggregations run on the analytics client. Every read carries the
+    operation's maxTimeMS budget, and aggregations follow the allowDiskUse policy.
+
+    The insert watermark and the reads compared against it (events or users
+    inserted after a watermark) always run on the primary. The analytics client
+    may read a lagging secondary, so results computed from it could miss events
+    the watermark already covers; with ``read_primary`` the scans and
+    aggregations run on the primary too (see primary_reads).
+    """
+    
+    def __init__(self, read_primary: bool = False):
         """Initialize MongoDB connection using settings."""
-        self.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        self.client = get_mongo_client()
         self.db = self.client[settings.MONGODB_DATABASE]
         self.events_collection = self.db.events
+        self.primary_events = self.client.get_database(
+            settings.MONGODB_DATABASE, read_preference=ReadPreference.PRIMARY
+        ).events
+        self.read_primary = read_primary
+        if read_primary:
+            self.analytics_events = self.primary_events
+        else:
+            self.analytics_events = get_mongo_client(Workload.ANALYTICS)[settings.MONGODB_DATABASE].events
+    
+    def primary_reads(self) -> "MongoEventDataAccess":
+        """This data access object, with scans and aggregations on the primary."""
+        return self if self.read_primary else MongoEventDataAccess(read_primary=True)
+    
+    def _find(
+        self,
+        operation: str,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        workload: Workload = Workload.ANALYTICS,
+        primary: bool = False
+    ):
+        """find() on the workload's client (or the primary), with the operation's time budget."""
+        if primary:
+            collection = self.primary_events
+        else:
+            collection = self.analytics_events if workload == Workload.ANALYTICS else self.events_collection
+        return collection.find(
+            query, projection, max_time_ms=max_time_ms(operation, workload), **_operation_comment()
+        )
+    
+    def _aggregate(self, operation: str, pipeline: List[Dict[str, Any]], primary: bool = False):
+        """Analytical aggregation with the operation's time budget and the disk-use policy."""
+        collection = self.primary_events if primary else self.analytics_events
+        return collection.aggregate(
+            pipeline,
+            allowDiskUse=settings.MONGODB_ANALYTICS_ALLOW_DISK_USE,
+            **_time_budget(operation, Workload.ANALYTICS),
+            **_operation_comment()
+        )
     
     async def close(self):
-        """Close the MongoDB connection."""
-        self.client.close()
+        """Release the data access object. The shared client stays open."""
+        pass
+    
+    async def ensure_indexes(self):
+        """Create the indexes used by per-user history scans."""
+        await self.events_collection.create_index([("user_id", ASCENDING), ("timestamp", ASCENDING)])
     
     async def get_events(
         self,
@@ -50,18 +229,73 @@ class MongoEventDataAccess(EventDataAccess):
         if user_id:
             query["user_id"] = user_id
         
-        cursor = self.events_collection.find(query).skip(offset).limit(limit)
+        cursor = self._find("get_events", query, workload=Workload.INTERACTIVE).skip(offset).limit(limit)
         events = await cursor.to_list(length=limit)
         return [Event(**event) for event in events]
     
     async def get_event_by_id(self, event_id: str) -> Optional[Event]:
         """Retrieve a specific event by its ID."""
-        event = await self.events_collection.find_one({"_id": ObjectId(event_id)})
+        event = await self.events_collection.find_one(
+            {"_id": ObjectId(event_id)},
+            max_time_ms=max_time_ms("get_event_by_id", Workload.INTERACTIVE)
+        )
         return Event(**event) if event else None
     
     async def get_event_names(self) -> List[str]:
         """Retrieve all unique event names."""
-        return await self.events_collection.distinct("name")
+        # $group rather than distinct: it honours allowDiskUse and has no 16MB result limit
+        docs = await self._aggregate("get_event_names", [{"$group": {"_id": "$name"}}]).to_list(None)
+        return [doc["_id"] for doc in docs]
+    
+    async def iter_event_batches(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        name: Optional[str] = None,
+        user_id: Optional[str] = None,
+        batch_size: int = 10000,
+        user_ids: Optional[List[str]] = None
+    ):
+        """
+        Stream matching events as lists of raw documents, one list per cursor batch.
+
+        User id filters are split into batches of USER_ID_BATCH_SIZE.
+        """
+        query = {}
+        
+        if start_date or end_date:
+            query["timestamp"] = {}
+            if start_date:
+                query["timestamp"]["$gte"] = int(start_date.timestamp() * 1000)
+            if end_date:
+                query["timestamp"]["$lte"] = int(end_date.timestamp() * 1000)
+        
+        if name:
+            query["name"] = name
+        
+        if user_id:
+            query["user_id"] = user_id
+        
+        if user_ids is None:
+            queries = [query]
+        else:
+            user_ids = sorted(set(user_ids))
+            queries = [
+                {**query, "user_id": {"$in": user_ids[i:i + USER_ID_BATCH_SIZE]}}
+                for i in range(0, len(user_ids), USER_ID_BATCH_SIZE)
+            ]
+        
+        projection = {"_id": 0, "name": 1, "user_id": 1, "timestamp": 1, "attributes": 1}
+        batch = []
+        for batch_query in queries:
+            cursor = self._find("iter_event_batches", batch_query, projection).batch_size(batch_size)
+            async for event in _iterate(cursor):
+                batch.append(event)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
     
     async def get_event_count(
         self,
@@ -86,7 +320,9 @@ class MongoEventDataAccess(EventDataAccess):
         if user_id:
             query["user_id"] = user_id
         
-        return await self.events_collection.count_documents(query)
+        return await self.events_collection.count_documents(
+            query, **_time_budget("get_event_count", Workload.INTERACTIVE), **_operation_comment()
+        )
     
     async def create_event(self, event: Event) -> Event:
         """Create a new event."""
@@ -104,10 +340,15 @@ class MongoEventDataAccess(EventDataAccess):
             {"$sort": {"version": -1}}  # Sort versions in descending order
         ]
         
-        versions = await self.events_collection.aggregate(pipeline).to_list(None)
+        versions = await self._aggregate("get_app_versions", pipeline).to_list(None)
         return [doc["version"] for doc in versions if doc["version"] is not None]
 
-    async def get_user_flows_by_version(self, version: str) -> List[Dict[str, Any]]:
+    async def get_user_flows_by_version(
+        self,
+        version: str,
+        user_ids: Optional[List[str]] = None,
+        sessionizer: Optional[Sessionizer] = None
+    ) -> List[Dict[str, Any]]:
         """
         Get all user flows for a specific app version.
         A flow is a sequence of events from one App Launched to the next.
@@ -115,6 +356,8 @@ class MongoEventDataAccess(EventDataAccess):
         
         Args:
             version: The app version to filter by
+            user_ids: Optionally restrict to these users
+            sessionizer: How to split histories into flows (default: at App Launched)
             
         Returns:
             List of flows, where each flow contains:
@@ -130,99 +373,708 @@ class MongoEventDataAccess(EventDataAccess):
                 ]
             }
         """
-        # First, get all events for users who used this version
+        return [
+            flow async for flow in self.iter_user_flows_by_version(
+                version, user_ids=user_ids, sessionizer=sessionizer
+            )
+        ]
+
+    async def iter_user_flows_by_version(
+        self,
+        version: str,
+        user_ids: Optional[List[str]] = None,
+        include_attributes: bool = True,
+        sessionizer: Optional[Sessionizer] = None
+    ):
+        """
+        Stream user flows for a specific app version one at a time.
+        
+        Reads the version's users' events through the (user_id, timestamp)
+        index one user at a time, so memory is bounded by a single user's history.
+        """
+        version_user_ids = await self.get_version_user_ids(version)
+        if user_ids is not None:
+            version_user_ids = list(set(version_user_ids).intersection(user_ids))
+        
+        fields = ["name", "timestamp"]
+        if include_attributes:
+            fields.append("attributes")
+        
+        async for user_id, events in self.iter_user_event_groups(user_ids=version_user_ids, fields=fields):
+            for flow in split_user_flows(user_id, events, sessionizer):
+                yield flow
+
+    async def iter_events_after(self, after_id: Optional[str] = None, batch_size: int = 5000):
+        """
+        Stream raw event documents in insertion (_id) order, starting after ``after_id``.
+        Used to replicate events into other stores.
+        """
+        query = {"_id": {"$gt": ObjectId(after_id)}} if after_id else {}
+        cursor = self._find("iter_events_after", query, primary=True).sort("_id", ASCENDING).batch_size(batch_size)
+        async for event in _iterate(cursor):
+            yield event
+
+    async def iter_user_events(
+        self,
+        user_id: str,
+        fields: Optional[List[str]] = None
+    ):
+        """Stream a user's events in timestamp order using the (user_id, timestamp) index."""
+        projection = {field: 1 for field in fields} if fields else None
+        if projection is not None:
+            projection["_id"] = 0
+        cursor = self._find(
+            "iter_user_events", {"user_id": user_id}, projection, Workload.INTERACTIVE
+        ).sort("timestamp", ASCENDING)
+        async for event in _iterate(cursor):
+            yield event
+
+    async def iter_events_for_users(
+        self,
+        user_ids: List[str],
+        fields: Optional[List[str]] = None,
+        batch_size: int = 200
+    ):
+        """Stream several users' histories with one $in query per batch of users."""
+        projection = None
+        if fields:
+            projection = {field: 1 for field in fields}
+            projection.update({"user_id": 1, "_id": 0})
+        
+        user_ids = sorted(set(user_ids))
+        for i in range(0, len(user_ids), batch_size):
+            batch = user_ids[i:i + batch_size]
+            cursor = self._find(
+                "iter_events_for_users", {"user_id": {"$in": batch}}, projection
+            ).sort([("user_id", ASCENDING), ("timestamp", ASCENDING)])
+            async for event in _iterate(cursor):
+                yield event
+
+    async def iter_user_ids_by_event_count(
+        self,
+        name: Optional[str] = None,
+        start_ms: Optional[int] = None,
+        min_count: int = 1,
+        max_count: Optional[int] = None
+    ):
+        """Stream the ids of users who performed an event between min_count and max_count times."""
+        match = {"name": name} if name else {}
+        if start_ms is not None:
+            match["timestamp"] = {"$gte": start_ms}
+        count_filter = {"$gte": min_count}
+        if max_count is not None:
+            count_filter["$lte"] = max_count
         pipeline = [
-            # Match App Launched events with the specific version
-            {
-                "$match": {
-                    "name": APP_LAUNCHED_EVENT,
-                    f"attributes.{APP_VERSION_ATTRIBUTE}": version
-                }
-            },
-            # Get unique user IDs
-            {"$group": {"_id": "$user_id"}},
-            # Get all events for these users
-            {
-                "$lookup": {
-                    "from": "events",
-                    "let": {"userId": "$_id"},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$user_id", "$$userId"]}}},
-                        {"$sort": {"timestamp": 1}}  # Sort by timestamp ascending
-                    ],
-                    "as": "user_events"
-                }
+            {"$match": match},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+            {"$match": {"count": count_filter}}
+        ]
+        async for doc in _iterate(self._aggregate("iter_user_ids_by_event_count", pipeline)):
+            yield doc["_id"]
+
+    async def iter_user_active_days(
+        self,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        user_ids: Optional[List[str]] = None
+    ):
+        """
+        Stream the UTC days on which each user had at least one event.
+        
+        Events are reduced to distinct (user, day) pairs in Mongo, so only one
+        small document per user leaves the server.
+        """
+        match = {}
+        if start_ms is not None or end_ms is not None:
+            match["timestamp"] = {}
+            if start_ms is not None:
+                match["timestamp"]["$gte"] = start_ms
+            if end_ms is not None:
+                match["timestamp"]["$lte"] = end_ms
+        
+        if user_ids is None:
+            matches = [match]
+        else:
+            user_ids = sorted(set(user_ids))
+            matches = [
+                {**match, "user_id": {"$in": user_ids[i:i + USER_ID_BATCH_SIZE]}}
+                for i in range(0, len(user_ids), USER_ID_BATCH_SIZE)
+            ]
+        
+        for batch_match in matches:
+            pipeline = [
+                {"$match": batch_match},
+                {"$group": {"_id": {
+                    "user_id": "$user_id",
+                    "day": {"$floor": {"$divide": ["$timestamp", DAY_MS]}}
+                }}},
+                {"$group": {"_id": "$_id.user_id", "days": {"$push": "$_id.day"}}}
+            ]
+            async for doc in _iterate(self._aggregate("iter_user_active_days", pipeline)):
+                yield doc["_id"], sorted(int(day) for day in doc["days"])
+
+    async def get_first_seen(self, user_ids: List[str]) -> Dict[str, int]:
+        """Timestamp (ms) of each user's earliest event, read from the (user_id, timestamp) index."""
+        user_ids = sorted(set(user_ids))
+        first_seen = {}
+        for i in range(0, len(user_ids), USER_ID_BATCH_SIZE):
+            pipeline = [
+                {"$match": {"user_id": {"$in": user_ids[i:i + USER_ID_BATCH_SIZE]}}},
+                {"$sort": {"user_id": 1, "timestamp": 1}},
+                {"$group": {"_id": "$user_id", "timestamp": {"$first": "$timestamp"}}}
+            ]
+            async for doc in _iterate(self._aggregate("get_first_seen", pipeline)):
+                first_seen[doc["_id"]] = doc["timestamp"]
+        return first_seen
+
+    async def sample_user_flows_by_version(
+        self,
+        version: str,
+        max_flows: int,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        user_ids: Optional[List[str]] = None,
+        sessionizer: Optional[Sessionizer] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Randomly sample flows of an app version.
+        
+        Up to ``max_flows`` of the version's App Launched events are drawn with
+        $sample, and each drawn launch samples one flow of its user, so users
+        are weighted by their number of flows. Only the drawn users' events are read.
+        """
+        launch_match = {"name": APP_LAUNCHED_EVENT, f"attributes.{APP_VERSION_ATTRIBUTE}": version}
+        time_range = {}
+        if start_ms is not None:
+            time_range["$gte"] = start_ms
+        if end_ms is not None:
+            time_range["$lte"] = end_ms
+        if time_range:
+            launch_match["timestamp"] = time_range
+        
+        if user_ids is None:
+            pipeline = [
+                {"$match": launch_match},
+                {"$sample": {"size": max_flows}},
+                {"$group": {"_id": "$user_id", "launches": {"$sum": 1}}}
+            ]
+            draws = {
+                doc["_id"]: doc["launches"]
+                async for doc in self._aggregate("sample_user_flows_by_version", pipeline)
             }
+        else:
+            launch_counts = {}
+            user_ids = sorted(set(user_ids))
+            for i in range(0, len(user_ids), USER_ID_BATCH_SIZE):
+                pipeline = [
+                    {"$match": {**launch_match, "user_id": {"$in": user_ids[i:i + USER_ID_BATCH_SIZE]}}},
+                    {"$group": {"_id": "$user_id", "launches": {"$sum": 1}}}
+                ]
+                async for doc in self._aggregate("sample_user_flows_by_version", pipeline):
+                    launch_counts[doc["_id"]] = doc["launches"]
+            draws = draw_launches(launch_counts, max_flows)
+        
+        return await sample_flows_per_user(
+            self.iter_user_event_groups(
+                start_ms=start_ms,
+                end_ms=end_ms,
+                user_ids=list(draws),
+                fields=["name", "timestamp"]
+            ),
+            draws,
+            sessionizer
+        )
+
+    async def get_version_user_ids(self, version: str, user_ids: Optional[List[str]] = None) -> List[str]:
+        """Retrieve the ids of all users (optionally among ``user_ids``) with an App Launched event for the given app version."""
+        match = {"name": APP_LAUNCHED_EVENT, f"attributes.{APP_VERSION_ATTRIBUTE}": version}
+        if user_ids is None:
+            matches = [match]
+        else:
+            user_ids = sorted(set(user_ids))
+            matches = [
+                {**match, "user_id": {"$in": user_ids[i:i + USER_ID_BATCH_SIZE]}}
+                for i in range(0, len(user_ids), USER_ID_BATCH_SIZE)
+            ]
+        version_user_ids = []
+        for batch_match in matches:
+            pipeline = [{"$match": batch_match}, {"$group": {"_id": "$user_id"}}]
+            docs = await self._aggregate("get_version_user_ids", pipeline).to_list(None)
+            version_user_ids.extend(doc["_id"] for doc in docs)
+        return version_user_ids
+
+    async def get_insert_watermark(self) -> Optional[str]:
+        """Id of the most recently inserted event, read from the _id index."""
+        cursor = self._find(
+            "get_insert_watermark", {}, {"_id": 1}, Workload.INTERACTIVE, primary=True
+        ).sort("_id", -1).limit(1)
+        docs = await cursor.to_list(1)
+        return str(docs[0]["_id"]) if docs else None
+
+    async def get_users_inserted_after(self, watermark: str) -> List[str]:
+        """Ids of users with events inserted after ``watermark``, minus INSERT_WATERMARK_SLACK_SECONDS."""
+        pipeline = [
+            {"$match": {"_id": {"$gt": insert_watermark_floor(watermark)}}},
+            {"$group": {"_id": "$user_id"}}
         ]
+        docs = await self._aggregate("get_users_inserted_after", pipeline, primary=True).to_list(None)
+        return [doc["_id"] for doc in docs]
+
+    async def iter_user_event_groups(
+        self,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        names: Optional[List[str]] = None,
+        user_ids: Optional[List[str]] = None,
+        fields: Optional[List[str]] = None,
+        inserted_after: Optional[str] = None
+    ):
+        """
+        Stream matching events grouped by user.
         
-        user_events = await self.events_collection.aggregate(pipeline).to_list(None)
+        The cursor is sorted on the (user_id, timestamp) index, so consecutive
+        events of the same user form one group. User id filters are split into
+        batches of USER_ID_BATCH_SIZE.
+        """
+        query = {}
+        if start_ms is not None or end_ms is not None:
+            query["timestamp"] = {}
+            if start_ms is not None:
+                query["timestamp"]["$gte"] = start_ms
+            if end_ms is not None:
+                query["timestamp"]["$lte"] = end_ms
+        if names:
+            query["name"] = {"$in": list(names)}
+        if inserted_after is not None:
+            query["_id"] = {"$gt": insert_watermark_floor(inserted_after)}
+        # Events inserted after a watermark read from the primary must be read there too
+        primary = inserted_after is not None
         
-        flows = []
-        for user_doc in user_events:
-            user_id = user_doc["_id"]
-            events = user_doc["user_events"]
-            
-            # Split events into flows based on App Launched events
-            current_flow = []
-            seen_events = set()  # Track seen events to avoid duplicates
-            
-            for event in events:
-                # Create a unique key for the event using name and timestamp
-                event_key = f"{event['name']}_{event['timestamp']}"
-                
-                if event["name"] == APP_LAUNCHED_EVENT and current_flow:
-                    # End of a flow, save it and start a new one
-                    flows.append({
-                        "user_id": user_id,
-                        "flow": current_flow
-                    })
-                    current_flow = []
-                    seen_events.clear()  # Reset seen events for new flow
-                
-                # Only add event if we haven't seen it before
-                if event_key not in seen_events:
-                    seen_events.add(event_key)
-                    current_flow.append({
-                        "event_name": event["name"],
-                        "event_attributes": event.get("attributes", {}),
-                        "timestamp": event["timestamp"]
-                    })
-            
-            # Add the last flow if it exists
-            if current_flow:
-                flows.append({
-                    "user_id": user_id,
-                    "flow": current_flow
-                })
+        projection = None
+        with_id = bool(fields) and "id" in fields
+        if fields:
+            projection = {field: 1 for field in fields if field != "id"}
+            projection.update({"user_id": 1, "_id": int(with_id)})
+        
+        if user_ids is None:
+            queries = [query]
+        else:
+            user_ids = sorted(set(user_ids))
+            queries = [
+                {**query, "user_id": {"$in": user_ids[i:i + USER_ID_BATCH_SIZE]}}
+                for i in range(0, len(user_ids), USER_ID_BATCH_SIZE)
+            ]
         
-        return flows 
+        for batch_query in queries:
+            cursor = self._find("iter_user_event_groups", batch_query, projection, primary=primary).sort(
+                [("user_id", ASCENDING), ("timestamp", ASCENDING)]
+            )
+            current_id = None
+            events = []
+            async for event in _iterate(cursor):
+                if event["user_id"] != current_id:
+                    if events:
+                        yield current_id, events
+                    current_id = event["user_id"]
+                    events = []
+                if with_id:
+                    event["id"] = str(event.pop("_id"))
+                events.append(event)
+            if events:
+                yield current_id, events
 
 class MongoUserDataAccess(UserDataAccess):
     """MongoDB implementation of user data access."""
     
     def __init__(self):
         """Initialize MongoDB connection using settings."""
-        self.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        self.client = get_mongo_client()
         self.db = self.client[settings.MONGODB_DATABASE]
         self.users_collection = self.db.users
     
     async def close(self):
-        """Close the MongoDB connection."""
-        self.client.close()
+        """Release the data access object. The shared client stays open."""
+        pass
+    
+    async def ensure_indexes(self):
+        """Create the indexes used by user lookups."""
+        await self.users_collection.create_index([("user_id", ASCENDING)])
+        await self.users_collection.create_index([("phone_number", ASCENDING)])
     
     async def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Retrieve a user by their user_id."""
-        user = await self.users_collection.find_one({"user_id": user_id})
+        user = await self.users_collection.find_one(
+            {"user_id": user_id},
+            max_time_ms=max_time_ms("get_user_by_id", Workload.INTERACTIVE)
+        )
         return User.from_mongo(user) if user else None
     
     async def get_user_by_phone(self, phone_number: str) -> Optional[User]:
         """Retrieve a user by their phone number."""
-        user = await self.users_collection.find_one({"phone_number": phone_number})
+        user = await self.users_collection.find_one(
+            {"phone_number": phone_number},
+            max_time_ms=max_time_ms("get_user_by_phone", Workload.INTERACTIVE)
+        )
         return User.from_mongo(user) if user else None
     
+    async def find_user(self, query: str) -> Optional[User]:
+        """
+        Find a user whose user_id or phone number equals the query.
+        
+        Uses a single $or query over both indexed fields. A user_id match takes
+        precedence over a phone number match, as in separate sequential lookups,
+        even when several users share the phone number.
+        """
+        cursor = self.users_collection.aggregate([
+            {"$match": {"$or": [{"user_id": query}, {"phone_number": query}]}},
+            {"$addFields": {"_by_phone": {"$ne": ["$user_id", query]}}},
+            {"$sort": {"_by_phone": 1}},
+            {"$limit": 1},
+            {"$project": {"_by_phone": 0}}
+        ], **_time_budget("find_user", Workload.INTERACTIVE))
+        users = await cursor.to_list(length=1)
+        if not users:
+            return None
+        return User.from_mongo(users[0])
+    
+    async def get_users_by_ids(self, user_ids: List[str]) -> Dict[str, User]:
+        """Retrieve several users in one query, keyed by user_id. Unknown ids are omitted."""
+        if not user_ids:
+            return {}
+        cursor = self.users_collection.find(
+            {"user_id": {"$in": list(set(user_ids))}},
+            max_time_ms=max_time_ms("get_users_by_ids", Workload.INTERACTIVE)
+        )
+        users = await cursor.to_list(length=None)
+        return {user["user_id"]: User.from_mongo(user) for user in users}
+    
     async def create_user(self, user: User) -> User:
         """Create a new user."""
         user_dict = user.to_mongo()
         result = await self.users_collection.insert_one(user_dict)
         user_dict["_id"] = result.inserted_id
-        return User.from_mongo(user_dict) 
\ No newline at end of file
+        return User.from_mongo(user_dict) 
+
+class MongoJobDataAccess(JobDataAccess):
+    """MongoDB implementation of background job storage."""
+    
+    def __init__(self):
+        """Initialize MongoDB connection using settings."""
+        self.client = get_mongo_client()
+        self.db = self.client[settings.MONGODB_DATABASE]
+        self.jobs_collection = self.db.jobs
+        self.owners_collection = self.db.job_owners
+    
+    async def close(self):
+        """Release the data access object. The shared client stays open."""
+        pass
+    
+    async def ensure_indexes(self):
+        """Create the TTL indexes that remove expired jobs and job manager leases."""
+        await self.jobs_collection.create_index("expires_at", expireAfterSeconds=0)
+        await self.owners_collection.create_index("expires_at", expireAfterSeconds=0)
+    
+    async def create_job(self, job: Job) -> Job:
+        """Store a new job."""
+        await self.jobs_collection.insert_one(job.to_mongo())
+        return job
+    
+    async def update_job(self, job: Job, result: Any = None) -> None:
+        """
+        Persist the job's current state.
+        
+        Results are stored as zlib-compressed JSON to keep large results (e.g.
+        flow sets) well below the document size limit.
+        """
+        update = job.to_mongo()
+        del update["_id"]
+        if result is not None:
+            update["result"] = Binary(zlib.compress(json.dumps(result, default=str).encode()))
+        await self.jobs_collection.update_one({"_id": job.id}, {"$set": update})
+    
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        """Retrieve a job by its ID."""
+        job = await self.jobs_collection.find_one({"_id": job_id}, {"result": 0})
+        return Job.from_mongo(job) if job else None
+    
+    async def get_job_result(self, job_id: str) -> Any:
+        """Retrieve the stored result of a finished job, or None."""
+        job = await self.jobs_collection.find_one({"_id": job_id}, {"result": 1})
+        if not job or job.get("result") is None:
+            return None
+        return json.loads(zlib.decompress(job["result"]))
+    
+    async def get_unfinished_jobs(self) -> List[Job]:
+        """Retrieve the jobs that are still queued or running, oldest first."""
+        cursor = self.jobs_collection.find(
+            {"status": {"$in": [JobStatus.QUEUED.value, JobStatus.RUNNING.value]}}, {"result": 0}
+        ).sort("created_at", 1)
+        return [Job.from_mongo(job) async for job in cursor]
+    
+    async def claim_job(self, job_id: str, previous_owner: Optional[str], owner: str) -> Optional[Job]:
+        """Re-queue an unfinished job under ``owner`` if ``previous_owner`` still holds it."""
+        job = await self.jobs_collection.find_one_and_update(
+            {
+                "_id": job_id,
+                "status": {"$in": [JobStatus.QUEUED.value, JobStatus.RUNNING.value]},
+                # Also matches jobs stored before owners were recorded
+                "owner": previous_owner
+            },
+            {"$set": {
+                "owner": owner,
+                "status": JobStatus.QUEUED.value,
+                "progress": 0.0,
+                "message": None,
+                "started_at": None
+            }},
+            projection={"result": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        return Job.from_mongo(job) if job else None
+    
+    async def renew_owner_lease(self, owner: str, expires_at: datetime) -> None:
+        """Record that the job manager ``owner`` is alive until ``expires_at``."""
+        await self.owners_collection.update_one(
+            {"_id": owner}, {"$set": {"expires_at": expires_at}}, upsert=True
+        )
+    
+    async def release_owner_lease(self, owner: str) -> None:
+        """Drop the lease of a job manager that is shutting down."""
+        await self.owners_collection.delete_one({"_id": owner})
+    
+    async def get_live_owners(self) -> List[str]:
+        """Job managers whose lease has not expired (the TTL monitor only runs every minute)."""
+        cursor = self.owners_collection.find({"expires_at": {"$gt": datetime.utcnow()}}, {"_id": 1})
+        return [owner["_id"] async for owner in cursor]
+
+
+class MongoFunnelDataAccess(FunnelDataAccess):
+    """MongoDB implementation of saved funnel storage."""
+    
+    def __init__(self):
+        """Initialize MongoDB connection using settings."""
+        self.client = get_mongo_client()
+        self.db = self.client[settings.MONGODB_DATABASE]
+        self.funnels_collection = self.db.funnels
+        self.states_collection = self.db.funnel_user_states
+        self.sketches_collection = self.db.funnel_sketches
+    
+    async def close(self):
+        """Release the data access object. The shared client stays open."""
+        pass
+    
+    async def ensure_indexes(self):
+        """Create the index used to look up per-user funnel progress."""
+        await self.states_collection.create_index(
+            [("funnel_id", ASCENDING), ("user_id", ASCENDING)], unique=True
+        )
+    
+    @staticmethod
+    def _object_id(funnel_id: str) -> Optional[ObjectId]:
+        return ObjectId(funnel_id) if ObjectId.is_valid(funnel_id) else None
+    
+    async def create_funnel(self, funnel: Funnel) -> Funnel:
+        """Store a new funnel."""
+        funnel_dict = funnel.to_mongo()
+        result = await self.funnels_collection.insert_one(funnel_dict)
+        funnel_dict["_id"] = result.inserted_id
+        return Funnel.from_mongo(funnel_dict)
+    
+    async def get_funnel(self, funnel_id: str) -> Optional[Funnel]:
+        """Retrieve a funnel by its ID."""
+        object_id = self._object_id(funnel_id)
+        if object_id is None:
+            return None
+        funnel = await self.funnels_collection.find_one({"_id": object_id})
+        return Funnel.from_mongo(funnel) if funnel else None
+    
+    async def list_funnels(self) -> List[Funnel]:
+        """Retrieve all funnels."""
+        funnels = await self.funnels_collection.find().sort("created_at", ASCENDING).to_list(None)
+        return [Funnel.from_mongo(funnel) for funnel in funnels]
+    
+    async def update_funnel(self, funnel: Funnel) -> Optional[Funnel]:
+        """Replace a stored funnel. Returns None if it does not exist."""
+        object_id = self._object_id(funnel.id)
+        if object_id is None:
+            return None
+        result = await self.funnels_collection.replace_one({"_id": object_id}, funnel.to_mongo())
+        return funnel if result.matched_count else None
+    
+    async def delete_funnel(self, funnel_id: str) -> bool:
+        """Delete a funnel and its per-user progress."""
+        object_id = self._object_id(funnel_id)
+        if object_id is None:
+            return False
+        result = await self.funnels_collection.delete_one({"_id": object_id})
+        await self.clear_user_states(funnel_id)
+        return result.deleted_count > 0
+    
+    async def get_user_states(self, funnel_id: str, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Retrieve per-user funnel progress, keyed by user_id."""
+        cursor = self.states_collection.find(
+            {"funnel_id": funnel_id, "user_id": {"$in": user_ids}},
+            {"_id": 0, "funnel_id": 0}
+        )
+        return {state.pop("user_id"): state async for state in cursor}
+    
+    async def save_user_states(self, funnel_id: str, states: Dict[str, Dict[str, Any]]) -> None:
+        """Insert or replace per-user funnel progress with one bulk write."""
+        if not states:
+            return
+        await self.states_collection.bulk_write([
+            ReplaceOne(
+                {"funnel_id": funnel_id, "user_id": user_id},
+                {"funnel_id": funnel_id, "user_id": user_id, **state},
+                upsert=True
+            )
+            for user_id, state in states.items()
+        ], ordered=False)
+    
+    async def clear_user_states(self, funnel_id: str) -> None:
+        """Remove all per-user funnel progress and duration sketches."""
+        await self.states_collection.delete_many({"funnel_id": funnel_id})
+        await self.sketches_collection.delete_one({"_id": funnel_id})
+    
+    async def get_duration_sketches(self, funnel_id: str) -> Dict[str, bytes]:
+        """Retrieve the funnel's serialised duration sketches, keyed by name."""
+        doc = await self.sketches_collection.find_one({"_id": funnel_id})
+        return {name: bytes(data) for name, data in doc["sketches"].items()} if doc else {}
+    
+    async def save_duration_sketches(self, funnel_id: str, sketches: Dict[str, bytes]) -> None:
+        """Replace the funnel's serialised duration sketches."""
+        await self.sketches_collection.replace_one(
+            {"_id": funnel_id},
+            {"_id": funnel_id, "sketches": {name: Binary(data) for name, data in sketches.items()}},
+            upsert=True
+        )
+
+
+class MongoSegmentDataAccess(SegmentDataAccess):
+    """MongoDB implementation of segment storage and the user index mapping."""
+    
+    def __init__(self):
+        """Initialize MongoDB connection using settings."""
+        self.client = get_mongo_client()
+        self.db = self.client[settings.MONGODB_DATABASE]
+        self.segments_collection = self.db.segments
+        self.user_index_collection = self.db.user_index
+        self.counters_collection = self.db.counters
+    
+    async def close(self):
+        """Release the data access object. The shared client stays open."""
+        pass
+    
+    async def ensure_indexes(self):
+        """Create the index used to map integer indices back to user ids."""
+        await self.user_index_collection.create_index([("idx", ASCENDING)], unique=True)
+    
+    async def create_segment(self, segment: Segment) -> Segment:
+        """Store a new segment definition."""
+        segment_dict = segment.to_mongo()
+        result = await self.segments_collection.insert_one(segment_dict)
+        segment_dict["_id"] = result.inserted_id
+        return Segment.from_mongo(segment_dict)
+    
+    async def get_segment(self, segment_id: str) -> Optional[Segment]:
+        """Retrieve a segment definition by its ID."""
+        if not ObjectId.is_valid(segment_id):
+            return None
+        segment = await self.segments_collection.find_one({"_id": ObjectId(segment_id)}, {"bitmap": 0})
+        return Segment.from_mongo(segment) if segment else None
+    
+    async def list_segments(self) -> List[Segment]:
+        """Retrieve all segment definitions."""
+        segments = await self.segments_collection.find({}, {"bitmap": 0}).to_list(None)
+        return [Segment.from_mongo(segment) for segment in segments]
+    
+    async def delete_segment(self, segment_id: str) -> bool:
+        """Delete a segment."""
+        if not ObjectId.is_valid(segment_id):
+            return False
+        result = await self.segments_collection.delete_one({"_id": ObjectId(segment_id)})
+        return result.deleted_count > 0
+    
+    async def save_segment_members(self, segment: Segment, bitmap: bytes) -> None:
+        """Store a segment's computed membership bitmap and counts."""
+        await self.segments_collection.update_one(
+            {"_id": ObjectId(segment.id)},
+            {"$set": {
+                "bitmap": Binary(bitmap),
+                "user_count": segment.user_count,
+                "computed_at": segment.computed_at
+            }}
+        )
+    
+    async def get_segment_members(self, segment_id: str) -> Optional[bytes]:
+        """Retrieve a segment's serialised membership bitmap."""
+        if not ObjectId.is_valid(segment_id):
+            return None
+        segment = await self.segments_collection.find_one({"_id": ObjectId(segment_id)}, {"bitmap": 1})
+        return bytes(segment["bitmap"]) if segment and segment.get("bitmap") is not None else None
+    
+    async def get_user_indices(self, user_ids: List[str]) -> Dict[str, int]:
+        """
+        Map user ids to dense integer indices, assigning new indices as needed.
+        
+        New indices are reserved as one contiguous block from a counter
+        document. If a concurrent caller assigned some of the same users first,
+        their existing indices win and the reserved ones are left unused.
+        """
+        indices = {}
+        unique_ids = list(dict.fromkeys(user_ids))
+        for i in range(0, len(unique_ids), USER_ID_BATCH_SIZE):
+            batch = unique_ids[i:i + USER_ID_BATCH_SIZE]
+            async for doc in self.user_index_collection.find({"_id": {"$in": batch}}):
+                indices[doc["_id"]] = doc["idx"]
+        
+        missing = [user_id for user_id in unique_ids if user_id not in indices]
+        if missing:
+            counter = await self.counters_collection.find_one_and_update(
+                {"_id": "user_index"},
+                {"$inc": {"seq": len(missing)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            first = counter["seq"] - len(missing)
+            assigned = {user_id: first + i for i, user_id in enumerate(missing)}
+            try:
+                await self.user_index_collection.insert_many(
+                    [{"_id": user_id, "idx": idx} for user_id, idx in assigned.items()],
+                    ordered=False
+                )
+                indices.update(assigned)
+            except BulkWriteError:
+                async for doc in self.user_index_collection.find({"_id": {"$in": missing}}):
+                    indices[doc["_id"]] = doc["idx"]
+        return indices
+    
+    async def get_user_ids(self, indices: List[int]) -> List[str]:
+        """Map integer indices back to user ids."""
+        user_ids = []
+        for i in range(0, len(indices), USER_ID_BATCH_SIZE):
+            batch = indices[i:i + USER_ID_BATCH_SIZE]
+            async for doc in self.user_index_collection.find({"idx": {"$in": batch}}):
+                user_ids.append(doc["_id"])
+        return user_ids
+    
+    async def get_assigned_user_indices(self) -> List[int]:
+        """All indices mapped to a user (indices reserved by a losing concurrent caller are not)."""
+        return [doc["idx"] async for doc in self.user_index_collection.find({}, {"_id": 0, "idx": 1})]
+    
+    async def get_user_index_size(self) -> int:
+        """Number of user indices assigned so far."""
+        counter = await self.counters_collection.find_one({"_id": "user_index"})
+        return counter.get("seq", 0) if counter else 0
+    
+    async def get_user_index_watermark(self) -> Optional[str]:
+        """Insert watermark (EventDataAccess.get_insert_watermark) up to which all users with events have an index."""
+        counter = await self.counters_collection.find_one({"_id": "user_index"})
+        # Older deployments stored an event timestamp here; those resync from scratch once
+        return counter.get("synced_through") if counter else None
+    
+    async def set_user_index_watermark(self, watermark: str) -> None:
+        """Record that all users with events inserted up to watermark have an index."""
+        await self.counters_collection.update_one(
+            {"_id": "user_index"}, {"$set": {"synced_through": watermark}, "$unset": {"synced_until": ""}}, upsert=True
+        )
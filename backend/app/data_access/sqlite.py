@@ -0,0 +1,536 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+from app.core.config import settings
+from app.models.event import Event
+from app.services.analytics.retention import DAY_MS
+from app.services.analytics.sessions import Sessionizer
+from .common import (
+    APP_LAUNCHED_EVENT, APP_VERSION_ATTRIBUTE, insert_watermark_floor, split_user_flows, draw_launches,
+    sample_flows_per_user
+)
+from .interfaces import EventDataAccess
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_IN_BATCH_SIZE = 500
+# Rows fetched per round trip to the worker thread when streaming
+FETCH_BATCH_SIZE = 5000
+
+SCHEMA = [
+    # Clustered on (user_id, timestamp) so one user's history is a contiguous range
+    """CREATE TABLE IF NOT EXISTS events (
+        user_id TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        version TEXT,
+        attributes TEXT NOT NULL,
+        PRIMARY KEY (user_id, timestamp, id)
+    ) WITHOUT ROWID""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS events_id ON events (id)",
+    "CREATE INDEX IF NOT EXISTS events_name_timestamp ON events (name, timestamp, user_id)",
+    "CREATE INDEX IF NOT EXISTS events_version ON events (version, user_id) WHERE version IS NOT NULL",
+    "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)"
+]
+
+def _time_filter(
+    start_ms: Optional[int],
+    end_ms: Optional[int],
+    clauses: List[str],
+    params: List[Any]
+) -> None:
+    if start_ms is not None:
+        clauses.append("timestamp >= ?")
+        params.append(start_ms)
+    if end_ms is not None:
+        clauses.append("timestamp <= ?")
+        params.append(end_ms)
+
+def _where(clauses: List[str]) -> str:
+    return f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+def _batches(values: List[str], size: int = SQLITE_IN_BATCH_SIZE) -> Iterable[List[str]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+class SQLiteEventDataAccess(EventDataAccess):
+    """
+    Event data access over a local SQLite file, for scan-heavy analytics on a
+    single node without extra services.
+
+    The file is a read replica populated from MongoDB by the event sync job
+    (see app/services/event_sync.py). Events are clustered by (user_id,
+    timestamp), so flow, funnel and per-user scans read contiguous ranges.
+    Queries run in worker threads so the event loop is never blocked.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.SQLITE_EVENTS_PATH
+
+    def _connect(self) -> sqlite3.Connection:
+        # Each operation uses its own connection; streaming cursors are
+        # advanced from different worker threads, one batch at a time
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    async def close(self):
+        """Release the data access object. Connections are per operation."""
+        pass
+
+    async def ensure_indexes(self):
+        """Create the database file, tables and indexes if they don't exist."""
+        def create():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = self._connect()
+            try:
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            finally:
+                connection.close()
+        await asyncio.to_thread(create)
+
+    async def _write(self, sql: str, rows: List[Iterable[Any]]) -> None:
+        def run():
+            connection = self._connect()
+            try:
+                with connection:  # commits, or rolls back on error
+                    connection.executemany(sql, rows)
+            finally:
+                connection.close()
+        await asyncio.to_thread(run)
+
+    async def _fetchall(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        def run():
+            connection = self._connect()
+            try:
+                return connection.execute(sql, list(params)).fetchall()
+            finally:
+                connection.close()
+        return await asyncio.to_thread(run)
+
+    async def _iter_rows(self, sql: str, params: Iterable[Any] = ()):
+        connection = await asyncio.to_thread(self._connect)
+        try:
+            cursor = await asyncio.to_thread(connection.execute, sql, list(params))
+            while True:
+                rows = await asyncio.to_thread(cursor.fetchmany, FETCH_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _columns(fields: Optional[List[str]]) -> List[str]:
+        columns = ["user_id"]
+        for field in fields or ["name", "timestamp", "attributes"]:
+            if field in ("id", "name", "timestamp", "attributes") and field not in columns:
+                columns.append(field)
+        return columns
+
+    @staticmethod
+    def _row_to_dict(columns: List[str], row: tuple) -> Dict[str, Any]:
+        event = dict(zip(columns, row))
+        if "attributes" in event:
+            event["attributes"] = json.loads(event["attributes"])
+        return event
+
+    @staticmethod
+    def _event_filters(
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        name: Optional[str],
+        user_id: Optional[str]
+    ) -> Tuple[List[str], List[Any]]:
+        clauses, params = [], []
+        _time_filter(
+            int(start_date.timestamp() * 1000) if start_date else None,
+            int(end_date.timestamp() * 1000) if end_date else None,
+            clauses,
+            params
+        )
+        if name:
+            clauses.append("name = ?")
+            params.append(name)
+        if user_id:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        return clauses, params
+
+    async def get_events(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        name: Optional[str] = None,
+        user_id: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Event]:
+        """Retrieve events based on various filters."""
+        clauses, params = self._event_filters(start_date, end_date, name, user_id)
+        rows = await self._fetchall(
+            f"SELECT name, user_id, attributes, timestamp FROM events{_where(clauses)} LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )
+        return [
+            Event(name=name, user_id=user_id, attributes=json.loads(attributes), timestamp=timestamp)
+            for name, user_id, attributes, timestamp in rows
+        ]
+
+    async def iter_event_batches(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        name: Optional[str] = None,
+        user_id: Optional[str] = None,
+        batch_size: int = 10000,
+        user_ids: Optional[List[str]] = None
+    ):
+        """Stream matching events as lists of raw dictionaries."""
+        clauses, params = self._event_filters(start_date, end_date, name, user_id)
+        if user_ids is None:
+            queries = [(clauses, params)]
+        else:
+            queries = [
+                (clauses + [f"user_id IN ({', '.join('?' * len(users))})"], params + users)
+                for users in _batches(sorted(set(user_ids)))
+            ]
+
+        columns = ["user_id", "name", "timestamp", "attributes"]
+        batch = []
+        for batch_clauses, batch_params in queries:
+            async for row in self._iter_rows(
+                f"SELECT {', '.join(columns)} FROM events{_where(batch_clauses)}", batch_params
+            ):
+                batch.append(self._row_to_dict(columns, row))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    async def get_event_by_id(self, event_id: str) -> Optional[Event]:
+        """Retrieve a specific event by its (MongoDB) ID."""
+        rows = await self._fetchall(
+            "SELECT name, user_id, attributes, timestamp FROM events WHERE id = ?", [event_id]
+        )
+        if not rows:
+            return None
+        name, user_id, attributes, timestamp = rows[0]
+        return Event(name=name, user_id=user_id, attributes=json.loads(attributes), timestamp=timestamp)
+
+    async def get_event_names(self) -> List[str]:
+        """Retrieve all unique event names."""
+        return [row[0] for row in await self._fetchall("SELECT DISTINCT name FROM events")]
+
+    async def get_event_count(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        name: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> int:
+        """Get the count of events matching the given filters."""
+        clauses, params = self._event_filters(start_date, end_date, name, user_id)
+        rows = await self._fetchall(f"SELECT COUNT(*) FROM events{_where(clauses)}", params)
+        return rows[0][0]
+
+    async def create_event(self, event: Event) -> Event:
+        """
+        Create a new event in the local file only.
+
+        Events are normally written to MongoDB and synced here.
+        """
+        # ObjectIds keep local ids in insertion order, like synced ones
+        await self.insert_events([{**event.model_dump(), "_id": ObjectId()}])
+        return event
+
+    async def insert_events(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Insert or replace raw event documents (as stored in MongoDB) by their _id.
+
+        Returns:
+            Number of documents written
+        """
+        rows = []
+        for doc in documents:
+            attributes = doc.get("attributes") or {}
+            version = attributes.get(APP_VERSION_ATTRIBUTE) if doc["name"] == APP_LAUNCHED_EVENT else None
+            rows.append((
+                doc["user_id"],
+                doc["timestamp"],
+                str(doc["_id"]),
+                doc["name"],
+                str(version) if version is not None else None,
+                json.dumps(attributes, default=str)
+            ))
+
+        await self._write(
+            "INSERT OR REPLACE INTO events (user_id, timestamp, id, name, version, attributes) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        return len(rows)
+
+    async def get_sync_state(self, key: str) -> Optional[str]:
+        rows = await self._fetchall("SELECT value FROM sync_state WHERE key = ?", [key])
+        return rows[0][0] if rows else None
+
+    async def set_sync_state(self, key: str, value: str) -> None:
+        await self._write("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", [(key, value)])
+
+    async def get_app_versions(self) -> List[str]:
+        """Retrieve all unique app versions from App Launched events."""
+        rows = await self._fetchall(
+            "SELECT DISTINCT version FROM events WHERE version IS NOT NULL ORDER BY version DESC"
+        )
+        return [row[0] for row in rows]
+
+    async def get_user_flows_by_version(
+        self,
+        version: str,
+        user_ids: Optional[List[str]] = None,
+        sessionizer: Optional[Sessionizer] = None
+    ) -> List[Dict[str, Any]]:
+        """Get all user flows for a specific app version (see EventDataAccess)."""
+        return [
+            flow async for flow in self.iter_user_flows_by_version(
+                version, user_ids=user_ids, sessionizer=sessionizer
+            )
+        ]
+
+    async def iter_user_flows_by_version(
+        self,
+        version: str,
+        user_ids: Optional[List[str]] = None,
+        include_attributes: bool = True,
+        sessionizer: Optional[Sessionizer] = None
+    ):
+        """Stream user flows for a specific app version one at a time."""
+        version_user_ids = await self.get_version_user_ids(version)
+        if user_ids is not None:
+            version_user_ids = list(set(version_user_ids).intersection(user_ids))
+
+        fields = ["name", "timestamp"]
+        if include_attributes:
+            fields.append("attributes")
+
+        async for user_id, events in self.iter_user_event_groups(user_ids=version_user_ids, fields=fields):
+            for flow in split_user_flows(user_id, events, sessionizer):
+                yield flow
+
+    async def sample_user_flows_by_version(
+        self,
+        version: str,
+        max_flows: int,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        user_ids: Optional[List[str]] = None,
+        sessionizer: Optional[Sessionizer] = None
+    ) -> List[Dict[str, Any]]:
+        """Randomly sample flows of an app version, weighting users by their launches (see MongoEventDataAccess)."""
+        # Only App Launched events have a version
+        clauses, params = ["version = ?"], [version]
+        _time_filter(start_ms, end_ms, clauses, params)
+        if user_ids is None:
+            rows = await self._fetchall(
+                f"SELECT user_id, COUNT(*) FROM (SELECT user_id FROM events{_where(clauses)} "
+                "ORDER BY random() LIMIT ?) GROUP BY user_id",
+                params + [max_flows]
+            )
+            draws = dict(rows)
+        else:
+            launch_counts = {}
+            for batch in _batches(sorted(set(user_ids))):
+                rows = await self._fetchall(
+                    f"SELECT user_id, COUNT(*) FROM events{_where(clauses)} "
+                    f"AND user_id IN ({', '.join('?' * len(batch))}) GROUP BY user_id",
+                    params + batch
+                )
+                launch_counts.update(rows)
+            draws = draw_launches(launch_counts, max_flows)
+
+        return await sample_flows_per_user(
+            self.iter_user_event_groups(
+                start_ms=start_ms,
+                end_ms=end_ms,
+                user_ids=list(draws),
+                fields=["name", "timestamp"]
+            ),
+            draws,
+            sessionizer
+        )
+
+    async def iter_user_events(
+        self,
+        user_id: str,
+        fields: Optional[List[str]] = None
+    ):
+        """Stream a user's events in timestamp order."""
+        columns = self._columns(fields)
+        async for row in self._iter_rows(
+            f"SELECT {', '.join(columns)} FROM events WHERE user_id = ? ORDER BY timestamp",
+            [user_id]
+        ):
+            yield self._row_to_dict(columns, row)
+
+    async def iter_events_for_users(
+        self,
+        user_ids: List[str],
+        fields: Optional[List[str]] = None,
+        batch_size: int = 200
+    ):
+        """Stream several users' histories, grouped by user and in timestamp order."""
+        async for _, events in self.iter_user_event_groups(user_ids=user_ids, fields=fields):
+            for event in events:
+                yield event
+
+    async def get_version_user_ids(self, version: str, user_ids: Optional[List[str]] = None) -> List[str]:
+        """Retrieve the ids of all users (optionally among ``user_ids``) with an App Launched event for the given app version."""
+        if user_ids is None:
+            rows = await self._fetchall("SELECT DISTINCT user_id FROM events WHERE version = ?", [version])
+            return [row[0] for row in rows]
+        version_user_ids = []
+        for batch in _batches(sorted(set(user_ids))):
+            rows = await self._fetchall(
+                f"SELECT DISTINCT user_id FROM events WHERE version = ? AND user_id IN ({', '.join('?' * len(batch))})",
+                [version] + batch
+            )
+            version_user_ids.extend(row[0] for row in rows)
+        return version_user_ids
+
+    async def get_insert_watermark(self) -> Optional[str]:
+        """Id of the most recently inserted event (synced ids are MongoDB ObjectIds)."""
+        rows = await self._fetchall("SELECT MAX(id) FROM events")
+        return rows[0][0]
+
+    async def get_users_inserted_after(self, watermark: str) -> List[str]:
+        """Ids of users with events inserted after ``watermark``, minus INSERT_WATERMARK_SLACK_SECONDS."""
+        rows = await self._fetchall(
+            "SELECT DISTINCT user_id FROM events WHERE id > ?", [str(insert_watermark_floor(watermark))]
+        )
+        return [row[0] for row in rows]
+
+    async def iter_user_event_groups(
+        self,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        names: Optional[List[str]] = None,
+        user_ids: Optional[List[str]] = None,
+        fields: Optional[List[str]] = None,
+        inserted_after: Optional[str] = None
+    ):
+        """Stream matching events grouped by user, in (user_id, timestamp) order."""
+        columns = self._columns(fields)
+        clauses, params = [], []
+        _time_filter(start_ms, end_ms, clauses, params)
+        if names:
+            names = list(names)
+            clauses.append(f"name IN ({', '.join('?' * len(names))})")
+            params.extend(names)
+        if inserted_after is not None:
+            clauses.append("id > ?")
+            params.append(str(insert_watermark_floor(inserted_after)))
+
+        if user_ids is None:
+            queries = [(clauses, params)]
+        else:
+            queries = [
+                (clauses + [f"user_id IN ({', '.join('?' * len(batch))})"], params + batch)
+                for batch in _batches(sorted(set(user_ids)))
+            ]
+
+        for batch_clauses, batch_params in queries:
+            current_id = None
+            events = []
+            async for row in self._iter_rows(
+                f"SELECT {', '.join(columns)} FROM events{_where(batch_clauses)} ORDER BY user_id, timestamp",
+                batch_params
+            ):
+                event = self._row_to_dict(columns, row)
+                if event["user_id"] != current_id:
+                    if events:
+                        yield current_id, events
+                    current_id = event["user_id"]
+                    events = []
+                events.append(event)
+            if events:
+                yield current_id, events
+
+    async def iter_user_ids_by_event_count(
+        self,
+        name: Optional[str] = None,
+        start_ms: Optional[int] = None,
+        min_count: int = 1,
+        max_count: Optional[int] = None
+    ):
+        """Stream the ids of users who performed an event between min_count and max_count times."""
+        clauses, params = [], []
+        if name:
+            clauses.append("name = ?")
+            params.append(name)
+        _time_filter(start_ms, None, clauses, params)
+        having, having_params = "COUNT(*) >= ?", [min_count]
+        if max_count is not None:
+            having += " AND COUNT(*) <= ?"
+            having_params.append(max_count)
+        async for row in self._iter_rows(
+            f"SELECT user_id FROM events{_where(clauses)} GROUP BY user_id HAVING {having}",
+            params + having_params
+        ):
+            yield row[0]
+
+    async def iter_user_active_days(
+        self,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        user_ids: Optional[List[str]] = None
+    ):
+        """Stream the UTC days on which each user had at least one event."""
+        clauses, params = [], []
+        _time_filter(start_ms, end_ms, clauses, params)
+        if user_ids is None:
+            queries = [(clauses, params)]
+        else:
+            queries = [
+                (clauses + [f"user_id IN ({', '.join('?' * len(batch))})"], params + batch)
+                for batch in _batches(sorted(set(user_ids)))
+            ]
+
+        for batch_clauses, batch_params in queries:
+            current_id = None
+            days = []
+            async for user_id, day in self._iter_rows(
+                f"SELECT user_id, timestamp / {DAY_MS} AS day FROM events{_where(batch_clauses)} "
+                "GROUP BY user_id, day ORDER BY user_id, day",
+                batch_params
+            ):
+                if user_id != current_id:
+                    if days:
+                        yield current_id, days
+                    current_id = user_id
+                    days = []
+                days.append(day)
+            if days:
+                yield current_id, days
+
+    async def get_first_seen(self, user_ids: List[str]) -> Dict[str, int]:
+        """Timestamp (ms) of each user's earliest event."""
+        first_seen = {}
+        for batch in _batches(sorted(set(user_ids))):
+            rows = await self._fetchall(
+                f"SELECT user_id, MIN(timestamp) FROM events WHERE user_id IN ({', '.join('?' * len(batch))}) "
+                "GROUP BY user_id",
+                batch
+            )
+            first_seen.update(rows)
+        return first_seen
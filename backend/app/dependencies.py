@@ -1,12 +1,33 @@
 from typing import AsyncGenerator
-from fastapi import Depends
-from app.data_access.mongodb import MongoEventDataAccess, MongoUserDataAccess
-from app.data_access.interfaces import EventDataAccess, UserDataAccess
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Query, Request, Response
+from app.data_access.mongodb import MongoUserDataAccess, MongoFunnelDataAccess, MongoSegmentDataAccess, kill_operations
+from app.data_access.factory import EventBackend, create_event_dao
+from app.data_access.interfaces import EventDataAccess, UserDataAccess, FunnelDataAccess, SegmentDataAccess
+from app.data_access.cached import CachedUserDataAccess
+from app.core.config import settings
+from app.core.cancellation import DisconnectGuard
+from app.core.conditional import ConditionalGet
+from app.core.singleflight import Coalescer, SingleFlight
 from app.services.openai_service import OpenAIService
+from app.services.analytics.sessions import Sessionizer, SessionMode
+from app.services.jobs import JobManager
+from app.services.job_handlers import job_manager
+from app.services.segments import SegmentService, SegmentNotReady
 
-async def get_event_dao() -> AsyncGenerator[EventDataAccess, None]:
+# Shared by every coalesced endpoint; keys include the request path
+request_flights = SingleFlight(
+    "coalesced_requests",
+    ttl_seconds=settings.COALESCE_RESULT_TTL_SECONDS,
+    max_size=settings.COALESCE_CACHE_MAX_SIZE,
+    on_cancel=kill_operations
+)
+
+async def get_event_dao(
+    backend: Optional[EventBackend] = Query(None, description="Event store to read from (default: EVENT_BACKEND)")
+) -> AsyncGenerator[EventDataAccess, None]:
     """Dependency for getting the event data access object."""
-    dao = MongoEventDataAccess()
+    dao = create_event_dao(backend)
     try:
         yield dao
     finally:
@@ -14,11 +35,65 @@ async def get_event_dao() -> AsyncGenerator[EventDataAccess, None]:
 
 async def get_user_dao() -> AsyncGenerator[UserDataAccess, None]:
     """Dependency for getting the user data access object."""
-    dao = MongoUserDataAccess()
+    dao = CachedUserDataAccess(MongoUserDataAccess())
+    try:
+        yield dao
+    finally:
+        await dao.close()
+
+async def get_funnel_dao() -> AsyncGenerator[FunnelDataAccess, None]:
+    """Dependency for getting the funnel data access object."""
+    dao = MongoFunnelDataAccess()
+    try:
+        yield dao
+    finally:
+        await dao.close()
+
+async def get_segment_dao() -> AsyncGenerator[SegmentDataAccess, None]:
+    """Dependency for getting the segment data access object."""
+    dao = MongoSegmentDataAccess()
     try:
         yield dao
     finally:
         await dao.close()
 
+async def get_segment_user_ids(
+    segment_id: Optional[str] = Query(None, description="Only include members of this segment"),
+    event_dao: EventDataAccess = Depends(get_event_dao),
+    segment_dao: SegmentDataAccess = Depends(get_segment_dao)
+) -> Optional[List[str]]:
+    """Dependency resolving an optional segment_id query parameter to its member user ids."""
+    if not segment_id:
+        return None
+    try:
+        return await SegmentService(segment_dao, event_dao).get_member_ids(segment_id)
+    except SegmentNotReady as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def get_sessionizer(
+    session_mode: Optional[SessionMode] = Query(None, description="How flows are split: launch, inactivity or hybrid"),
+    session_gap_minutes: Optional[int] = Query(None, ge=1, description="Inactivity gap that ends a session")
+) -> Sessionizer:
+    """Dependency building the flow sessionizer from query parameters, falling back to settings."""
+    return Sessionizer(
+        session_mode or settings.FLOW_SESSION_MODE,
+        gap_ms=(session_gap_minutes or settings.FLOW_SESSION_GAP_MINUTES) * 60 * 1000
+    )
+
+def get_disconnect_guard(request: Request) -> DisconnectGuard:
+    """Dependency for cancelling an endpoint's work, including its MongoDB operations, when the client disconnects."""
+    return DisconnectGuard(request, on_cancel=kill_operations)
+
+def get_coalescer(request: Request) -> Coalescer:
+    """Dependency sharing one computation between identical concurrent requests."""
+    return Coalescer(request, request_flights)
+
+def get_conditional_get(request: Request, response: Response) -> ConditionalGet:
+    """Dependency answering If-None-Match from a data watermark before any data is read."""
+    return ConditionalGet(request, response, max_age=settings.HTTP_CACHE_MAX_AGE_SECONDS)
+
 def get_openai_service() -> OpenAIService:
-    return OpenAIService() 
\ No newline at end of file
+    return OpenAIService()
+
+def get_job_manager() -> JobManager:
+    return job_manager
@@ -1,7 +1,18 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pymongo.errors import ExecutionTimeout
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.core.process_pool import shutdown_process_pool
+from app.data_access.mongodb import (
+    MongoEventDataAccess, MongoUserDataAccess, MongoJobDataAccess, MongoFunnelDataAccess,
+    MongoSegmentDataAccess, close_mongo_client
+)
+from app.data_access.sqlite import SQLiteEventDataAccess
+from app.data_access.factory import EventBackend
+from app.services.job_handlers import job_manager
 
 app = FastAPI(title=settings.PROJECT_NAME)
 
@@ -14,6 +25,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+background_tasks = []
+
+@app.exception_handler(ExecutionTimeout)
+async def query_timeout_handler(request: Request, exc: ExecutionTimeout):
+    """A query exceeded its server-side time budget (MONGODB_*_MAX_TIME_MS)."""
+    return JSONResponse(status_code=504, content={"detail": "Query exceeded its time budget"})
+
+async def refresh_funnels_periodically():
+    """Queue a low-priority refresh of every saved funnel at a fixed interval."""
+    while True:
+        await asyncio.sleep(settings.FUNNEL_REFRESH_INTERVAL_SECONDS)
+        try:
+            for funnel in await MongoFunnelDataAccess().list_funnels():
+                await job_manager.submit("funnel_refresh", {"funnel_id": funnel.id}, priority=-1)
+        except Exception as e:
+            print("Error scheduling funnel refresh:", str(e))
+
+async def sync_events_periodically():
+    """Queue a sync of new events into the local SQLite store at a fixed interval."""
+    while True:
+        try:
+            await job_manager.submit("event_sync", {}, priority=-1)
+        except Exception as e:
+            print("Error scheduling event sync:", str(e))
+        await asyncio.sleep(settings.EVENT_SYNC_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def startup():
+    await MongoEventDataAccess().ensure_indexes()
+    await MongoUserDataAccess().ensure_indexes()
+    await MongoJobDataAccess().ensure_indexes()
+    await MongoFunnelDataAccess().ensure_indexes()
+    await MongoSegmentDataAccess().ensure_indexes()
+    job_manager.start(settings.JOB_WORKER_CONCURRENCY)
+    await job_manager.resume_unfinished()
+    if settings.FUNNEL_REFRESH_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(refresh_funnels_periodically()))
+    if settings.EVENT_BACKEND == EventBackend.SQLITE or settings.EVENT_SYNC_INTERVAL_SECONDS > 0:
+        await SQLiteEventDataAccess().ensure_indexes()
+    if settings.EVENT_SYNC_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(sync_events_periodically()))
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await job_manager.stop()
+    shutdown_process_pool()
+    close_mongo_client()
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
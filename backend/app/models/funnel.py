@@ -0,0 +1,51 @@
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+class FunnelStep(BaseModel):
+    name: str = Field(..., description="Event name of this step")
+    count: int = Field(0, description="Users who reached this step (computed)")
+    conversion_rate: float = Field(0.0, description="Percentage of users from the previous step who reached this step (computed)")
+    time_from_previous_seconds: Optional[Dict[str, Union[int, float]]] = Field(
+        None, description="Count, mean, p25/p50/p75/p90 and max of the time taken to reach this step from the previous one (computed)"
+    )
+
+class Funnel(BaseModel):
+    id: Optional[str] = None
+    name: str
+    description: Optional[str] = None
+    steps: List[FunnelStep] = Field(..., min_length=1, description="Ordered funnel steps")
+    conversion_window_hours: int = Field(24, ge=1, description="Time allowed from the first to the last step")
+    version: Optional[str] = Field(None, description="Only count users who launched this app version")
+    segment_id: Optional[str] = Field(None, description="Only count members of this segment")
+    conversion_time_seconds: Optional[Dict[str, Union[int, float]]] = Field(
+        None, description="Distribution of the time from the first to the last step for converted attempts (computed)"
+    )
+    watermark: Optional[str] = Field(None, description="Id of the newest event included in the counts")
+    refreshed_at: Optional[datetime] = None
+    refresh_started_at: Optional[datetime] = Field(
+        None, description="Set while a refresh is being applied; if a refresh finds it set, results are rebuilt"
+    )
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    def definition(self) -> tuple:
+        """The fields that determine the computed counts."""
+        return (tuple(step.name for step in self.steps), self.conversion_window_hours, self.version, self.segment_id)
+
+    @classmethod
+    def from_mongo(cls, data: dict) -> 'Funnel':
+        """Create a Funnel instance from MongoDB document."""
+        if not data:
+            return None
+        data = dict(data)
+        data["id"] = str(data.pop("_id"))
+        if isinstance(data.get("watermark"), int):
+            # Timestamp watermarks predate insert-order refreshes: rebuild the results
+            data["watermark"] = None
+            data["refresh_started_at"] = data.get("refreshed_at") or datetime.utcnow()
+        return cls(**data)
+
+    def to_mongo(self) -> dict:
+        """Convert Funnel instance to MongoDB document format."""
+        return self.model_dump(exclude={"id"})
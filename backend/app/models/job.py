@@ -0,0 +1,45 @@
+from enum import Enum
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    @property
+    def finished(self) -> bool:
+        return self in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+class Job(BaseModel):
+    """Background job model. The result is stored separately and fetched on demand."""
+    id: str = Field(..., description="Unique job identifier")
+    kind: str = Field(..., description="Registered job kind, e.g. 'flow_analysis'")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Parameters passed to the job handler")
+    priority: int = Field(0, description="Higher priority jobs are started first")
+    status: JobStatus = Field(JobStatus.QUEUED, description="Current job status")
+    progress: float = Field(0.0, description="Progress between 0 and 1")
+    message: Optional[str] = Field(None, description="Human readable progress message")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = Field(None, description="When the job and its result are removed")
+    owner: Optional[str] = Field(None, description="Job manager (process) that queued the job")
+
+    @classmethod
+    def from_mongo(cls, data: dict) -> 'Job':
+        """Create a Job instance from MongoDB document."""
+        if not data:
+            return None
+        data = {k: v for k, v in data.items() if k not in ("result", "dedup_key")}
+        data["id"] = data.pop("_id")
+        return cls(**data)
+
+    def to_mongo(self) -> dict:
+        """Convert Job instance to MongoDB document format."""
+        data = self.model_dump()
+        data["_id"] = data.pop("id")
+        return data
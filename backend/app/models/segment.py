@@ -0,0 +1,71 @@
+from enum import Enum
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+
+class SegmentCondition(BaseModel):
+    """One behavioural condition. A user matches if every given criterion holds."""
+    event_name: Optional[str] = Field(None, description="Event the user must have performed")
+    within_days: Optional[int] = Field(None, ge=1, description="Only count events from the last N days")
+    min_count: int = Field(1, ge=1, description="Minimum number of matching events")
+    max_count: Optional[int] = Field(None, ge=1, description="Maximum number of matching events")
+    version: Optional[str] = Field(None, description="User must have launched this app version")
+
+    @model_validator(mode="after")
+    def check_criteria(self) -> 'SegmentCondition':
+        if self.event_name is None and self.version is None:
+            raise ValueError("A condition needs an event_name or a version")
+        return self
+
+class SegmentOperation(str, Enum):
+    AND = "and"
+    OR = "or"
+    NOT = "not"        # Users not in the (single) operand segment
+    ANDNOT = "andnot"  # Users in the first segment but in none of the others
+
+class SegmentCombination(BaseModel):
+    op: SegmentOperation
+    segment_ids: List[str] = Field(..., min_length=1)
+
+    @model_validator(mode="after")
+    def check_operands(self) -> 'SegmentCombination':
+        if self.op == SegmentOperation.NOT and len(self.segment_ids) != 1:
+            raise ValueError("'not' takes exactly one segment")
+        return self
+
+class Segment(BaseModel):
+    """
+    A set of users defined by behavioural conditions (all must hold) or by
+    combining other segments. Members are stored as a compressed bitmap over
+    integer user indices, outside this model.
+    """
+    id: Optional[str] = None
+    name: str
+    description: Optional[str] = None
+    conditions: List[SegmentCondition] = Field(default_factory=list)
+    combination: Optional[SegmentCombination] = None
+    user_count: Optional[int] = Field(None, description="Number of users (computed)")
+    computed_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_definition(self) -> 'Segment':
+        if bool(self.conditions) == bool(self.combination):
+            raise ValueError("Provide either conditions or a combination")
+        return self
+
+    @classmethod
+    def from_mongo(cls, data: dict) -> 'Segment':
+        """Create a Segment instance from MongoDB document."""
+        if not data:
+            return None
+        data = {k: v for k, v in data.items() if k != "bitmap"}
+        data["id"] = str(data.pop("_id"))
+        return cls(**data)
+
+    def to_mongo(self) -> dict:
+        """Convert Segment instance to MongoDB document format."""
+        return self.model_dump(exclude={"id"}, mode="json") | {
+            "computed_at": self.computed_at,
+            "created_at": self.created_at
+        }
@@ -0,0 +1,136 @@
+import json
+import math
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from app.services.analytics.paths import SpaceSaving
+from app.services.analytics.quantiles import TDigest
+
+# Values tracked per attribute key; any value above 1/capacity of the key's occurrences is reported
+DEFAULT_CAPACITY = 1000
+# Attribute keys profiled per event name; further keys are counted but not summarised
+MAX_KEYS = 200
+# Longer string values are truncated before counting
+MAX_VALUE_LENGTH = 200
+
+def value_label(value: Any) -> str:
+    """Counted form of an attribute value: strings as-is (truncated), anything else as JSON."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return value[:MAX_VALUE_LENGTH]
+
+class _KeyStats:
+    """Non-null occurrences, heavy hitters and numeric distribution of one attribute key."""
+
+    __slots__ = ("present", "values", "numbers")
+
+    def __init__(self, capacity: int):
+        self.present = 0
+        self.values = SpaceSaving(capacity)
+        self.numbers: Optional[TDigest] = None
+
+    def add(self, value: Any):
+        if value is None or value == "":
+            return
+        self.present += 1
+        self.values.add(value_label(value))
+        # bool is an int subclass but not a measurement
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+            if self.numbers is None:
+                self.numbers = TDigest()
+            self.numbers.add(value)
+
+class AttributeProfile:
+    """
+    Streaming summary of the attribute dictionaries of many events.
+
+    For each attribute key: how often it is set, the share of events where it
+    is missing or null, its most frequent values (Space-Saving sketch, so
+    memory per key is bounded by ``capacity`` however many distinct values
+    there are) and, for numeric values, percentiles and a histogram (t-digest).
+    Counts of values are exact unless the key had more than ``capacity``
+    distinct values, in which case they are upper bounds.
+    """
+
+    def __init__(self, top_k: int = 10, bins: int = 10, capacity: int = DEFAULT_CAPACITY, max_keys: int = MAX_KEYS):
+        self.top_k = top_k
+        self.bins = bins
+        self.capacity = max(capacity, top_k)
+        self.max_keys = max_keys
+        self.events = 0
+        self.keys: Dict[str, _KeyStats] = {}
+        self.untracked_keys = 0
+
+    def add(self, attributes: Optional[Dict[str, Any]]):
+        self.events += 1
+        for key, value in (attributes or {}).items():
+            stats = self.keys.get(key)
+            if stats is None:
+                if len(self.keys) >= self.max_keys:
+                    self.untracked_keys += 1
+                    continue
+                stats = self.keys[key] = _KeyStats(self.capacity)
+            stats.add(value)
+
+    def add_batch(self, events: Iterable[Dict[str, Any]]):
+        """Add raw events (as yielded by EventDataAccess.iter_event_batches)."""
+        for event in events:
+            self.add(event.get("attributes"))
+
+    def histogram(self, digest: TDigest) -> List[Dict[str, float]]:
+        """Approximate counts in ``bins`` equal-width bins between the minimum and maximum."""
+        count = digest.count
+        if digest.min == digest.max:
+            return [{"start": round(digest.min, 2), "end": round(digest.max, 2), "count": count}]
+        edges = np.linspace(digest.min, digest.max, self.bins + 1)
+        cumulative = np.array(digest.cdf(edges))
+        cumulative[0], cumulative[-1] = 0.0, 1.0
+        counts = np.diff(np.round(cumulative * count))
+        return [
+            {"start": round(float(start), 2), "end": round(float(end), 2), "count": int(n)}
+            for start, end, n in zip(edges, edges[1:], counts)
+        ]
+
+    def _numeric(self, digest: TDigest) -> Dict[str, Any]:
+        return {
+            **digest.summary(percentiles=(5, 25, 50, 75, 95)),
+            "min": round(digest.min, 2),
+            "histogram": self.histogram(digest)
+        }
+
+    def _ranked_keys(self) -> List[tuple]:
+        return sorted(self.keys.items(), key=lambda item: item[1].present, reverse=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Per-key breakdown, most frequently set keys first."""
+        attributes = {}
+        for key, stats in self._ranked_keys():
+            top = stats.values.top(self.top_k)
+            entry = {
+                "count": stats.present,
+                "null_rate": round(1 - stats.present / self.events, 4) if self.events else 0,
+                "exact": not any(error for _, _, error in top),
+                "top_values": [
+                    {"value": value, "count": count, "share": round(count / stats.present, 4)}
+                    for value, count, _ in top
+                ]
+            }
+            if stats.numbers is not None:
+                entry["numeric"] = self._numeric(stats.numbers)
+            attributes[key] = entry
+        return {"events": self.events, "keys_truncated": self.untracked_keys > 0, "attributes": attributes}
+
+    def to_context(self, max_keys: int = 8, max_values: int = 5) -> Dict[str, Any]:
+        """
+        Compact summary for LLM prompts: the most frequently set keys, each with
+        its null rate, top values as {value: count} and numeric quartiles.
+        """
+        context = {}
+        for key, stats in self._ranked_keys()[:max_keys]:
+            entry: Dict[str, Any] = {
+                "null_rate": round(1 - stats.present / self.events, 2) if self.events else 0,
+                "top": {value: count for value, count, _ in stats.values.top(max_values)}
+            }
+            if stats.numbers is not None:
+                entry["numeric"] = stats.numbers.summary(percentiles=(25, 50, 75))
+            context[key] = entry
+        return context
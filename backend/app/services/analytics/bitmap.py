@@ -0,0 +1,76 @@
+import zlib
+from typing import Iterable, Iterator
+
+class Bitmap:
+    """
+    Set of non-negative integers stored as the bits of a Python int.
+
+    AND/OR/ANDNOT run as single big-int operations in C, so set operations over
+    millions of members take milliseconds. Serialised form is the zlib-compressed
+    little-endian bit array, which compresses well for both sparse and dense sets.
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+
+    @classmethod
+    def from_indices(cls, indices: Iterable[int]) -> "Bitmap":
+        # Set bits in a bytearray first: OR-ing into an int one bit at a time is quadratic
+        buffer = bytearray()
+        for i in indices:
+            byte = i >> 3
+            if byte >= len(buffer):
+                buffer.extend(bytes(max(byte + 1 - len(buffer), len(buffer))))
+            buffer[byte] |= 1 << (i & 7)
+        return cls(int.from_bytes(buffer, "little"))
+
+    @classmethod
+    def full(cls, size: int) -> "Bitmap":
+        """Bitmap containing every integer in [0, size)."""
+        return cls((1 << size) - 1)
+
+    def indices(self) -> Iterator[int]:
+        """Yield members in ascending order."""
+        data = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+        for byte_index, byte in enumerate(data):
+            while byte:
+                low = byte & -byte
+                yield (byte_index << 3) + low.bit_length() - 1
+                byte ^= low
+
+    def cardinality(self) -> int:
+        if hasattr(self.bits, "bit_count"):  # Python 3.10+
+            return self.bits.bit_count()
+        return bin(self.bits).count("1")
+
+    def invert(self, size: int) -> "Bitmap":
+        """Complement within the universe [0, size)."""
+        return Bitmap(self.bits ^ ((1 << size) - 1))
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.bits & other.bits)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.bits | other.bits)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.bits & ~other.bits)
+
+    def __contains__(self, i: int) -> bool:
+        return bool(self.bits >> i & 1)
+
+    def __len__(self) -> int:
+        return self.cardinality()
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Bitmap) and self.bits == other.bits
+
+    def to_bytes(self) -> bytes:
+        raw = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+        return zlib.compress(raw)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Bitmap":
+        return cls(int.from_bytes(zlib.decompress(data), "little"))
@@ -0,0 +1,181 @@
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from .paths import EventCodec
+from .quantiles import TDigest
+from .sessions import Sessionizer
+
+class FlowColumns:
+    """
+    Compact columnar copy of many users' events: one int32 user code, int32
+    event code and int64 timestamp per event, sorted by (user, timestamp).
+
+    Users must be added one at a time with their events in timestamp order.
+    """
+
+    def __init__(self):
+        self.codec = EventCodec()
+        self.user_ids: List[str] = []
+        self._users = array("i")
+        self._names = array("i")
+        self._timestamps = array("q")
+
+    def add_user(self, user_id: str, events: List[Dict[str, Any]]):
+        user_code = len(self.user_ids)
+        self.user_ids.append(user_id)
+        self._users.extend([user_code] * len(events))
+        self._names.extend(self.codec.encode_all(event["name"] for event in events))
+        self._timestamps.extend(event["timestamp"] for event in events)
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(users, names, timestamps) as numpy arrays sharing the collected buffers."""
+        return (
+            np.frombuffer(self._users, dtype=np.int32),
+            np.frombuffer(self._names, dtype=np.int32),
+            np.frombuffer(self._timestamps, dtype=np.int64)
+        )
+
+    def launch_code(self, sessionizer: Sessionizer) -> Optional[int]:
+        return self.codec.codes.get(sessionizer.launch_event)
+
+def partition(users: np.ndarray, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split rows sorted by user into at most ``parts`` contiguous (start, end)
+    ranges of similar size, never splitting one user's events.
+    """
+    count = len(users)
+    if count == 0:
+        return []
+    user_starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    targets = np.linspace(0, count, parts + 1)[1:-1]
+    cuts = user_starts[np.minimum(np.searchsorted(user_starts, targets), len(user_starts) - 1)]
+    bounds = np.unique(np.r_[0, cuts, count])
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+def partial_flow_metrics(
+    users: np.ndarray,
+    names: np.ndarray,
+    timestamps: np.ndarray,
+    sessionizer: Sessionizer,
+    launch_code: Optional[int],
+    name_count: int
+) -> Dict[str, Any]:
+    """
+    Sessionise one partition and return mergeable aggregates.
+
+    Runs in worker processes, so it only takes and returns plain arrays,
+    numbers and quantile sketches. Partitions must not share users.
+    Durations are summarised in t-digests and flow lengths in a histogram,
+    so the result size doesn't grow with the number of flows.
+    """
+    positions, session_ids = sessionizer.split_columns(users, names, timestamps, launch_code)
+    return session_flow_metrics(users, names, timestamps, positions, session_ids, name_count)
+
+def session_flow_metrics(
+    users: np.ndarray,
+    names: np.ndarray,
+    timestamps: np.ndarray,
+    positions: np.ndarray,
+    session_ids: np.ndarray,
+    name_count: int
+) -> Dict[str, Any]:
+    """partial_flow_metrics for events already sessionised with Sessionizer.split_columns."""
+    kept_users, kept_names, kept_timestamps = users[positions], names[positions], timestamps[positions]
+
+    if len(positions):
+        firsts = np.r_[0, np.flatnonzero(np.diff(session_ids)) + 1]
+        lasts = np.r_[firsts[1:] - 1, len(positions) - 1]
+        user_count = int(np.count_nonzero(np.r_[True, kept_users[1:] != kept_users[:-1]]))
+    else:
+        firsts = lasts = np.empty(0, dtype=np.int64)
+        user_count = 0
+
+    # Time between consecutive events of the same flow, one digest per (source, target) pair
+    same_flow = session_ids[1:] == session_ids[:-1]
+    pairs = kept_names[:-1][same_flow].astype(np.int64) * name_count + kept_names[1:][same_flow]
+    transition_digests = TDigest.from_groups(pairs, np.diff(kept_timestamps)[same_flow])
+
+    return {
+        "users": user_count,
+        "events": len(positions),
+        "duplicates": len(users) - len(positions),
+        "length_counts": np.bincount(lasts - firsts + 1) if len(positions) else np.zeros(1, dtype=np.int64),
+        "duration_digest": TDigest.from_values(kept_timestamps[lasts] - kept_timestamps[firsts]),
+        "transition_digests": transition_digests,
+        "event_counts": np.bincount(kept_names, minlength=name_count),
+        "entry_counts": np.bincount(kept_names[firsts], minlength=name_count),
+        "exit_counts": np.bincount(kept_names[lasts], minlength=name_count)
+    }
+
+def histogram_distribution(counts: np.ndarray) -> Dict[str, float]:
+    """
+    Mean, percentiles and maximum of non-negative integers given as a
+    histogram (``counts[v]`` = occurrences of ``v``), exactly as
+    np.percentile would compute them over the expanded values.
+    """
+    total = int(counts.sum())
+    if not total:
+        return {"mean": 0, "p50": 0, "p90": 0, "p99": 0, "max": 0}
+    cumulative = np.cumsum(counts)
+    values = np.arange(len(counts))
+
+    def percentile(p: float) -> float:
+        rank = p / 100 * (total - 1)
+        lower = np.searchsorted(cumulative, np.floor(rank), side="right")
+        upper = np.searchsorted(cumulative, np.ceil(rank), side="right")
+        return lower + (upper - lower) * (rank - np.floor(rank))
+
+    return {
+        "mean": round(float((values * counts).sum() / total), 2),
+        "p50": round(float(percentile(50)), 2),
+        "p90": round(float(percentile(90)), 2),
+        "p99": round(float(percentile(99)), 2),
+        "max": int(np.flatnonzero(counts)[-1])
+    }
+
+def merge_flow_metrics(partials: List[Dict[str, Any]], codec: EventCodec, top_k: int = 10) -> Dict[str, Any]:
+    """Combine partition aggregates into the final flow metrics."""
+    name_count = len(codec.names)
+    length_counts = np.zeros(max((len(p["length_counts"]) for p in partials), default=1), dtype=np.int64)
+    durations = TDigest()
+    transitions: Dict[int, TDigest] = {}
+    for p in partials:
+        length_counts[:len(p["length_counts"])] += p["length_counts"]
+        durations.merge(p["duration_digest"])
+        for pair, digest in p["transition_digests"].items():
+            transitions.setdefault(pair, TDigest()).merge(digest)
+
+    def summed(key: str) -> np.ndarray:
+        return sum((p[key] for p in partials), np.zeros(name_count, dtype=np.int64))
+
+    def top(counts: np.ndarray) -> Dict[str, int]:
+        order = np.argsort(counts, kind="stable")[::-1][:top_k]
+        return {codec.decode(int(code)): int(counts[code]) for code in order if counts[code]}
+
+    def duration(digest: TDigest) -> Dict[str, float]:
+        summary = digest.summary(percentiles=(25, 50, 75, 90, 99), scale=1000.0)
+        summary.pop("count")
+        return summary
+
+    top_transitions = sorted(transitions.items(), key=lambda item: item[1].count, reverse=True)[:top_k]
+
+    return {
+        "users": sum(p["users"] for p in partials),
+        "flows": int(length_counts.sum()),
+        "events": sum(p["events"] for p in partials),
+        "duplicates_removed": sum(p["duplicates"] for p in partials),
+        "single_event_flows": int(length_counts[1]) if len(length_counts) > 1 else 0,
+        "events_per_flow": histogram_distribution(length_counts),
+        "flow_duration_seconds": duration(durations),
+        "transition_seconds": {
+            f"{codec.decode(pair // name_count)} → {codec.decode(pair % name_count)}":
+                digest.summary(percentiles=(25, 50, 75, 90), scale=1000.0)
+            for pair, digest in top_transitions
+        },
+        "event_counts": top(summed("event_counts")),
+        "entry_events": top(summed("entry_counts")),
+        "exit_events": top(summed("exit_counts"))
+    }
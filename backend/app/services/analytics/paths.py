@@ -0,0 +1,238 @@
+import heapq
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+# Event codes are packed into n-gram keys with this many bits each
+CODE_BITS = 21
+CODE_MASK = (1 << CODE_BITS) - 1
+
+class EventCodec:
+    """Assigns dense integer codes to event names in order of first appearance."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def encode(self, name: str) -> int:
+        code = self.codes.get(name)
+        if code is None:
+            code = len(self.names)
+            if code > CODE_MASK:
+                raise ValueError("Too many distinct event names to encode")
+            self.codes[name] = code
+            self.names.append(name)
+        return code
+
+    def encode_all(self, names: Iterable[str]) -> List[int]:
+        return [self.encode(name) for name in names]
+
+    def decode(self, code: int) -> str:
+        return self.names[code]
+
+def pack(codes: Sequence[int]) -> int:
+    """Pack a sequence of event codes into one int key (first code in the highest bits)."""
+    key = 0
+    for code in codes:
+        key = (key << CODE_BITS) | code
+    return key
+
+def unpack(key: int, length: int) -> List[int]:
+    codes = []
+    for _ in range(length):
+        codes.append(key & CODE_MASK)
+        key >>= CODE_BITS
+    return codes[::-1]
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters sketch.
+
+    Tracks at most ``capacity`` keys. When a new key arrives and the sketch is
+    full, the key with the smallest count is replaced and the newcomer inherits
+    that count (recorded as its maximum overestimation). Any key with a true
+    frequency above total/capacity is guaranteed to be tracked.
+
+    The minimum is found through a heap whose entries may be stale (counts only
+    grow), so increments are O(1) and stale entries are refreshed on eviction.
+    """
+
+    __slots__ = ("capacity", "counts", "errors", "total", "_heap")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        self.total = 0
+        self._heap: List[Tuple[int, int, Hashable]] = []
+
+    def add(self, key: Hashable, count: int = 1):
+        self.total += count
+        if key in self.counts:
+            self.counts[key] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+            heapq.heappush(self._heap, (count, id(key), key))
+            return
+
+        heap = self._heap
+        while True:
+            stored, tiebreak, victim = heap[0]
+            current = self.counts[victim]
+            if stored == current:
+                break
+            heapq.heapreplace(heap, (current, tiebreak, victim))
+        del self.counts[victim]
+        del self.errors[victim]
+        self.counts[key] = current + count
+        self.errors[key] = current
+        heapq.heapreplace(heap, (current + count, id(key), key))
+
+    def merge(self, other: "SpaceSaving"):
+        """Fold another sketch into this one (counts stay upper bounds)."""
+        for key, count in other.counts.items():
+            self.add(key, count)
+
+    def top(self, k: int) -> List[Tuple[Hashable, int, int]]:
+        """Return up to k (key, count, max_error) tuples, most frequent first."""
+        ranked = heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+class NgramCounter:
+    """Counts event n-grams of lengths 2..n over integer-coded sequences, keeping the heaviest."""
+
+    def __init__(self, n: int = 3, capacity: int = 1000):
+        self.n = n
+        self.sketches = {length: SpaceSaving(capacity) for length in range(2, n + 1)}
+
+    def add_sequence(self, codes: Sequence[int]):
+        for length, sketch in self.sketches.items():
+            key = 0
+            mask = (1 << (CODE_BITS * length)) - 1
+            # Rolling key: shift in the next code and drop the oldest
+            for i, code in enumerate(codes):
+                key = ((key << CODE_BITS) | code) & mask
+                if i >= length - 1:
+                    sketch.add(key)
+
+    def top(self, k: int, codec: EventCodec, separator: str = " → ") -> Dict[str, int]:
+        """Most frequent n-grams of all lengths as {"a → b": count}."""
+        entries = []
+        for length, sketch in self.sketches.items():
+            for key, count, _ in sketch.top(k):
+                entries.append((separator.join(codec.decode(c) for c in unpack(key, length)), count))
+        entries.sort(key=lambda entry: entry[1], reverse=True)
+        return dict(entries[:k])
+
+class PathAnalyzer:
+    """
+    Streaming path and transition analysis over event sequences (e.g. flows).
+
+    Keeps per-event next/previous transitions and per-position Sankey links,
+    each as a bounded heavy-hitters sketch, plus top n-grams. Memory depends on
+    the number of distinct events and ``top_k``, not on the number of flows.
+    """
+
+    def __init__(
+        self,
+        n: int = 3,
+        top_k: int = 10,
+        depth: int = 5,
+        capacity_factor: int = 4,
+        codec: Optional[EventCodec] = None
+    ):
+        self.top_k = top_k
+        self.depth = depth
+        self.capacity = top_k * capacity_factor
+        # Pass a codec to feed sequences that were coded elsewhere (e.g. FlowColumns)
+        self.codec = codec or EventCodec()
+        self.ngrams = NgramCounter(n, capacity=max(1000, self.capacity))
+        self.event_counts: Dict[int, int] = defaultdict(int)
+        self.next_steps: Dict[int, SpaceSaving] = {}
+        self.previous_steps: Dict[int, SpaceSaving] = {}
+        # Positional Sankey: node key = (level << CODE_BITS) | code, acyclic by construction
+        self.node_counts: Dict[int, int] = defaultdict(int)
+        self.links: Dict[int, SpaceSaving] = {}
+        self.sequences = 0
+
+    def _sketch(self, table: Dict[int, SpaceSaving], key: int) -> SpaceSaving:
+        sketch = table.get(key)
+        if sketch is None:
+            sketch = table[key] = SpaceSaving(self.capacity)
+        return sketch
+
+    def add_names(self, names: Iterable[str]):
+        self.add_sequence(self.codec.encode_all(names))
+
+    def add_sequence(self, codes: Sequence[int]):
+        """Add one integer-coded sequence."""
+        if not codes:
+            return
+        self.sequences += 1
+        self.ngrams.add_sequence(codes)
+
+        previous = None
+        for code in codes:
+            self.event_counts[code] += 1
+            if previous is not None:
+                self._sketch(self.next_steps, previous).add(code)
+                self._sketch(self.previous_steps, code).add(previous)
+            previous = code
+
+        previous_node = None
+        for level, code in enumerate(codes[:self.depth]):
+            node = (level << CODE_BITS) | code
+            self.node_counts[node] += 1
+            if previous_node is not None:
+                self._sketch(self.links, previous_node).add(node)
+            previous_node = node
+
+    def _node_id(self, node: int) -> str:
+        return f"{node >> CODE_BITS}:{self.codec.decode(node & CODE_MASK)}"
+
+    def sankey(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Sankey nodes and edges by step position, keeping the top_k outgoing links per node."""
+        edges = []
+        linked = set()
+        for source, sketch in self.links.items():
+            for target, count, _ in sketch.top(self.top_k):
+                edges.append({"source": self._node_id(source), "target": self._node_id(target), "count": count})
+                linked.update((source, target))
+        nodes = [
+            {
+                "id": self._node_id(node),
+                "label": self.codec.decode(node & CODE_MASK),
+                "count": count,
+                "level": node >> CODE_BITS
+            }
+            for node, count in self.node_counts.items()
+            if node in linked or self.depth == 1
+        ]
+        nodes.sort(key=lambda node: (node["level"], -node["count"]))
+        return {"nodes": nodes, "edges": edges}
+
+    def transitions(self) -> Dict[str, Dict[str, Any]]:
+        """Top next and previous events for every event."""
+        def ranked(table: Dict[int, SpaceSaving], code: int) -> List[Dict[str, Any]]:
+            sketch = table.get(code)
+            if sketch is None:
+                return []
+            return [{"event": self.codec.decode(other), "count": count} for other, count, _ in sketch.top(self.top_k)]
+
+        return {
+            self.codec.decode(code): {
+                "count": count,
+                "next": ranked(self.next_steps, code),
+                "previous": ranked(self.previous_steps, code)
+            }
+            for code, count in sorted(self.event_counts.items(), key=lambda item: item[1], reverse=True)
+        }
+
+    def to_dict(self, top_paths: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "sequences": self.sequences,
+            "sankey": self.sankey(),
+            "transitions": self.transitions(),
+            "top_paths": self.ngrams.top(top_paths or self.top_k * 2, self.codec)
+        }
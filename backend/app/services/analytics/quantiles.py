@@ -0,0 +1,212 @@
+import math
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+
+# Buffered values are folded into the centroids once this many are pending
+BUFFER_SIZE = 4096
+
+# Header of the binary encoding: compression, min, max, centroid count
+_HEADER = struct.Struct("<dddI")
+
+class TDigest:
+    """
+    Mergeable streaming quantile sketch (merging t-digest).
+
+    Values are summarised by weighted centroids sized with the k1 scale
+    function, so centroids are small near the tails and larger around the
+    median. At most about ``compression / 2`` centroids are kept regardless of
+    how many values were added, and quantiles are accurate to a fraction of a
+    percent in rank (better at the extremes). Digests built over separate
+    partitions or days can be merged, and serialised with ``to_bytes``.
+
+    Counts, the mean, the minimum and the maximum are exact.
+    """
+
+    def __init__(self, compression: float = 200.0):
+        self.compression = compression
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.min = math.inf
+        self.max = -math.inf
+        self._pending_means: List[np.ndarray] = []
+        self._pending_weights: List[np.ndarray] = []
+        self._pending = 0
+        self._buffer: List[float] = []
+        self._buffer_weights: List[float] = []
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], compression: float = 200.0) -> "TDigest":
+        digest = cls(compression)
+        digest.add_many(values)
+        return digest
+
+    @classmethod
+    def from_groups(
+        cls,
+        keys: np.ndarray,
+        values: np.ndarray,
+        compression: float = 200.0
+    ) -> Dict[int, "TDigest"]:
+        """
+        One digest per distinct key, built in a single vectorised pass.
+
+        Much faster than building many small digests one by one, e.g. a
+        digest of step times for every (source, target) event pair.
+        """
+        if not len(keys):
+            return {}
+        keys = np.asarray(keys, dtype=np.int64)
+        if values.dtype.kind in "iu" and keys.min() >= 0 and values.min() >= 0 \
+                and keys.max() < 2**23 and values.max() < 2**40:
+            # Non-negative integers (e.g. ms gaps) fit in one sort key
+            order = np.argsort((keys << 40) | values.astype(np.int64))
+        else:
+            order = np.lexsort((values, keys))
+        keys, values = keys[order], values[order].astype(np.float64)
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(keys)])
+        group_sizes = np.repeat(sizes, sizes)
+        positions = np.arange(len(keys)) - np.repeat(starts, sizes)
+        q = (positions + 0.5) / group_sizes
+        k = np.floor(compression / (2 * math.pi) * np.arcsin(2 * q - 1))
+        centroid_starts = np.flatnonzero(np.r_[True, (k[1:] != k[:-1]) | (keys[1:] != keys[:-1])])
+        weights = np.diff(np.r_[centroid_starts, len(keys)]).astype(np.float64)
+        means = np.add.reduceat(values, centroid_starts) / weights
+        bounds = np.searchsorted(centroid_starts, np.r_[starts, len(keys)])
+
+        digests = {}
+        for i, start in enumerate(starts):
+            digest = cls(compression)
+            digest.means = means[bounds[i]:bounds[i + 1]]
+            digest.weights = weights[bounds[i]:bounds[i + 1]]
+            digest.min = float(values[start])
+            digest.max = float(values[start + sizes[i] - 1])
+            digests[int(keys[start])] = digest
+        return digests
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        self._buffer.append(value)
+        self._buffer_weights.append(weight)
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._flush_buffer()
+
+    def _flush_buffer(self) -> None:
+        if self._buffer:
+            values = np.array(self._buffer, dtype=np.float64)
+            weights = np.array(self._buffer_weights, dtype=np.float64)
+            self._buffer, self._buffer_weights = [], []
+            self._push(values, weights)
+
+    def add_many(self, values: Iterable[float]) -> None:
+        values = np.asarray(values if isinstance(values, (np.ndarray, list, tuple)) else list(values), dtype=np.float64)
+        if len(values):
+            self._push(values, np.ones(len(values), dtype=np.float64))
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """Fold another digest into this one (in place) and return self."""
+        other._compress()
+        if len(other.means):
+            self._push(other.means, other.weights, other.min, other.max)
+        return self
+
+    def _push(
+        self,
+        means: np.ndarray,
+        weights: np.ndarray,
+        low: Optional[float] = None,
+        high: Optional[float] = None
+    ) -> None:
+        self.min = min(self.min, float(means.min()) if low is None else low)
+        self.max = max(self.max, float(means.max()) if high is None else high)
+        self._pending_means.append(means)
+        self._pending_weights.append(weights)
+        self._pending += len(means)
+        if self._pending >= BUFFER_SIZE:
+            self._compress()
+
+    def _compress(self) -> None:
+        self._flush_buffer()
+        if not self._pending:
+            return
+        means = np.concatenate([self.means] + self._pending_means)
+        weights = np.concatenate([self.weights] + self._pending_weights)
+        self._pending_means, self._pending_weights, self._pending = [], [], 0
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # Centroid of each point in k-space; points sharing a unit interval are merged
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = np.floor(self.compression / (2 * math.pi) * np.arcsin(np.clip(2 * q - 1, -1.0, 1.0)))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    @property
+    def count(self) -> int:
+        self._compress()
+        return int(round(self.weights.sum()))
+
+    def mean(self) -> Optional[float]:
+        self._compress()
+        if not len(self.weights):
+            return None
+        return float((self.means * self.weights).sum() / self.weights.sum())
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """Estimated values at the given quantiles (0..1); None for an empty digest."""
+        self._compress()
+        if not len(self.weights):
+            return [None] * len(qs)
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        x = np.r_[0.0, centers, total]
+        y = np.r_[self.min, self.means, self.max]
+        return [float(v) for v in np.interp(np.asarray(qs, dtype=np.float64) * total, x, y)]
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+
+    def cdf(self, values: Sequence[float]) -> List[float]:
+        """Estimated share (0..1) of the weight at or below each value; inverse of ``quantiles``."""
+        self._compress()
+        if not len(self.weights):
+            return [0.0] * len(values)
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        x = np.r_[self.min, self.means, self.max]
+        y = np.r_[0.0, centers, total] / total
+        return [float(v) for v in np.interp(np.asarray(values, dtype=np.float64), x, y)]
+
+    def summary(self, percentiles: Sequence[int] = (25, 50, 75, 90, 99), scale: float = 1.0) -> Dict[str, float]:
+        """
+        Count, mean, requested percentiles and maximum, divided by ``scale``
+        (e.g. 1000 for milliseconds to seconds) and rounded to 2 decimals.
+        """
+        count = self.count
+        if not count:
+            return {"count": 0, "mean": 0, **{f"p{p}": 0 for p in percentiles}, "max": 0}
+        values = self.quantiles([p / 100 for p in percentiles])
+        return {
+            "count": count,
+            "mean": round(self.mean() / scale, 2),
+            **{f"p{p}": round(value / scale, 2) for p, value in zip(percentiles, values)},
+            "max": round(self.max / scale, 2)
+        }
+
+    def to_bytes(self) -> bytes:
+        self._compress()
+        header = _HEADER.pack(self.compression, self.min, self.max, len(self.means))
+        return header + self.means.tobytes() + self.weights.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TDigest":
+        compression, low, high, size = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        digest = cls(compression)
+        digest.means = np.frombuffer(data, dtype=np.float64, count=size, offset=offset).copy()
+        digest.weights = np.frombuffer(data, dtype=np.float64, count=size, offset=offset + size * 8).copy()
+        digest.min, digest.max = low, high
+        return digest
@@ -0,0 +1,125 @@
+from array import array
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+DAY_MS = 86_400_000
+
+# Day 0 (1970-01-01) was a Thursday; cohort weeks start on Monday
+_WEEK_SHIFT = 3
+
+def week_of(days):
+    """Monday-based week index of UTC day indices (works on scalars and arrays)."""
+    return (days + _WEEK_SHIFT) // 7
+
+def week_start_day(week: int) -> int:
+    """Day index of the Monday starting a week."""
+    return week * 7 - _WEEK_SHIFT
+
+def day_to_date(day: int) -> date:
+    return date(1970, 1, 1) + timedelta(days=int(day))
+
+class ActivityColumns:
+    """
+    Distinct (user, active day) pairs of many users as int32 columns, plus
+    each user's first-seen day.
+
+    Users must be added one at a time; their days need not be sorted.
+    """
+
+    def __init__(self):
+        self.user_ids: List[str] = []
+        self.user_codes: Dict[str, int] = {}
+        self._users = array("i")
+        self._days = array("i")
+        self._first_days = array("i")
+
+    def add_user(self, user_id: str, days: Sequence[int], first_day: int):
+        user_code = len(self.user_ids)
+        self.user_ids.append(user_id)
+        self.user_codes[user_id] = user_code
+        self._users.extend([user_code] * len(days))
+        self._days.extend(days)
+        self._first_days.append(first_day)
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(users, days, first_days) as numpy arrays sharing the collected buffers."""
+        return (
+            np.frombuffer(self._users, dtype=np.int32),
+            np.frombuffer(self._days, dtype=np.int32),
+            np.frombuffer(self._first_days, dtype=np.int32)
+        )
+
+    def mask(self, user_ids: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Boolean per-user mask selecting ``user_ids`` (all users when None)."""
+        if user_ids is None:
+            return np.ones(len(self.user_ids), dtype=bool)
+        selected = np.zeros(len(self.user_ids), dtype=bool)
+        codes = [self.user_codes[user_id] for user_id in user_ids if user_id in self.user_codes]
+        selected[codes] = True
+        return selected
+
+def cohort_matrix(
+    users: np.ndarray,
+    days: np.ndarray,
+    first_days: np.ndarray,
+    offsets: Sequence[int],
+    first_week: int,
+    weeks: int,
+    last_complete_day: int,
+    user_mask: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Day-N retention of weekly first-seen cohorts.
+
+    A user belongs to the cohort of the week of their first-seen day and is
+    retained at offset N if they were active exactly N days after it. A user
+    only counts towards the denominator of offset N once that day is complete
+    (first day + N <= last_complete_day), so recent cohorts aren't understated.
+
+    Args:
+        users, days: Distinct (user code, active day) pairs
+        first_days: First-seen day of each user code
+        offsets: Day offsets to report (e.g. 1, 7, 30)
+        first_week: Week index of the first cohort
+        weeks: Number of consecutive cohorts
+        last_complete_day: Last day whose activity is fully recorded
+        user_mask: Optional per-user-code selection (e.g. one app version's users)
+
+    Returns:
+        Dict with per-cohort ``users`` (weeks,), and ``retained`` and
+        ``eligible`` (weeks, len(offsets)) counts
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    k = len(offsets)
+    first_days = first_days.astype(np.int64)
+    cohorts = week_of(first_days) - first_week
+    in_range = (cohorts >= 0) & (cohorts < weeks)
+    if user_mask is not None:
+        in_range &= user_mask
+    cohorts = np.where(in_range, cohorts, -1)
+
+    sizes = np.bincount(cohorts[in_range], minlength=weeks)
+
+    # Users become eligible for offset N once their day N is complete
+    eligible = np.zeros((weeks, k), dtype=np.int64)
+    for j, offset in enumerate(offsets):
+        selected = in_range & (first_days + offset <= last_complete_day)
+        eligible[:, j] = np.bincount(cohorts[selected], minlength=weeks)
+
+    # Map each activity day to the reported offset it hits, if any
+    offset_index = np.full(int(offsets.max()) + 1 if k else 1, -1, dtype=np.int64)
+    offset_index[offsets] = np.arange(k)
+    pair_cohorts = cohorts[users]
+    deltas = days.astype(np.int64) - first_days[users]
+    hits = (pair_cohorts >= 0) & (deltas >= 0) & (deltas < len(offset_index)) & (days <= last_complete_day)
+    columns = offset_index[deltas[hits]]
+    hit = columns >= 0
+    retained = np.bincount(
+        pair_cohorts[hits][hit] * k + columns[hit], minlength=weeks * k
+    ).reshape(weeks, k)
+
+    return {"users": sizes, "retained": retained, "eligible": eligible}
@@ -0,0 +1,159 @@
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+APP_LAUNCHED_EVENT = "App Launched"
+
+class SessionMode(str, Enum):
+    LAUNCH = "launch"          # new session at every App Launched event
+    INACTIVITY = "inactivity"  # new session after a gap longer than gap_ms
+    HYBRID = "hybrid"          # whichever comes first
+
+class SessionTracker:
+    """
+    Streaming session state for one user's time-ordered events.
+
+    Duplicates (same name and timestamp as an event already seen) are detected
+    per run of equal timestamps, so only the names at the current timestamp
+    are remembered.
+    """
+
+    __slots__ = ("split_on_launch", "gap_ms", "launch_event", "last_timestamp", "_names_at_timestamp")
+
+    def __init__(self, split_on_launch: bool, gap_ms: Optional[int], launch_event: str):
+        self.split_on_launch = split_on_launch
+        self.gap_ms = gap_ms
+        self.launch_event = launch_event
+        self.last_timestamp: Optional[int] = None
+        self._names_at_timestamp = set()
+
+    def step(self, name: str, timestamp: int) -> Optional[bool]:
+        """
+        Apply the next event.
+
+        Returns:
+            None if the event is a duplicate, True if it starts a new session,
+            False if it continues the current one
+        """
+        last = self.last_timestamp
+        if timestamp == last:
+            if name in self._names_at_timestamp:
+                return None
+            self._names_at_timestamp.add(name)
+        else:
+            self._names_at_timestamp.clear()
+            self._names_at_timestamp.add(name)
+        self.last_timestamp = timestamp
+
+        if last is None:
+            return True
+        if self.split_on_launch and name == self.launch_event:
+            return True
+        return self.gap_ms is not None and timestamp - last > self.gap_ms
+
+class Sessionizer:
+    """
+    Splits event histories into sessions (flows).
+
+    Works on one user's time-ordered dict stream (``split``), event by event
+    (``tracker``) and on columnar arrays of many users (``split_columns``).
+    All of them apply the same rules: a session starts at a user's first
+    event, at App Launched (launch and hybrid modes) and after an inactivity gap longer than ``gap_ms`` (inactivity and hybrid modes).
+    Duplicate events (same user, name and timestamp) are dropped.
+    """
+
+    def __init__(
+        self,
+        mode: SessionMode = SessionMode.LAUNCH,
+        gap_ms: Optional[int] = None,
+        launch_event: str = APP_LAUNCHED_EVENT
+    ):
+        mode = SessionMode(mode)
+        if mode != SessionMode.LAUNCH and not gap_ms:
+            raise ValueError(f"Session mode '{mode.value}' requires an inactivity gap")
+        self.mode = mode
+        self.gap_ms = gap_ms if mode != SessionMode.LAUNCH else None
+        self.launch_event = launch_event
+
+    @property
+    def split_on_launch(self) -> bool:
+        return self.mode != SessionMode.INACTIVITY
+
+    def tracker(self) -> SessionTracker:
+        """New streaming state for one user."""
+        return SessionTracker(self.split_on_launch, self.gap_ms, self.launch_event)
+
+    def split(
+        self,
+        events: Iterable[Dict[str, Any]],
+        name_key: str = "name",
+        timestamp_key: str = "timestamp"
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield one user's time-ordered events as sessions, without duplicates."""
+        tracker = self.tracker()
+        session = []
+        for event in events:
+            starts = tracker.step(event[name_key], event[timestamp_key])
+            if starts is None:
+                continue
+            if starts and session:
+                yield session
+                session = []
+            session.append(event)
+        if session:
+            yield session
+
+    def split_columns(
+        self,
+        users: np.ndarray,
+        names: np.ndarray,
+        timestamps: np.ndarray,
+        launch_code: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sessionise columnar events sorted by (user, timestamp).
+
+        Args:
+            users: Integer user codes
+            names: Integer event name codes
+            timestamps: Timestamps in milliseconds
+            launch_code: Code of the launch event in ``names`` (None if it never occurs)
+
+        Returns:
+            (positions of the kept events, session number of each kept event);
+            session numbers are consecutive from 0 in input order
+        """
+        count = len(timestamps)
+        if count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        # Sorted-run dedup: duplicates can only occur within runs of equal
+        # (user, timestamp), so rows in such runs are sorted on one packed
+        # (run, name) key. The sort is stable, so the first occurrence is kept.
+        tie = (users[1:] == users[:-1]) & (timestamps[1:] == timestamps[:-1])
+        if tie.any():
+            run = np.empty(count, dtype=np.int64)
+            run[0] = 0
+            np.cumsum(~tie, out=run[1:])
+            in_run = np.zeros(count, dtype=bool)
+            in_run[1:] |= tie
+            in_run[:-1] |= tie
+            rows = np.flatnonzero(in_run)
+            keys = run[rows] * (int(names.max()) + 1) + names[rows]
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            keep = np.ones(count, dtype=bool)
+            keep[rows[order[1:][sorted_keys[1:] == sorted_keys[:-1]]]] = False
+            positions = np.flatnonzero(keep)
+        else:
+            positions = np.arange(count)
+
+        users, names, timestamps = users[positions], names[positions], timestamps[positions]
+        starts = np.empty(len(positions), dtype=bool)
+        starts[0] = True
+        starts[1:] = users[1:] != users[:-1]
+        if self.split_on_launch and launch_code is not None:
+            starts |= names == launch_code
+        if self.gap_ms is not None:
+            starts[1:] |= np.diff(timestamps) > self.gap_ms
+        return positions, np.cumsum(starts) - 1
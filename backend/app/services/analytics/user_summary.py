@@ -0,0 +1,88 @@
+from collections import Counter, deque
+from datetime import datetime, timezone
+from statistics import median
+from typing import Any, Dict, List, Optional
+from .sessions import Sessionizer, SessionMode
+
+class UserHistorySummary:
+    """
+    Single-pass summary of one user's event history.
+    
+    Events must be fed in timestamp order. Only aggregates and a bounded tail
+    of the most recent events are kept, so memory does not grow with the
+    length of the history.
+    
+    By default a session starts at an App Launched event or after an
+    inactivity gap longer than ``session_gap_ms``. Duplicate events are skipped.
+    """
+    
+    def __init__(
+        self,
+        session_gap_ms: int,
+        recent_events: int,
+        top_events: int = 10,
+        sessionizer: Optional[Sessionizer] = None
+    ):
+        self.sessions = (sessionizer or Sessionizer(SessionMode.HYBRID, gap_ms=session_gap_ms)).tracker()
+        self.top_events = top_events
+        self.total_events = 0
+        self.first_seen: Optional[int] = None
+        self.last_seen: Optional[int] = None
+        self.event_counts: Counter = Counter()
+        self.active_hours = [0] * 24
+        self.active_days = set()
+        self.session_durations_ms: List[int] = []
+        self.recent = deque(maxlen=recent_events)
+        self._session_start: Optional[int] = None
+    
+    def add(self, name: str, timestamp: int):
+        """Add the next event of the history."""
+        starts = self.sessions.step(name, timestamp)
+        if starts is None:
+            return
+        if starts:
+            if self._session_start is not None:
+                self.session_durations_ms.append(self.last_seen - self._session_start)
+            self._session_start = timestamp
+        
+        if self.first_seen is None:
+            self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.total_events += 1
+        self.event_counts[name] += 1
+        
+        dt = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
+        self.active_hours[dt.hour] += 1
+        self.active_days.add(dt.date())
+        self.recent.append((name, timestamp))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the summary as a JSON-serialisable dictionary."""
+        durations = list(self.session_durations_ms)
+        if self._session_start is not None:
+            durations.append(self.last_seen - self._session_start)
+        minutes = [d / 60000 for d in durations]
+        busiest_hours = sorted(range(24), key=lambda h: self.active_hours[h], reverse=True)[:3]
+        
+        return {
+            "total_events": self.total_events,
+            "first_seen": _iso(self.first_seen),
+            "last_seen": _iso(self.last_seen),
+            "active_days": len(self.active_days),
+            "session_count": len(durations),
+            "avg_session_minutes": round(sum(minutes) / len(minutes), 2) if minutes else 0,
+            "median_session_minutes": round(median(minutes), 2) if minutes else 0,
+            "longest_session_minutes": round(max(minutes), 2) if minutes else 0,
+            "active_hours_utc": {h: self.active_hours[h] for h in range(24) if self.active_hours[h]},
+            "most_active_hours_utc": [h for h in busiest_hours if self.active_hours[h]],
+            "top_events": dict(self.event_counts.most_common(self.top_events)),
+            "distinct_events": len(self.event_counts),
+            "recent_events": [
+                {"name": name, "time": _iso(timestamp)} for name, timestamp in self.recent
+            ]
+        }
+
+def _iso(timestamp: Optional[int]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
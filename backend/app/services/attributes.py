@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.data_access.interfaces import EventDataAccess
+from app.services.analytics.attributes import AttributeProfile
+
+class AttributeBreakdownService:
+    """
+    Per-key breakdown of the attributes of one event: top values with counts,
+    null rates and numeric histograms.
+
+    Events are streamed in batches and folded into bounded-size sketches on a
+    worker thread, so memory doesn't grow with the number of events or
+    distinct values and the event loop stays free.
+    """
+
+    def __init__(self, event_dao: EventDataAccess):
+        self.event_dao = event_dao
+
+    async def compute(
+        self,
+        event_name: str,
+        version: Optional[str] = None,
+        user_ids: Optional[List[str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        top_k: int = 10,
+        bins: int = 10
+    ) -> Dict[str, Any]:
+        """
+        Args:
+            event_name: The event whose attributes to summarise
+            version: Only count events of users who launched this app version
+            user_ids: Only count events of these users (e.g. a segment)
+            start_date: Only count events at or after this time
+            end_date: Only count events at or before this time
+            top_k: Most frequent values to report per attribute
+            bins: Histogram bins for numeric attributes
+        """
+        if version is not None:
+            user_ids = await self.event_dao.get_version_user_ids(version, user_ids)
+
+        profile = AttributeProfile(top_k=top_k, bins=bins)
+        if user_ids is None or user_ids:
+            async for batch in self.event_dao.iter_event_batches(
+                start_date=start_date, end_date=end_date, name=event_name, user_ids=user_ids
+            ):
+                await asyncio.to_thread(profile.add_batch, batch)
+        return {"event_name": event_name, "version": version, **profile.to_dict()}
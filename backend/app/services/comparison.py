@@ -0,0 +1,212 @@
+import asyncio
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.data_access.interfaces import EventDataAccess
+from app.services.analytics.flow_metrics import FlowColumns, merge_flow_metrics, session_flow_metrics
+from app.services.analytics.paths import PathAnalyzer, pack
+from app.services.analytics.sessions import Sessionizer, SessionMode
+from app.services.flows import FlowMetricsService
+from app.services.openai_service import OpenAIService
+from app.services.prompts.comparison import VersionComparisonHandler
+
+PATH_SEPARATOR = " → "
+
+class _VersionProfile:
+    """Flow metrics and path statistics of one version, with lookups for diffing."""
+
+    def __init__(self, version: str, metrics: Dict[str, Any], paths: PathAnalyzer):
+        self.version = version
+        self.metrics = metrics
+        self.paths = paths
+
+    def _codes(self, names: List[str]) -> Optional[List[int]]:
+        codes = [self.paths.codec.codes.get(name) for name in names]
+        return None if None in codes else codes
+
+    def transition_rate(self, source: str, target: str) -> float:
+        """Share of ``source`` occurrences directly followed by ``target``, in percent."""
+        codes = self._codes([source, target])
+        if codes is None or not self.paths.event_counts.get(codes[0]):
+            return 0.0
+        sketch = self.paths.next_steps.get(codes[0])
+        count = sketch.counts.get(codes[1], 0) if sketch else 0
+        return round(count / self.paths.event_counts[codes[0]] * 100, 2)
+
+    def path_rate(self, path: str) -> float:
+        """Occurrences of a path per 100 flows."""
+        names = path.split(PATH_SEPARATOR)
+        codes = self._codes(names)
+        sketch = self.paths.ngrams.sketches.get(len(names))
+        if codes is None or sketch is None or not self.paths.sequences:
+            return 0.0
+        return round(sketch.counts.get(pack(codes), 0) / self.paths.sequences * 100, 2)
+
+    def top_transitions(self, limit: int) -> List[str]:
+        pairs = [
+            (count, source, target)
+            for source, sketch in self.paths.next_steps.items()
+            for target, count in sketch.counts.items()
+        ]
+        pairs.sort(reverse=True)
+        return [
+            f"{self.paths.codec.decode(source)}{PATH_SEPARATOR}{self.paths.codec.decode(target)}"
+            for _, source, target in pairs[:limit]
+        ]
+
+    def top_paths(self) -> Dict[str, int]:
+        return self.paths.ngrams.top(self.paths.top_k, self.paths.codec, PATH_SEPARATOR)
+
+    def share(self, key: str, name: str) -> float:
+        flows = self.metrics["flows"]
+        return round(self.metrics[key].get(name, 0) / flows * 100, 2) if flows else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            **self.metrics,
+            "top_paths": self.top_paths()
+        }
+
+def summarise_columns(
+    columns: FlowColumns,
+    sessionizer: Sessionizer,
+    top_k: int = 10
+) -> Tuple[Dict[str, Any], PathAnalyzer]:
+    """
+    Flow metrics and path statistics of one version's events, sessionised once.
+
+    CPU-bound; runs on a worker thread so both versions are summarised at the
+    same time without blocking the event loop.
+    """
+    users, names, timestamps = columns.arrays()
+    positions, session_ids = sessionizer.split_columns(users, names, timestamps, columns.launch_code(sessionizer))
+    partial = session_flow_metrics(users, names, timestamps, positions, session_ids, len(columns.codec.names))
+    metrics = merge_flow_metrics([partial], columns.codec, top_k=top_k)
+    metrics["execution"] = {"mode": "in_process", "partitions": 1}
+
+    paths = PathAnalyzer(n=3, top_k=top_k, codec=columns.codec)
+    if len(positions):
+        flow_starts = np.flatnonzero(np.diff(session_ids)) + 1
+        for flow in np.split(names[positions], flow_starts):
+            paths.add_sequence(flow.tolist())
+    return metrics, paths
+
+def _delta(base: float, candidate: float) -> Dict[str, float]:
+    return {"base": base, "candidate": candidate, "delta": round(candidate - base, 2)}
+
+def _ranked_deltas(
+    keys: List[str],
+    base: Callable[[str], float],
+    candidate: Callable[[str], float],
+    limit: int,
+    label: str
+) -> List[Dict[str, Any]]:
+    """Base/candidate values for each key, largest absolute change first."""
+    rows = [{label: key, **_delta(base(key), candidate(key))} for key in keys]
+    rows.sort(key=lambda row: abs(row["delta"]), reverse=True)
+    return rows[:limit]
+
+class VersionComparisonService:
+    """
+    Compares the flows of two app versions.
+
+    Both versions are loaded and summarised concurrently, and only the compact
+    summaries are diffed (and optionally narrated by the LLM), so raw flows
+    never leave the server.
+    """
+
+    def __init__(self, event_dao: EventDataAccess, openai_service: Optional[OpenAIService] = None):
+        self.event_dao = event_dao
+        self.openai_service = openai_service
+        self.flow_metrics = FlowMetricsService(event_dao)
+
+    async def profile(
+        self,
+        version: str,
+        sessionizer: Sessionizer,
+        user_ids: Optional[List[str]] = None,
+        top_k: int = 10
+    ) -> _VersionProfile:
+        columns = await self.flow_metrics.load_columns(version, user_ids)
+        metrics, paths = await asyncio.to_thread(summarise_columns, columns, sessionizer, top_k)
+        return _VersionProfile(version, metrics, paths)
+
+    @staticmethod
+    def diff(base: _VersionProfile, candidate: _VersionProfile, limit: int = 10) -> Dict[str, Any]:
+        """Deltas in volume, flow length, step conversion, path distribution and entry/exit events."""
+        def union(first, second) -> List[str]:
+            return list(dict.fromkeys(list(first) + list(second)))
+
+        def transition_rate(profile: _VersionProfile):
+            return lambda step: profile.transition_rate(*step.split(PATH_SEPARATOR, 1))
+
+        return {
+            "volume": {key: _delta(base.metrics[key], candidate.metrics[key]) for key in ("users", "flows", "events")},
+            "session_length": {
+                key: {
+                    stat: _delta(base.metrics[key][stat], candidate.metrics[key][stat])
+                    for stat in base.metrics[key]
+                }
+                for key in ("events_per_flow", "flow_duration_seconds")
+            },
+            "step_conversion": _ranked_deltas(
+                union(base.top_transitions(limit * 2), candidate.top_transitions(limit * 2)),
+                transition_rate(base),
+                transition_rate(candidate),
+                limit, "step"
+            ),
+            "path_distribution": _ranked_deltas(
+                union(base.top_paths(), candidate.top_paths()),
+                base.path_rate,
+                candidate.path_rate,
+                limit, "path"
+            ),
+            "entry_events": _ranked_deltas(
+                union(base.metrics["entry_events"], candidate.metrics["entry_events"]),
+                lambda name: base.share("entry_events", name),
+                lambda name: candidate.share("entry_events", name),
+                limit, "event"
+            ),
+            "exit_events": _ranked_deltas(
+                union(base.metrics["exit_events"], candidate.metrics["exit_events"]),
+                lambda name: base.share("exit_events", name),
+                lambda name: candidate.share("exit_events", name),
+                limit, "event"
+            )
+        }
+
+    async def compare(
+        self,
+        base: str,
+        candidate: str,
+        sessionizer: Optional[Sessionizer] = None,
+        user_ids: Optional[List[str]] = None,
+        top_k: int = 10,
+        narrative: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Compare two versions.
+
+        Returns:
+            {"base": summary, "candidate": summary, "diff": deltas, "narrative": str or None}
+        """
+        sessionizer = sessionizer or Sessionizer(SessionMode.LAUNCH)
+        base_profile, candidate_profile = await asyncio.gather(
+            self.profile(base, sessionizer, user_ids, top_k),
+            self.profile(candidate, sessionizer, user_ids, top_k)
+        )
+        diff = self.diff(base_profile, candidate_profile, limit=top_k)
+
+        result = {
+            "base": base_profile.to_dict(),
+            "candidate": candidate_profile.to_dict(),
+            "diff": diff,
+            "narrative": None
+        }
+        if narrative:
+            if self.openai_service is None:
+                raise ValueError("A narrative was requested but no OpenAI service was provided")
+            handler = VersionComparisonHandler(self.openai_service)
+            result["narrative"] = await handler.narrate(base, candidate, json.dumps(diff))
+        return result
@@ -0,0 +1,71 @@
+"""
+Replicates events from MongoDB into the local SQLite event store.
+
+Runs as the ``event_sync`` job, periodically when EVENT_SYNC_INTERVAL_SECONDS
+is set, or from the command line:
+
+    poetry run python -m app.services.event_sync
+"""
+import asyncio
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.data_access.common import insert_watermark_floor
+from app.data_access.mongodb import MongoEventDataAccess
+from app.data_access.sqlite import SQLiteEventDataAccess
+from app.services.jobs import ProgressCallback
+
+# Key in the SQLite sync_state table holding the last copied MongoDB _id
+LAST_ID_KEY = "mongodb_last_id"
+
+async def sync_events(
+    source: MongoEventDataAccess,
+    target: SQLiteEventDataAccess,
+    batch_size: Optional[int] = None,
+    report_progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    Copy events inserted into MongoDB since the last sync.
+
+    Progress is committed after every batch, so an interrupted sync resumes
+    where it stopped. _ids are generated by the inserting clients, so an event
+    committed after the last sync can have a slightly smaller _id than the last
+    copied one; each sync starts INSERT_WATERMARK_SLACK_SECONDS before it.
+    Events are keyed by their MongoDB _id, so re-copying them is harmless.
+
+    Returns:
+        {"synced": number of events copied, "last_id": last copied _id}
+    """
+    batch_size = batch_size or settings.EVENT_SYNC_BATCH_SIZE
+    await target.ensure_indexes()
+    last_id = await target.get_sync_state(LAST_ID_KEY)
+    synced = 0
+    batch = []
+
+    async def flush():
+        nonlocal synced, last_id
+        await target.insert_events(batch)
+        last_id = str(batch[-1]["_id"])
+        await target.set_sync_state(LAST_ID_KEY, last_id)
+        synced += len(batch)
+        batch.clear()
+        if report_progress:
+            # The total is unknown up front; report activity without a fraction
+            await report_progress(0.0, f"{synced} events synced")
+
+    start_after = str(insert_watermark_floor(last_id)) if last_id else None
+    async for event in source.iter_events_after(start_after, batch_size=batch_size):
+        batch.append(event)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return {"synced": synced, "last_id": last_id}
+
+async def main():
+    source = MongoEventDataAccess()
+    target = SQLiteEventDataAccess()
+    result = await sync_events(source, target)
+    print(f"Synced {result['synced']} events into {target.path} (last id {result['last_id']})")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,287 @@
+"""
+Bulk export of events as Arrow IPC streams or Parquet files.
+
+Record batches are built straight from the raw event batches returned by the
+data access layer (no models are created) and written to the output as they
+arrive, so exports of any size stream in constant memory. Requires the
+optional ``pyarrow`` dependency (``poetry install -E export``).
+
+From the command line:
+
+    poetry run python -m app.services.export --format parquet --out events.parquet
+"""
+import argparse
+import asyncio
+import json
+from collections import Counter
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from app.data_access.factory import EventBackend, create_event_dao
+from app.data_access.interfaces import EventDataAccess
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+# Upper bound on typed attribute columns; rarer keys go to attributes_other
+MAX_ATTRIBUTE_COLUMNS = 200
+ATTRIBUTE_PREFIX = "attr."
+OTHER_ATTRIBUTES_COLUMN = "attributes_other"
+
+class ExportFormat(str, Enum):
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+MEDIA_TYPES = {
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet"
+}
+
+FILE_EXTENSIONS = {
+    ExportFormat.ARROW: "arrows",
+    ExportFormat.PARQUET: "parquet"
+}
+
+class ExportUnavailableError(RuntimeError):
+    """Raised when pyarrow is not installed."""
+    pass
+
+def export_available() -> bool:
+    return pa is not None
+
+def _is_bool(value: Any) -> bool:
+    return isinstance(value, bool)
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and -2**63 <= value < 2**63
+
+def _is_float(value: Any) -> bool:
+    return isinstance(value, float) or _is_int(value)
+
+def _is_string(value: Any) -> bool:
+    return isinstance(value, str)
+
+class AttributeColumns:
+    """
+    Flattens event attributes into typed ``attr.<key>`` columns.
+
+    Column types are inferred from the first batch: keys whose values are all
+    booleans, integers, numbers or strings get a bool, int64, float64 or string
+    column. Values that don't fit their column (or belong to keys that were
+    unseen, mixed-type, nested or beyond MAX_ATTRIBUTE_COLUMNS) are kept as
+    JSON in the ``attributes_other`` column, so nothing is lost.
+    """
+
+    def __init__(self, types: Dict[str, Any]):
+        self.types = types
+        self._accepts: Dict[str, Callable[[Any], bool]] = {
+            key: {
+                pa.bool_(): _is_bool,
+                pa.int64(): _is_int,
+                pa.float64(): _is_float,
+                pa.string(): _is_string
+            }[arrow_type]
+            for key, arrow_type in types.items()
+        }
+
+    @classmethod
+    def infer(cls, events: List[Dict[str, Any]], max_columns: int = MAX_ATTRIBUTE_COLUMNS) -> "AttributeColumns":
+        seen: Dict[str, set] = {}
+        frequency = Counter()
+        for event in events:
+            for key, value in (event.get("attributes") or {}).items():
+                if value is None:
+                    continue
+                seen.setdefault(key, set()).add(type(value))
+                frequency[key] += 1
+
+        types = {}
+        for key, _ in frequency.most_common():
+            if len(types) >= max_columns:
+                break
+            kinds = seen[key]
+            if kinds == {bool}:
+                types[key] = pa.bool_()
+            elif kinds == {int}:
+                types[key] = pa.int64()
+            elif kinds <= {int, float}:
+                types[key] = pa.float64()
+            elif kinds == {str}:
+                types[key] = pa.string()
+        return cls(dict(sorted(types.items())))
+
+    def schema(self) -> "pa.Schema":
+        return pa.schema(
+            [
+                pa.field("user_id", pa.dictionary(pa.int32(), pa.string())),
+                pa.field("name", pa.dictionary(pa.int32(), pa.string())),
+                pa.field("timestamp", pa.timestamp("ms"))
+            ]
+            + [pa.field(ATTRIBUTE_PREFIX + key, arrow_type) for key, arrow_type in self.types.items()]
+            + [pa.field(OTHER_ATTRIBUTES_COLUMN, pa.string())]
+        )
+
+    def to_batch(self, events: List[Dict[str, Any]]) -> "pa.RecordBatch":
+        values: Dict[str, List[Any]] = {key: [] for key in self.types}
+        other: List[Optional[str]] = []
+        for event in events:
+            attributes = event.get("attributes") or {}
+            leftover = {key: value for key, value in attributes.items() if key not in self._accepts}
+            for key, accepts in self._accepts.items():
+                value = attributes.get(key)
+                if value is None or accepts(value):
+                    values[key].append(value)
+                else:
+                    values[key].append(None)
+                    leftover[key] = value
+            other.append(json.dumps(leftover, default=str) if leftover else None)
+
+        schema = self.schema()
+        arrays = [
+            pa.array([event["user_id"] for event in events], pa.string()).dictionary_encode(),
+            pa.array([event["name"] for event in events], pa.string()).dictionary_encode(),
+            pa.array([event["timestamp"] for event in events], pa.timestamp("ms"))
+        ]
+        arrays += [pa.array(values[key], arrow_type) for key, arrow_type in self.types.items()]
+        arrays.append(pa.array(other, pa.string()))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the caller."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+class _BatchWriter:
+    """Arrow IPC stream or Parquet writer over a chunk sink; one Parquet row group per batch."""
+
+    def __init__(self, export_format: ExportFormat, sink: _ChunkSink, schema: "pa.Schema"):
+        self.format = export_format
+        if export_format == ExportFormat.PARQUET:
+            self._writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_stream(sink, schema)
+
+    def write(self, batch: "pa.RecordBatch"):
+        if self.format == ExportFormat.PARQUET:
+            self._writer.write_batch(batch, row_group_size=batch.num_rows or None)
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+
+async def export_events(
+    event_dao: EventDataAccess,
+    export_format: ExportFormat = ExportFormat.ARROW,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    name: Optional[str] = None,
+    user_id: Optional[str] = None,
+    batch_size: int = 10000
+) -> AsyncIterator[bytes]:
+    """
+    Stream matching events in the requested format.
+
+    Args:
+        event_dao: Event store to read from
+        export_format: Arrow IPC stream or Parquet
+        start_date, end_date, name, user_id: Same filters as get_events
+        batch_size: Events per record batch (and Parquet row group)
+
+    Yields:
+        Chunks of the encoded output, one per batch
+    """
+    if not export_available():
+        raise ExportUnavailableError("Event export requires pyarrow (poetry install -E export)")
+
+    sink = _ChunkSink()
+    columns: Optional[AttributeColumns] = None
+    writer: Optional[_BatchWriter] = None
+
+    def write(events: List[Dict[str, Any]]):
+        nonlocal columns, writer
+        if writer is None:
+            columns = AttributeColumns.infer(events)
+            writer = _BatchWriter(export_format, sink, columns.schema())
+        writer.write(columns.to_batch(events))
+        return sink.drain()
+
+    async for events in event_dao.iter_event_batches(
+        start_date=start_date,
+        end_date=end_date,
+        name=name,
+        user_id=user_id,
+        batch_size=batch_size
+    ):
+        # Encoding is CPU-bound; keep it off the event loop
+        chunk = await asyncio.to_thread(write, events)
+        if chunk:
+            yield chunk
+
+    if writer is None:
+        writer = _BatchWriter(export_format, sink, AttributeColumns({}).schema())
+    writer.close()
+    yield sink.drain()
+
+async def main():
+    parser = argparse.ArgumentParser(description="Export events as Arrow IPC or Parquet")
+    parser.add_argument("--out", required=True, help="Output file")
+    parser.add_argument("--format", type=ExportFormat, default=ExportFormat.PARQUET, choices=list(ExportFormat))
+    parser.add_argument("--backend", type=EventBackend, default=None, choices=list(EventBackend))
+    parser.add_argument("--start-date", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--end-date", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--name", default=None)
+    parser.add_argument("--user-id", default=None)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    event_dao = create_event_dao(args.backend)
+    written = 0
+    try:
+        with open(args.out, "wb") as output:
+            async for chunk in export_events(
+                event_dao,
+                args.format,
+                start_date=args.start_date,
+                end_date=args.end_date,
+                name=args.name,
+                user_id=args.user_id,
+                batch_size=args.batch_size
+            ):
+                output.write(chunk)
+                written += len(chunk)
+    finally:
+        await event_dao.close()
+    print(f"Wrote {written} bytes to {args.out}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+import json
+import zlib
+from typing import Any, Dict, List, Optional
+from app.core.cache import SizedLRUCache, MISSING
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.data_access.common import split_user_flows
+from app.data_access.interfaces import EventDataAccess
+from app.services.analytics.sessions import Sessionizer, SessionMode
+
+# Event fields needed to build flows (same as EventDataAccess.iter_user_flows_by_version)
+FLOW_FIELDS = ["name", "timestamp", "attributes"]
+
+# Fast compression: cached flow sets are JSON and compress well even at level 1
+COMPRESSION_LEVEL = 1
+
+def _json_default(value: Any) -> str:
+    # Attribute values that aren't JSON types (dates, ObjectIds), as the API would render them
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+class CachedFlowSet:
+    """
+    Flows of every user of one app version as of an insert watermark, by user
+    in user id order. Each user's flows are stored as compressed JSON when
+    ``compress`` is set.
+
+    The size is the sum of the users' encoded sizes, kept per user so an update
+    only encodes the users whose flows changed.
+    """
+
+    def __init__(self, watermark: str, compress: bool):
+        self.watermark = watermark
+        self.compress = compress
+        self.size = 0
+        self._entries: Dict[str, Any] = {}
+        self._sizes: Dict[str, int] = {}
+
+    @classmethod
+    def build(cls, watermark: str, user_flows: Dict[str, List[Dict[str, Any]]], compress: bool) -> "CachedFlowSet":
+        flow_set = cls(watermark, compress)
+        flow_set._put(user_flows)
+        return flow_set
+
+    def updated(self, watermark: str, user_flows: Dict[str, List[Dict[str, Any]]]) -> "CachedFlowSet":
+        """A copy at ``watermark`` with the flows of the given users replaced; other users are not re-encoded."""
+        flow_set = CachedFlowSet(watermark, self.compress)
+        flow_set.size = self.size
+        flow_set._entries = dict(self._entries)
+        flow_set._sizes = dict(self._sizes)
+        flow_set._put(user_flows)
+        return flow_set
+
+    def _put(self, user_flows: Dict[str, List[Dict[str, Any]]]) -> None:
+        added = False
+        for user_id, flows in user_flows.items():
+            encoded = json.dumps(flows, separators=(",", ":"), default=_json_default).encode()
+            entry = zlib.compress(encoded, COMPRESSION_LEVEL) if self.compress else flows
+            size = len(entry) if self.compress else len(encoded)
+            added = added or user_id not in self._entries
+            self._entries[user_id] = entry
+            self.size += size - self._sizes.get(user_id, 0)
+            self._sizes[user_id] = size
+        if added:
+            self._entries = dict(sorted(self._entries.items()))
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def user_flows(self) -> Dict[str, List[Dict[str, Any]]]:
+        """The cached flows by user; decoded copies when compressed, shared otherwise."""
+        if self.compress:
+            return {user_id: json.loads(zlib.decompress(blob)) for user_id, blob in self._entries.items()}
+        return self._entries
+
+# Flow sets by (event store, version, sessionisation), bounded by their serialised size
+_flow_cache: SizedLRUCache[CachedFlowSet] = SizedLRUCache(max_bytes=settings.FLOW_CACHE_MAX_BYTES)
+
+class FlowCacheService:
+    """
+    Serves all flows of an app version from memory, kept up to date incrementally.
+
+    Each cached flow set records the insert watermark (id of the newest event)
+    it was built from. When the store's watermark has moved, only the users
+    with events inserted since are reloaded and re-split; users who launched
+    the version for the first time are added. Without new events the flows
+    are served without scanning.
+    """
+
+    def __init__(self, event_dao: EventDataAccess):
+        # Cached flows are updated from the watermark they were built at
+        self.event_dao = event_dao.primary_reads()
+
+    @staticmethod
+    def _key(event_dao: EventDataAccess, version: str, sessionizer: Sessionizer) -> tuple:
+        return (type(event_dao).__name__, version, sessionizer.mode.value, sessionizer.gap_ms, sessionizer.launch_event)
+
+    async def _load(self, user_ids: List[str], sessionizer: Sessionizer) -> Dict[str, List[Dict[str, Any]]]:
+        user_flows = {}
+        if user_ids:
+            async for user_id, events in self.event_dao.iter_user_event_groups(user_ids=user_ids, fields=FLOW_FIELDS):
+                user_flows[user_id] = split_user_flows(user_id, events, sessionizer)
+        return user_flows
+
+    async def get_user_flows_by_version(
+        self,
+        version: str,
+        user_ids: Optional[List[str]] = None,
+        sessionizer: Optional[Sessionizer] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        All flows of an app version, as returned by EventDataAccess.get_user_flows_by_version.
+
+        Args:
+            version: The app version to filter by
+            user_ids: Optionally restrict to these users (the cache always holds all of the version's users)
+            sessionizer: How to split histories into flows (default: at App Launched)
+        """
+        sessionizer = sessionizer or Sessionizer(SessionMode.LAUNCH)
+        key = self._key(self.event_dao, version, sessionizer)
+        # Read before scanning, so events inserted during the scan are picked up next time
+        watermark = await self.event_dao.get_insert_watermark()
+        cached = _flow_cache.get(key)
+
+        if cached is not MISSING and cached.watermark == watermark:
+            metrics.increment("flow_cache_hits")
+            user_flows = cached.user_flows()
+        elif cached is not MISSING and watermark is not None:
+            changed = await self.event_dao.get_users_inserted_after(cached.watermark)
+            affected = [user_id for user_id in changed if user_id in cached]
+            affected += await self.event_dao.get_version_user_ids(
+                version, [user_id for user_id in changed if user_id not in cached]
+            )
+            entry = cached.updated(watermark, await self._load(affected, sessionizer))
+            user_flows = entry.user_flows()
+            metrics.increment("flow_cache_updates")
+            metrics.increment("flow_cache_users_recomputed", len(affected))
+            self._store(key, entry)
+        else:
+            metrics.increment("flow_cache_misses")
+            user_flows = await self._load(await self.event_dao.get_version_user_ids(version), sessionizer)
+            if watermark is not None:
+                self._store(key, CachedFlowSet.build(watermark, user_flows, settings.FLOW_CACHE_COMPRESS))
+
+        if user_ids is not None:
+            selected = set(user_ids)
+            return [flow for user_id, flows in user_flows.items() if user_id in selected for flow in flows]
+        return [flow for flows in user_flows.values() for flow in flows]
+
+    @staticmethod
+    def _store(key: tuple, entry: CachedFlowSet) -> None:
+        _flow_cache.set(key, entry, entry.size)
+        metrics.set("flow_cache_bytes", _flow_cache.total_bytes)
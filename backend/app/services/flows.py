@@ -0,0 +1,95 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.process_pool import get_process_pool, worker_count
+from app.data_access.interfaces import EventDataAccess
+from app.services.analytics.flow_metrics import FlowColumns, merge_flow_metrics, partial_flow_metrics, partition
+from app.services.analytics.sessions import Sessionizer, SessionMode
+
+class FlowMetricsService:
+    """
+    Flow metrics (flow counts, lengths, durations, entry and exit events) for
+    an app version.
+
+    Events are loaded once into compact columns. Small inputs are sessionised
+    in-process on a worker thread, so the event loop keeps serving requests;
+    inputs of at least FLOW_PARALLEL_MIN_EVENTS events are split
+    into per-user partitions that run on the shared process pool, and the
+    partial results are merged.
+    """
+
+    def __init__(self, event_dao: EventDataAccess):
+        self.event_dao = event_dao
+
+    async def load_columns(self, version: str, user_ids: Optional[List[str]] = None) -> FlowColumns:
+        version_user_ids = await self.event_dao.get_version_user_ids(version)
+        if user_ids is not None:
+            version_user_ids = list(set(version_user_ids).intersection(user_ids))
+        columns = FlowColumns()
+        async for user_id, events in self.event_dao.iter_user_event_groups(
+            user_ids=version_user_ids,
+            fields=["name", "timestamp"]
+        ):
+            columns.add_user(user_id, events)
+        return columns
+
+    async def compute_columns(
+        self,
+        columns: FlowColumns,
+        sessionizer: Sessionizer,
+        parallel: Optional[bool] = None,
+        top_k: int = 10
+    ) -> Dict[str, Any]:
+        """
+        Args:
+            columns: Events to sessionise
+            sessionizer: How to split histories into flows
+            parallel: Force (True) or disable (False) the process pool; None decides by input size
+            top_k: Number of entry, exit and overall events to report
+        """
+        users, names, timestamps = await asyncio.to_thread(columns.arrays)
+        launch_code = columns.launch_code(sessionizer)
+        name_count = len(columns.codec.names)
+        workers = worker_count()
+        if parallel is None:
+            parallel = workers > 1 and len(columns) >= settings.FLOW_PARALLEL_MIN_EVENTS
+
+        if parallel:
+            loop = asyncio.get_running_loop()
+            pool = get_process_pool()
+            partials = await asyncio.gather(*(
+                loop.run_in_executor(
+                    pool, partial_flow_metrics,
+                    users[start:end], names[start:end], timestamps[start:end],
+                    sessionizer, launch_code, name_count
+                )
+                for start, end in partition(users, workers)
+            ))
+        else:
+            partials = [await asyncio.to_thread(
+                partial_flow_metrics, users, names, timestamps, sessionizer, launch_code, name_count
+            )]
+
+        metrics = merge_flow_metrics(list(partials), columns.codec, top_k=top_k)
+        metrics["execution"] = {
+            "mode": "parallel" if parallel else "in_process",
+            "partitions": len(partials)
+        }
+        return metrics
+
+    async def compute(
+        self,
+        version: str,
+        user_ids: Optional[List[str]] = None,
+        sessionizer: Optional[Sessionizer] = None,
+        parallel: Optional[bool] = None,
+        top_k: int = 10
+    ) -> Dict[str, Any]:
+        """Load a version's events and compute its flow metrics."""
+        columns = await self.load_columns(version, user_ids)
+        return await self.compute_columns(
+            columns,
+            sessionizer or Sessionizer(SessionMode.LAUNCH),
+            parallel=parallel,
+            top_k=top_k
+        )
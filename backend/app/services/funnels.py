@@ -0,0 +1,286 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.data_access.common import insert_watermark_floor
+from app.data_access.interfaces import EventDataAccess, FunnelDataAccess
+from app.models.funnel import Funnel, FunnelStep
+from app.services.analytics.quantiles import TDigest
+from app.services.jobs import ProgressCallback
+from app.services.segments import SegmentService
+
+# One refresh at a time per funnel, so incremental updates are never applied twice
+_refresh_locks: Dict[str, asyncio.Lock] = {}
+
+# Sketch of the time from the first to the last step; step sketches are keyed by step index
+CONVERSION_SKETCH = "conversion"
+# Stored with the sketches: ids of the applied events that the next refresh reads again
+# (inserted within INSERT_WATERMARK_SLACK_SECONDS of the watermark), as 12-byte ObjectIds
+APPLIED_EVENTS = "applied_events"
+
+def new_user_state() -> Dict[str, Any]:
+    # step: index reached in the current attempt (None if no attempt is open)
+    # start: timestamp of the current attempt's first step
+    # best: most steps reached in any attempt
+    # last: timestamp of the current attempt's latest step
+    return {"step": None, "start": None, "best": 0, "last": None}
+
+def advance_user_state(
+    state: Dict[str, Any],
+    name: str,
+    timestamp: int,
+    steps: List[str],
+    window_ms: int
+) -> Optional[int]:
+    """
+    Apply one event to a user's funnel progress.
+
+    An attempt starts at the first step and advances when the next step occurs
+    within ``window_ms`` of the attempt's start. Once the window has passed, the
+    next first-step event starts a new attempt. Events must be applied in
+    timestamp order.
+
+    Returns:
+        The time (ms) since the previous step if the event advanced the attempt, else None
+    """
+    if state["step"] is not None and timestamp - state["start"] > window_ms:
+        state["step"] = None
+        state["start"] = None
+
+    if state["step"] is not None:
+        next_step = state["step"] + 1
+        if next_step < len(steps) and name == steps[next_step]:
+            # States saved before step times were tracked have no "last"
+            elapsed = timestamp - (state.get("last") or state["start"])
+            state["step"] = next_step
+            state["best"] = max(state["best"], next_step + 1)
+            state["last"] = timestamp
+            return elapsed
+    elif name == steps[0]:
+        state["step"] = 0
+        state["start"] = timestamp
+        state["best"] = max(state["best"], 1)
+        state["last"] = timestamp
+    return None
+
+def pack_event_ids(event_ids: Iterable[str]) -> bytes:
+    return b"".join(bytes.fromhex(event_id) for event_id in sorted(event_ids))
+
+def unpack_event_ids(data: bytes) -> Set[str]:
+    return {data[i:i + 12].hex() for i in range(0, len(data), 12)}
+
+def duration_summary(digest: Optional[TDigest]) -> Optional[Dict[str, float]]:
+    """Count, mean, p25/p50/p75/p90 and max in seconds, or None if nothing was recorded."""
+    if digest is None or not digest.count:
+        return None
+    return digest.summary(percentiles=(25, 50, 75, 90), scale=1000.0)
+
+def compute_steps(
+    step_names: List[str],
+    counts: List[int],
+    step_digests: Optional[Dict[int, TDigest]] = None
+) -> List[FunnelStep]:
+    """Build funnel steps with conversion rates and step times relative to the previous step."""
+    steps = []
+    for i, (name, count) in enumerate(zip(step_names, counts)):
+        previous = counts[i - 1] if i > 0 else count
+        rate = round(count / previous * 100, 2) if previous else 0.0
+        steps.append(FunnelStep(
+            name=name,
+            count=count,
+            conversion_rate=rate,
+            time_from_previous_seconds=duration_summary((step_digests or {}).get(i))
+        ))
+    return steps
+
+class FunnelService:
+    """
+    Saved funnels whose results are maintained incrementally.
+
+    Each refresh only reads events inserted after the funnel's watermark (the
+    id of the newest event it has seen, minus INSERT_WATERMARK_SLACK_SECONDS
+    for concurrent writers) and updates the stored per-user progress, so
+    reading a funnel is a single document read. Events that arrive late are
+    still counted, applied after the user's events already seen. Events read
+    again within the slack are skipped by id. Segment filters use the segment's
+    membership at the time of each refresh.
+
+    User states are saved batch by batch, while counts, sketches and the
+    watermark are only saved once the refresh is complete. The funnel is marked
+    while a refresh is in progress, and a refresh that finds the mark (the
+    previous one failed or was interrupted) rebuilds the results from scratch
+    instead of applying events twice.
+
+    Step and conversion times are kept in t-digest sketches stored next to the
+    per-user progress; each refresh merges the new durations into them, so
+    percentiles cover the funnel's whole history in constant space.
+    """
+
+    def __init__(
+        self,
+        funnel_dao: FunnelDataAccess,
+        event_dao: EventDataAccess,
+        segment_service: Optional[SegmentService] = None
+    ):
+        self.funnel_dao = funnel_dao
+        self.event_dao = event_dao
+        self.segment_service = segment_service
+
+    @staticmethod
+    def _reset(funnel: Funnel) -> None:
+        funnel.steps = [FunnelStep(name=step.name) for step in funnel.steps]
+        funnel.conversion_time_seconds = None
+        funnel.watermark = None
+        funnel.refreshed_at = None
+        funnel.refresh_started_at = None
+
+    async def create(self, funnel: Funnel) -> Funnel:
+        """Store a new funnel definition with empty results."""
+        now = datetime.utcnow()
+        funnel = funnel.model_copy(update={"id": None, "created_at": now, "updated_at": now})
+        self._reset(funnel)
+        return await self.funnel_dao.create_funnel(funnel)
+
+    async def update(self, funnel_id: str, funnel: Funnel) -> Tuple[Optional[Funnel], bool]:
+        """
+        Update a funnel definition.
+
+        Returns:
+            (updated funnel or None if not found, whether results must be recomputed)
+        """
+        existing = await self.funnel_dao.get_funnel(funnel_id)
+        if existing is None:
+            return None, False
+
+        needs_refresh = funnel.definition() != existing.definition()
+        updated = existing.model_copy(update={
+            "name": funnel.name,
+            "description": funnel.description,
+            "updated_at": datetime.utcnow()
+        })
+        if needs_refresh:
+            updated.steps = funnel.steps
+            updated.conversion_window_hours = funnel.conversion_window_hours
+            updated.version = funnel.version
+            updated.segment_id = funnel.segment_id
+            self._reset(updated)
+            async with _refresh_locks.setdefault(funnel_id, asyncio.Lock()):
+                await self.funnel_dao.clear_user_states(funnel_id)
+                await self.funnel_dao.update_funnel(updated)
+        else:
+            await self.funnel_dao.update_funnel(updated)
+        return updated, needs_refresh
+
+    async def delete(self, funnel_id: str) -> bool:
+        deleted = await self.funnel_dao.delete_funnel(funnel_id)
+        _refresh_locks.pop(funnel_id, None)
+        return deleted
+
+    async def refresh(
+        self,
+        funnel_id: str,
+        report_progress: Optional[ProgressCallback] = None
+    ) -> Optional[Funnel]:
+        """
+        Fold events inserted since the funnel's watermark into its results.
+
+        Returns:
+            The refreshed funnel, or None if it does not exist
+        """
+        async with _refresh_locks.setdefault(funnel_id, asyncio.Lock()):
+            funnel = await self.funnel_dao.get_funnel(funnel_id)
+            if funnel is None:
+                return None
+
+            if funnel.refresh_started_at is not None:
+                print(f"Previous refresh of funnel {funnel_id} did not complete, rebuilding its results")
+                await self.funnel_dao.clear_user_states(funnel_id)
+                self._reset(funnel)
+            # Read before scanning, so events inserted during the scan are read next time
+            watermark = await self.event_dao.get_insert_watermark()
+            funnel.refresh_started_at = datetime.utcnow()
+            await self.funnel_dao.update_funnel(funnel)
+
+            step_names = [step.name for step in funnel.steps]
+            window_ms = funnel.conversion_window_hours * 3600 * 1000
+            counts = [step.count for step in funnel.steps]
+
+            user_ids = None
+            if funnel.version:
+                user_ids = await self.event_dao.get_version_user_ids(funnel.version)
+            if funnel.segment_id:
+                if self.segment_service is None:
+                    raise ValueError("Funnel has a segment filter but no segment service was provided")
+                members = await self.segment_service.get_member_ids(funnel.segment_id)
+                user_ids = members if user_ids is None else list(set(user_ids).intersection(members))
+
+            stored = await self.funnel_dao.get_duration_sketches(funnel_id)
+            step_digests = {
+                k: TDigest.from_bytes(stored[str(k)]) if str(k) in stored else TDigest()
+                for k in range(1, len(step_names))
+            }
+            conversion_digest = (
+                TDigest.from_bytes(stored[CONVERSION_SKETCH]) if CONVERSION_SKETCH in stored else TDigest()
+            )
+            applied = unpack_event_ids(stored.get(APPLIED_EVENTS, b""))
+            newly_applied: List[str] = []
+
+            async def apply(batch: List[Tuple[str, List[Dict[str, Any]]]]):
+                states = await self.funnel_dao.get_user_states(funnel_id, [user_id for user_id, _ in batch])
+                step_times: Dict[int, List[int]] = {k: [] for k in step_digests}
+                conversion_times: List[int] = []
+                for user_id, events in batch:
+                    state = states.setdefault(user_id, new_user_state())
+                    best_before = state["best"]
+                    for event in events:
+                        if event["id"] in applied:
+                            continue
+                        newly_applied.append(event["id"])
+                        elapsed = advance_user_state(state, event["name"], event["timestamp"], step_names, window_ms)
+                        if elapsed is not None:
+                            step_times[state["step"]].append(elapsed)
+                            if state["step"] == len(step_names) - 1:
+                                conversion_times.append(event["timestamp"] - state["start"])
+                    for k in range(best_before, state["best"]):
+                        counts[k] += 1
+                await self.funnel_dao.save_user_states(funnel_id, states)
+                for k, times in step_times.items():
+                    step_digests[k].add_many(times)
+                conversion_digest.add_many(conversion_times)
+
+            batch = []
+            processed_users = 0
+            async for group in self.event_dao.iter_user_event_groups(
+                names=list(set(step_names)),
+                user_ids=user_ids,
+                fields=["id", "name", "timestamp"],
+                inserted_after=funnel.watermark
+            ):
+                batch.append(group)
+                if len(batch) >= settings.FUNNEL_STATE_BATCH_SIZE:
+                    await apply(batch)
+                    processed_users += len(batch)
+                    batch = []
+                    if report_progress and user_ids:
+                        await report_progress(processed_users / len(user_ids), f"{processed_users} users processed")
+            if batch:
+                await apply(batch)
+
+            # Only events the next refresh reads again need to be remembered
+            if watermark is not None:
+                floor = str(insert_watermark_floor(watermark))
+                applied = {event_id for event_id in applied.union(newly_applied) if event_id > floor}
+            await self.funnel_dao.save_duration_sketches(funnel_id, {
+                **{str(k): digest.to_bytes() for k, digest in step_digests.items()},
+                CONVERSION_SKETCH: conversion_digest.to_bytes(),
+                APPLIED_EVENTS: pack_event_ids(applied)
+            })
+            # Clearing the mark commits the refresh
+            funnel.steps = compute_steps(step_names, counts, step_digests)
+            if len(step_names) > 1:
+                funnel.conversion_time_seconds = duration_summary(conversion_digest)
+            funnel.watermark = watermark or funnel.watermark
+            funnel.refreshed_at = datetime.utcnow()
+            funnel.refresh_started_at = None
+            await self.funnel_dao.update_funnel(funnel)
+            return funnel
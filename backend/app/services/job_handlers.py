@@ -0,0 +1,103 @@
+from typing import Any, Dict
+from app.core.rate_limit import Priority
+from app.data_access.factory import create_event_dao
+from app.data_access.mongodb import (
+    MongoEventDataAccess, MongoJobDataAccess, MongoFunnelDataAccess, MongoSegmentDataAccess
+)
+from app.data_access.sqlite import SQLiteEventDataAccess
+from app.services.event_sync import sync_events
+from app.services.flow_cache import FlowCacheService
+from app.services.funnels import FunnelService
+from app.services.segments import SegmentService
+from app.services.jobs import JobManager, ProgressCallback
+from app.services.openai_service import OpenAIService
+from app.services.prompts.flow_insights import FlowInsightsHandler, MAX_FLOWS_TO_ANALYZE
+from app.services.prompts.funnel import FunnelCreationHandler
+
+job_manager = JobManager(MongoJobDataAccess)
+
+async def run_flow_analysis(params: Dict[str, Any], report_progress: ProgressCallback) -> Any:
+    """Job version of POST /analytics/flows/analyze. Params: {"flows", "prompt"}."""
+    if not params.get("flows") or not params.get("prompt"):
+        raise ValueError("Missing required fields: 'flows' or 'prompt'")
+    await report_progress(0.1, "Waiting for OpenAI")
+    handler = FlowInsightsHandler(OpenAIService(Priority.BACKGROUND))
+    return {"result": await handler.analyze(params["flows"], params["prompt"])}
+
+async def run_version_flow_analysis(params: Dict[str, Any], report_progress: ProgressCallback) -> Any:
+    """
+    Job version of POST /analytics/flows/{version}/analyze.
+    Params: {"version", "question"} and optionally "max_flows", "start_ms", "end_ms".
+    """
+    await report_progress(0.1, "Sampling flows")
+    event_dao = create_event_dao()
+    try:
+        flows = await event_dao.sample_user_flows_by_version(
+            params["version"],
+            params.get("max_flows", MAX_FLOWS_TO_ANALYZE),
+            start_ms=params.get("start_ms"),
+            end_ms=params.get("end_ms")
+        )
+    finally:
+        await event_dao.close()
+    if not flows:
+        raise ValueError(f"No flows found for version {params['version']}")
+    await report_progress(0.3, "Waiting for OpenAI")
+    handler = FlowInsightsHandler(OpenAIService(Priority.BACKGROUND))
+    return {"result": await handler.analyze(flows, params["question"]), "sampled_flows": len(flows)}
+
+async def run_funnel_creation(params: Dict[str, Any], report_progress: ProgressCallback) -> Any:
+    """Job version of POST /analytics/funnels/create. Params: {"description", "context"}."""
+    await report_progress(0.1, "Aggregating events")
+    event_dao = create_event_dao()
+    try:
+        handler = FunnelCreationHandler(OpenAIService(Priority.BACKGROUND), event_dao)
+        result = await handler.create_funnel(
+            description=params["description"],
+            context=params.get("context")
+        )
+    finally:
+        await event_dao.close()
+    return {"result": result}
+
+async def run_user_flows(params: Dict[str, Any], report_progress: ProgressCallback) -> Any:
+    """Job version of GET /events/flows/{version}. Params: {"version"}."""
+    await report_progress(0.1, "Fetching flows")
+    event_dao = create_event_dao()
+    try:
+        return await FlowCacheService(event_dao).get_user_flows_by_version(params["version"])
+    finally:
+        await event_dao.close()
+
+async def run_funnel_refresh(params: Dict[str, Any], report_progress: ProgressCallback) -> Any:
+    """Fold new events into a saved funnel's results. Params: {"funnel_id"}."""
+    # Incremental refreshes advance a watermark, so they must read the primary
+    # store: a replica that lags behind would make them skip events for good
+    event_dao = MongoEventDataAccess(read_primary=True)
+    segment_service = SegmentService(MongoSegmentDataAccess(), event_dao)
+    service = FunnelService(MongoFunnelDataAccess(), event_dao, segment_service)
+    funnel = await service.refresh(params["funnel_id"], report_progress)
+    if funnel is None:
+        raise ValueError("Funnel not found")
+    return funnel.model_dump(mode="json")
+
+async def run_segment_compute(params: Dict[str, Any], report_progress: ProgressCallback) -> Any:
+    """Compute a segment's members. Params: {"segment_id"}."""
+    # The user index is synced incrementally, so like funnels this reads the primary store
+    service = SegmentService(MongoSegmentDataAccess(), MongoEventDataAccess(read_primary=True))
+    segment = await service.compute(params["segment_id"], report_progress)
+    if segment is None:
+        raise ValueError("Segment not found")
+    return segment.model_dump(mode="json")
+
+async def run_event_sync(params: Dict[str, Any], report_progress: ProgressCallback) -> Any:
+    """Copy new events from MongoDB into the local SQLite store. Params: {}."""
+    return await sync_events(MongoEventDataAccess(), SQLiteEventDataAccess(), report_progress=report_progress)
+
+job_manager.register("flow_analysis", run_flow_analysis)
+job_manager.register("version_flow_analysis", run_version_flow_analysis)
+job_manager.register("funnel_creation", run_funnel_creation)
+job_manager.register("user_flows", run_user_flows)
+job_manager.register("funnel_refresh", run_funnel_refresh)
+job_manager.register("segment_compute", run_segment_compute)
+job_manager.register("event_sync", run_event_sync)
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.data_access.interfaces import JobDataAccess
+from app.models.job import Job, JobStatus
+
+# Reports progress (0..1) and an optional message from inside a running job
+ProgressCallback = Callable[[float, Optional[str]], Awaitable[None]]
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Awaitable[Any]]
+
+# Progress updates are written to the database at most this often per job
+PROGRESS_PERSIST_INTERVAL_SECONDS = 1.0
+
+class UnknownJobKind(ValueError):
+    pass
+
+class _RunningJob:
+    """In-memory state of a queued or running job, used for dedup and subscriptions."""
+
+    def __init__(self, job: Job, dedup_key: str):
+        self.job = job
+        self.dedup_key = dedup_key
+        self.changed = asyncio.Event()
+        self.last_persisted = 0.0
+
+    def notify(self):
+        # Wake current subscribers and arm a fresh event for the next change
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+class JobManager:
+    """
+    In-process async worker pool for long-running analyses.
+
+    Jobs are persisted through a JobDataAccess (status, progress and result,
+    expiring after JOB_RESULT_TTL_SECONDS) and executed by a fixed number of
+    worker tasks pulling from a priority queue. Submitting a job identical to
+    one that is still queued or running returns the existing job.
+
+    Each manager records an owner token on the jobs it queues and keeps a
+    lease on it (JOB_OWNER_LEASE_SECONDS). Unfinished jobs whose owner has
+    stopped or let its lease expire are claimed by exactly one live manager
+    and run again, so several worker processes can share the job store.
+    """
+
+    def __init__(self, job_dao_factory: Callable[[], JobDataAccess]):
+        self.job_dao_factory = job_dao_factory
+        self.handlers: Dict[str, JobHandler] = {}
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self.workers: List[asyncio.Task] = []
+        self.lease_task: Optional[asyncio.Task] = None
+        self.active: Dict[str, _RunningJob] = {}
+        self.active_by_key: Dict[str, str] = {}
+        self.owner = uuid.uuid4().hex
+        self._sequence = itertools.count()
+
+    def register(self, kind: str, handler: JobHandler):
+        """Register the coroutine that executes jobs of ``kind``."""
+        self.handlers[kind] = handler
+
+    def start(self, concurrency: int):
+        """Start the worker pool. Must be called from the running event loop."""
+        self.queue = asyncio.PriorityQueue()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(concurrency)]
+        self.lease_task = asyncio.create_task(self._keep_lease())
+
+    async def _renew_lease(self):
+        expires_at = datetime.utcnow() + timedelta(seconds=settings.JOB_OWNER_LEASE_SECONDS)
+        await self.job_dao_factory().renew_owner_lease(self.owner, expires_at)
+
+    async def _keep_lease(self):
+        """Renew this manager's lease, and take over the jobs of managers that died."""
+        while True:
+            await asyncio.sleep(settings.JOB_OWNER_LEASE_SECONDS / 3)
+            try:
+                await self.resume_unfinished()
+            except Exception as e:
+                print("Error renewing job lease:", str(e))
+
+    async def resume_unfinished(self) -> int:
+        """
+        Re-queue the jobs a stopped or dead process left queued or running (e.g.
+        it was restarted), so they complete and dedup returns live jobs. Call
+        after ``start``; it is repeated whenever the lease is renewed.
+
+        Each job is claimed atomically, so when several worker processes start
+        together only one of them re-queues it, and jobs of live processes are
+        left alone. Interrupted jobs start over. Jobs of unknown kinds, and
+        duplicates of a job already re-queued, are marked failed. Returns the
+        number re-queued.
+        """
+        await self._renew_lease()
+        live_owners = set(await self.job_dao_factory().get_live_owners())
+        resumed = 0
+        for job in await self.job_dao_factory().get_unfinished_jobs():
+            if job.owner in live_owners or job.owner == self.owner:
+                continue
+            job = await self.job_dao_factory().claim_job(job.id, job.owner, self.owner)
+            if job is None:
+                continue
+            key = self.dedup_key(job.kind, job.params)
+            if job.kind not in self.handlers:
+                await self._fail_interrupted(job, f"Unknown job kind: {job.kind}")
+                continue
+            if key in self.active_by_key:
+                await self._fail_interrupted(job, f"Superseded by job {self.active_by_key[key]}")
+                continue
+            self.active[job.id] = _RunningJob(job, key)
+            self.active_by_key[key] = job.id
+            await self.queue.put((-job.priority, next(self._sequence), job.id))
+            resumed += 1
+        if resumed:
+            print(f"Re-queued {resumed} interrupted jobs")
+        return resumed
+
+    async def _fail_interrupted(self, job: Job, error: str):
+        job.status = JobStatus.FAILED
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        job.expires_at = job.finished_at + timedelta(seconds=settings.JOB_RESULT_TTL_SECONDS)
+        await self.job_dao_factory().update_job(job)
+
+    async def stop(self):
+        """
+        Cancel all workers. Queued and running jobs are left in their current
+        state and the lease is released, so the next process resumes them.
+        """
+        tasks = self.workers + ([self.lease_task] if self.lease_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.lease_task = None
+        try:
+            await self.job_dao_factory().release_owner_lease(self.owner)
+        except Exception as e:
+            print("Error releasing job lease:", str(e))
+
+    @staticmethod
+    def dedup_key(kind: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps({"kind": kind, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def submit(self, kind: str, params: Dict[str, Any], priority: int = 0) -> Job:
+        """
+        Queue a job, or return the identical job that is already queued or running.
+
+        Raises:
+            UnknownJobKind: If no handler is registered for ``kind``
+        """
+        if kind not in self.handlers:
+            raise UnknownJobKind(f"Unknown job kind: {kind}")
+
+        key = self.dedup_key(kind, params)
+        existing_id = self.active_by_key.get(key)
+        if existing_id is not None:
+            return self.active[existing_id].job
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=params, priority=priority, owner=self.owner)
+        # Registered before the first await, so concurrent identical submits find it
+        running = self.active[job.id] = _RunningJob(job, key)
+        self.active_by_key[key] = job.id
+        try:
+            await self.job_dao_factory().create_job(job)
+        except Exception:
+            del self.active[job.id]
+            self.active_by_key.pop(key, None)
+            running.notify()
+            raise
+        # Higher priority first, then FIFO
+        await self.queue.put((-priority, next(self._sequence), job.id))
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Return the job's current state, from memory if it is still active."""
+        running = self.active.get(job_id)
+        if running is not None:
+            return running.job
+        return await self.job_dao_factory().get_job(job_id)
+
+    async def get_result(self, job_id: str) -> Any:
+        return await self.job_dao_factory().get_job_result(job_id)
+
+    async def subscribe(self, job_id: str, poll_seconds: float = 1.0) -> AsyncIterator[Job]:
+        """
+        Yield the job's state now and after every change, until it finishes.
+
+        Jobs running in this process are followed via in-memory notifications;
+        anything else is polled from the database.
+        """
+        while True:
+            running = self.active.get(job_id)
+            if running is not None:
+                changed = running.changed
+                yield running.job
+                await changed.wait()
+                continue
+
+            job = await self.job_dao_factory().get_job(job_id)
+            if job is None:
+                return
+            yield job
+            if job.status.finished:
+                return
+            await asyncio.sleep(poll_seconds)
+
+    async def _persist(self, running: _RunningJob, result: Any = None):
+        running.last_persisted = time.monotonic()
+        await self.job_dao_factory().update_job(running.job, result)
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self.queue.get()
+            running = self.active.get(job_id)
+            if running is None:
+                continue
+            try:
+                await self._run(running)
+            except Exception as e:
+                # The job's state could not be stored; keep the worker alive
+                print(f"Error running job {job_id}:", str(e))
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, running: _RunningJob):
+        job = running.job
+
+        async def report_progress(progress: float, message: Optional[str] = None):
+            job.progress = max(0.0, min(1.0, progress))
+            job.message = message
+            running.notify()
+            if time.monotonic() - running.last_persisted >= PROGRESS_PERSIST_INTERVAL_SECONDS:
+                await self._persist(running)
+
+        result = None
+        try:
+            try:
+                job.status = JobStatus.RUNNING
+                job.started_at = datetime.utcnow()
+                await self._persist(running)
+                running.notify()
+                result = await self.handlers[job.kind](job.params, report_progress)
+                job.status = JobStatus.SUCCEEDED
+                job.progress = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job {job.id} ({job.kind}) failed:", str(e))
+                job.status = JobStatus.FAILED
+                job.error = str(e)
+
+            job.finished_at = datetime.utcnow()
+            job.expires_at = job.finished_at + timedelta(seconds=settings.JOB_RESULT_TTL_SECONDS)
+            try:
+                await self._persist(running, result)
+            except Exception as e:
+                # e.g. the result could not be stored; report it instead of losing the job
+                job.status = JobStatus.FAILED
+                job.error = f"Failed to store job result: {e}"
+                await self._persist(running)
+        finally:
+            del self.active[job.id]
+            self.active_by_key.pop(running.dedup_key, None)
+            running.notify()
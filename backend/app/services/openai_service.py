@@ -1,11 +1,52 @@
-from typing import Optional, Dict, Any
-from openai import OpenAI
-from app.core.config import get_settings
+import asyncio
+from typing import Optional, Dict, Any, List
+from openai import AsyncOpenAI, RateLimitError
+from app.core.config import get_settings, settings
+from app.core.metrics import metrics
+from app.core.rate_limit import Priority, RateLimitScheduler
+
+# Rough prompt size estimate used for the tokens-per-minute budget (no tokenizer dependency)
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+
+# One scheduler for the whole process: every OpenAIService draws on the same account budgets
+scheduler = RateLimitScheduler(
+    "openai",
+    requests_per_minute=settings.OPENAI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.OPENAI_TOKENS_PER_MINUTE,
+    burst_seconds=settings.OPENAI_BURST_SECONDS
+)
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Tokens a request counts against the budget: estimated prompt tokens plus max_tokens."""
+    prompt_chars = sum(len(message["content"]) for message in messages)
+    return prompt_chars // CHARS_PER_TOKEN + TOKENS_PER_MESSAGE * len(messages) + max_tokens
+
+def _retry_after(error: RateLimitError) -> float:
+    """Seconds to wait before retrying, from the Retry-After header if present."""
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return settings.OPENAI_RATE_LIMIT_BACKOFF_SECONDS
 
 class OpenAIService:
-    def __init__(self):
+    """
+    Chat completions through the shared rate-limit scheduler.
+
+    ``priority`` is the scheduling class of this service's calls: interactive
+    (the default, for request handlers), batch, or background (jobs).
+    """
+
+    def __init__(self, priority: Priority = Priority.INTERACTIVE):
         self.settings = get_settings()
-        self.client = OpenAI(api_key=self.settings.OPENAI_API_KEY)
+        self.priority = priority
+        self.client = AsyncOpenAI(
+            api_key=self.settings.OPENAI_API_KEY,
+            base_url=self.settings.OPENAI_BASE_URL,
+            # Retries go back through the scheduler (see generate_completion);
+            # the SDK's own retries would bypass its budgets and pauses
+            max_retries=0
+        )
 
     async def generate_completion(
         self,
@@ -13,17 +54,24 @@ class OpenAIService:
         system_message: Optional[str] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
-        additional_params: Optional[Dict[str, Any]] = None
+        additional_params: Optional[Dict[str, Any]] = None,
+        priority: Optional[Priority] = None
     ) -> str:
         """
         Generate a completion using OpenAI's API.
         
+        The call waits in the scheduler until the request and token budgets
+        allow it. If OpenAI still answers with a rate limit error, the
+        scheduler is paused for the Retry-After period and the call is queued
+        again, up to OPENAI_RATE_LIMIT_RETRIES times.
+        
         Args:
             prompt: The user's input prompt
             system_message: Optional system message to set context
             temperature: Optional temperature for response generation
             max_tokens: Optional maximum tokens for the response
             additional_params: Optional additional parameters for the API call
+            priority: Scheduling class of this call (defaults to the service's)
             
         Returns:
             The generated text response
@@ -45,8 +93,26 @@ class OpenAIService:
         if additional_params:
             params.update(additional_params)
             
-        response = self.client.chat.completions.create(**params)
-        return response.choices[0].message.content
+        estimated = estimate_tokens(messages, params["max_tokens"])
+        attempt = 0
+        while True:
+            await scheduler.acquire(estimated, self.priority if priority is None else priority)
+            try:
+                response = await self.client.chat.completions.create(**params)
+            except asyncio.CancelledError:
+                # Cancelling drops the HTTP connection, which aborts the request
+                metrics.increment("openai_requests_cancelled")
+                raise
+            except RateLimitError as e:
+                # Exhausted quota won't recover by waiting
+                if e.code == "insufficient_quota" or attempt >= self.settings.OPENAI_RATE_LIMIT_RETRIES:
+                    raise
+                scheduler.pause(_retry_after(e))
+                attempt += 1
+                continue
+            if response.usage is not None:
+                scheduler.settle(estimated, response.usage.total_tokens)
+            return response.choices[0].message.content
 
     async def analyze_text(
         self,
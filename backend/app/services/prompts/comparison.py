@@ -0,0 +1,32 @@
+from .base import BasePromptHandler
+
+class VersionComparisonHandler(BasePromptHandler):
+    """Explains the differences between two app versions from a precomputed diff."""
+
+    def _get_system_message(self) -> str:
+        return """You are a product analyst comparing user behaviour between two releases of a mobile app.
+        You receive a compact, precomputed diff (not raw events):
+        - volume: users, flows and events per version
+        - session_length: events per flow and flow duration statistics
+        - step_conversion: how often one event is directly followed by another, in percent
+        - path_distribution: occurrences of common event sequences per 100 flows
+        - entry_events / exit_events: share of flows starting or ending with each event, in percent
+        Each entry has base, candidate and delta values; deltas are in percentage points where applicable.
+
+        Guidelines:
+        1. Lead with the most important changes, ordered by impact
+        2. Call out regressions (lower conversion, more exits at a step) and improvements separately
+        3. Treat small deltas on small volumes as noise and say so
+        4. Do not invent numbers that are not in the diff
+        5. End with 2-3 concrete follow-up checks or recommendations
+
+        Be concise and structured."""
+
+    async def narrate(self, base: str, candidate: str, diff_json: str) -> str:
+        prompt = f"""Compare version {candidate} (candidate) against version {base} (base).
+
+Diff:
+{diff_json}
+
+Summarise what changed between the two versions and what it likely means for users."""
+        return await self.generate(prompt)
@@ -1,5 +1,7 @@
+import json
 from typing import Dict, Any, List
 from datetime import datetime
+from app.services.analytics.quantiles import TDigest
 
 class FlowAnalysisPrompt:
     """Prompt template for analyzing user behavior flows."""
@@ -48,6 +50,8 @@ class FlowAnalysisPrompt:
                     'events': formatted_events
                 })
         
+        timing = FlowAnalysisPrompt.timing_statistics(flow_events)
+        
         # Generate the prompt
         prompt = f"""You are an expert in analyzing user behavior flows based on chronological event logs.
 
@@ -57,6 +61,11 @@ Here's the event data:
 
 {flow_events}
 
+Precomputed timing statistics in minutes (first-to-last event time per user, and time between
+consecutive events per transition). Use these for all average, median and percentile times:
+
+{json.dumps(timing, ensure_ascii=False)}
+
 Please analyze this data and provide a detailed performance analysis following these steps:
 
 1. Overall Metrics:
@@ -132,6 +141,30 @@ Median Time: [X] minutes
 
         return prompt
 
+    @staticmethod
+    def timing_statistics(flow_events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Percentiles of each user's first-to-last event time and of the time
+        between consecutive events, per transition, from t-digest sketches.
+        """
+        total = TDigest()
+        transitions: Dict[str, TDigest] = {}
+        for user in flow_events:
+            events = user['events']
+            total.add(events[-1]['timestamp'] - events[0]['timestamp'])
+            for previous, event in zip(events, events[1:]):
+                key = f"{previous['event_name']} → {event['event_name']}"
+                transitions.setdefault(key, TDigest()).add(event['timestamp'] - previous['timestamp'])
+        
+        minutes = 60 * 1000.0
+        return {
+            'first_to_last_event': total.summary(percentiles=(25, 50, 75), scale=minutes),
+            'transitions': {
+                key: digest.summary(percentiles=(25, 50, 75), scale=minutes)
+                for key, digest in sorted(transitions.items(), key=lambda item: item[1].count, reverse=True)
+            }
+        }
+
     @staticmethod
     def parse_response(response: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,279 @@
+import json
+import random
+from typing import Any, Dict, List, Optional, Tuple
+from app.services.analytics.attributes import AttributeProfile
+from app.services.analytics.quantiles import TDigest
+from .base import BasePromptHandler
+
+MAX_FLOWS_TO_ANALYZE = 100  # Limit the number of flows to analyze
+MAX_TRANSITION_STATISTICS = 15  # Most frequent transitions with precomputed step times
+MAX_ATTRIBUTE_EVENTS = 10  # Most frequent events whose attributes are summarised
+
+class FlowInsightsHandler(BasePromptHandler):
+    """Answers a free-form question about a set of user flows."""
+
+    def _get_system_message(self) -> str:
+        return """You are an expert in analyzing user behavior flows, calculating conversion rates, and analyzing time-based patterns. 
+        Your task is to analyze the provided flow data and provide detailed insights about aggregate user behavior patterns.
+        
+        Important guidelines for time calculations:
+        1. FIRST calculate times for each individual flow:
+           - For each user flow, calculate:
+             * Total duration (time between first and last event)
+             * Duration of each step (time between consecutive events)
+             * Time between steps
+           - Explicitly identify and note:
+             * The first event in each flow
+             * The last event in each flow
+             * Whether the flow reached a completion event
+        2. THEN aggregate these individual calculations to get:
+           - Average and median times across all flows
+           - Time distributions and patterns
+           - Outlier detection and handling
+        3. Time calculation rules:
+           - Convert all timestamps to seconds/minutes for calculation
+           - Handle missing or invalid timestamps appropriately
+           - Exclude unreasonable time gaps (e.g., >24 hours) from calculations
+           - Note any time calculation assumptions made
+        
+        Other important guidelines:
+        1. ALWAYS calculate and include:
+           - Conversion rates between each step in the flow
+           - Time metrics for the entire flow and each step
+           - First and last events for each flow
+        2. Focus ONLY on aggregate patterns and trends across all users
+        3. NEVER mention individual user IDs or specific user behaviors
+        4. Use percentages and averages to describe patterns
+        5. Group similar behaviors into categories
+        6. Identify common paths and drop-off points
+        7. Provide actionable insights based on the overall data
+        
+        Format your response in a clear, structured way with emojis for better readability.
+        Note: The data provided is a sample of the total flows, so focus on patterns and trends rather than absolute numbers."""
+
+    @staticmethod
+    def sample_flows(flows: List[Dict[str, Any]], max_flows: int = MAX_FLOWS_TO_ANALYZE) -> List[Dict[str, Any]]:
+        """
+        Take a stratified sample of at most ``max_flows`` flows.
+
+        Mixes the longest flows, flows around the median length and random others.
+        """
+        if len(flows) <= max_flows:
+            return flows
+        print(f"Sampling {max_flows} flows from {len(flows)} total flows")
+        # Sort flows by length to get a representative sample
+        flows = sorted(flows, key=lambda x: len(x["flow"]), reverse=True)
+        # Take a stratified sample: some from the top (longest flows), some from the middle, and some random
+        top_flows = flows[:max_flows // 3]
+        middle_flows = flows[len(flows)//2 - max_flows//6:len(flows)//2 + max_flows//6]
+        remaining_count = max_flows - len(top_flows) - len(middle_flows)
+        other_flows = random.sample(
+            flows[max_flows // 3:len(flows)//2 - max_flows//6] + flows[len(flows)//2 + max_flows//6:],
+            min(remaining_count, len(flows) - len(top_flows) - len(middle_flows))
+        )
+        flows = top_flows + middle_flows + other_flows
+        random.shuffle(flows)  # Shuffle to avoid bias in the order
+        return flows
+
+    @staticmethod
+    def format_flows(flows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep only the event data needed for analysis to reduce token count."""
+        return [
+            {
+                "user_id": flow["user_id"],
+                "events": [
+                    {
+                        "name": event["event_name"],
+                        "timestamp": event["timestamp"]
+                    }
+                    for event in flow["flow"]
+                ]
+            }
+            for flow in flows
+        ]
+
+    @staticmethod
+    def duration_statistics(
+        flows: List[Dict[str, Any]],
+        max_transitions: int = MAX_TRANSITION_STATISTICS
+    ) -> Dict[str, Any]:
+        """
+        Flow duration and per-transition time percentiles (in minutes) over all
+        given flows, computed in one pass with t-digest sketches.
+
+        Computed before sampling, so the LLM can quote medians and quartiles
+        instead of estimating them from the sample.
+        """
+        flow_durations = TDigest()
+        transitions: Dict[Tuple[str, str], TDigest] = {}
+        for flow in flows:
+            events = flow["flow"]
+            if not events:
+                continue
+            flow_durations.add(events[-1]["timestamp"] - events[0]["timestamp"])
+            for previous, event in zip(events, events[1:]):
+                key = (previous["event_name"], event["event_name"])
+                digest = transitions.get(key)
+                if digest is None:
+                    digest = transitions[key] = TDigest()
+                digest.add(event["timestamp"] - previous["timestamp"])
+
+        minutes = 60 * 1000.0
+        top = sorted(transitions.items(), key=lambda item: item[1].count, reverse=True)[:max_transitions]
+        return {
+            "flows": len(flows),
+            "flow_duration_minutes": flow_durations.summary(percentiles=(25, 50, 75, 90), scale=minutes),
+            "step_minutes": {
+                f"{source} → {target}": digest.summary(percentiles=(25, 50, 75, 90), scale=minutes)
+                for (source, target), digest in top
+            }
+        }
+
+    @staticmethod
+    def attribute_context(
+        flows: List[Dict[str, Any]],
+        max_events: int = MAX_ATTRIBUTE_EVENTS
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Compact summary of the event attributes of all given flows, which
+        format_flows drops: for the most frequent events, their most common
+        attribute keys with null rates, top values and numeric quartiles.
+
+        Empty if the flows carry no attributes (e.g. sampled without them).
+        """
+        profiles: Dict[str, AttributeProfile] = {}
+        for flow in flows:
+            for event in flow["flow"]:
+                profile = profiles.get(event["event_name"])
+                if profile is None:
+                    profile = profiles[event["event_name"]] = AttributeProfile(capacity=100)
+                profile.add(event.get("event_attributes"))
+        top = sorted(profiles.items(), key=lambda item: item[1].events, reverse=True)[:max_events]
+        return {name: profile.to_context() for name, profile in top if profile.keys}
+
+    def create_prompt(
+        self,
+        formatted_flows: List[Dict[str, Any]],
+        question: str,
+        statistics: Optional[Dict[str, Any]] = None,
+        attributes: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> str:
+        """Create the analysis prompt for already sampled and formatted flows."""
+        statistics_section = ""
+        if statistics:
+            statistics_section = f"""
+Precomputed timing statistics over all {statistics["flows"]} flows (exact counts and means; percentiles
+accurate to within a fraction of a percent). Use these values for averages, medians and percentiles
+instead of estimating them from the sample:
+{json.dumps(statistics, ensure_ascii=False)}
+"""
+        if attributes:
+            statistics_section += f"""
+Event attribute summary over all flows (per event: attribute keys with the share of events where they are
+missing, their most common values with counts, and quartiles of numeric values). Use it to explain
+differences between users, e.g. by plan, platform or amount:
+{json.dumps(attributes, ensure_ascii=False)}
+"""
+        return f"""Please analyze the following user flow data and answer this specific question: {question}
+
+Flow Data (Sample of {len(formatted_flows)} flows from a larger dataset):
+{formatted_flows}
+{statistics_section}
+Follow these steps for analysis:
+
+1. Flow Event Analysis (Do this first):
+   For each individual flow:
+   - Identify and note the first event
+   - Identify and note the last event
+   - Determine if the flow reached a completion event
+   - Calculate total flow duration (last event timestamp - first event timestamp)
+   - Calculate duration of each step (time between consecutive events)
+   - Calculate time between steps
+   - Note any unusual time gaps or patterns
+   - Convert all times to minutes for consistency
+
+2. Aggregate the individual calculations to get:
+   - Overall flow metrics
+   - Step-specific time metrics
+   - Time distributions
+   - Identify and handle outliers
+   - Common first and last events
+   - Completion rates
+
+3. Provide a detailed analysis with the following structure:
+
+📊 Overall Flow Metrics:
+- First Event Analysis:
+  * Most common first events
+  * Distribution of first events
+  * Average time from first event to next step
+- Last Event Analysis:
+  * Most common last events
+  * Distribution of last events
+  * Completion rate (flows ending with a completion event)
+- Total number of users who started the flow
+- Total number of users who completed the flow
+- Overall conversion rate (start to completion)
+- Time Metrics (based on individual flow calculations):
+  * Average total flow duration (in minutes)
+  * Median total flow duration (in minutes)
+  * 25th and 75th percentile durations
+  * Distribution of flow durations
+  * Any notable outliers or time patterns
+
+📈 Step-by-Step Analysis:
+For each step in the flow:
+- Number of users who reached this step
+- Conversion rate from previous step
+- Drop-off rate from previous step
+- Time Metrics (based on individual calculations):
+  * Average step duration (in minutes)
+  * Median step duration (in minutes)
+  * Time from flow start to this step
+  * Time between this step and next step
+  * Distribution of step durations
+  * Any notable time patterns or outliers
+
+⏱️ Time-Based Patterns:
+- Most common time patterns in the flow
+- Steps where users spend the most/least time
+- Correlation between time spent and conversion rates
+- Time-based drop-off patterns
+- Optimal flow duration for highest conversion
+- Any unusual time patterns or outliers
+- Time patterns from first to last event
+
+⚠️ Critical Drop-off Points:
+- Identify steps with highest drop-off rates
+- Calculate percentage of users lost at each critical point
+- Time spent before drop-off (based on individual calculations)
+- Analyze potential reasons for drop-offs
+- Common last events before drop-off
+
+💡 Key Insights:
+- Main patterns in user behavior
+- Most common paths through the flow
+- Time-based patterns and engagement metrics
+- Specific recommendations for improvement
+- Time optimization opportunities
+- Insights about flow completion and abandonment
+
+Format your response with clear sections and use emojis for better readability.
+Remember: Focus ONLY on aggregate patterns and NEVER mention individual users or user IDs.
+Note: This is a sample of the data, so focus on patterns and trends rather than absolute numbers.
+Include a note about any assumptions made in time calculations."""
+
+    async def analyze(self, flows: List[Dict[str, Any]], question: str) -> str:
+        """
+        Sample the flows and answer the question about them.
+
+        Args:
+            flows: Flows as returned by get_user_flows_by_version
+            question: The user's question about the flows
+        """
+        statistics = self.duration_statistics(flows)
+        attributes = self.attribute_context(flows)
+        formatted_flows = self.format_flows(self.sample_flows(flows))
+        prompt = self.create_prompt(formatted_flows, question, statistics, attributes)
+        print(f"Sending prompt to OpenAI with {len(formatted_flows)} flows")
+        return await self.generate(prompt, temperature=0.7, max_tokens=2000)
@@ -1,8 +1,14 @@
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator
 from datetime import datetime, timedelta
 from collections import defaultdict
+from app.data_access.interfaces import EventDataAccess
+from app.services.analytics.paths import EventCodec, NgramCounter
+from app.services.openai_service import OpenAIService
 from .base import BasePromptHandler
 
+# Most frequent event sequences included in the analysis data
+MAX_EVENT_SEQUENCES = 100
+
 class FunnelCreationHandler(BasePromptHandler):
     def _get_system_message(self) -> str:
         return """You are an AI model responsible for creating user funnels based on behavior events from a mobile app. The user will provide a **starting event** (e.g., 'user_sign_up'), a **time frame** (e.g., 'last 7 days'), and a **conversion window** (e.g., '24 hours').
@@ -27,19 +33,60 @@ Your responsibilities include:
 
 Always ask for clarification when needed, especially for events with multiple attributes or intents."""
 
-    def _prepare_events_for_analysis(
+    def __init__(self, openai_service: OpenAIService, event_dao: Optional[EventDataAccess] = None):
+        super().__init__(openai_service)
+        self.event_dao = event_dao
+
+    async def _iter_user_events(
+        self,
+        start_ms: int,
+        end_ms: int,
+        event_names: Optional[List[str]],
+        events: Optional[List[Dict[str, Any]]]
+    ) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Yield (user_id, time-ordered events) within [start_ms, end_ms].
+        
+        Reads through the event DAO when one is configured, so the time range and
+        event names are applied by an indexed query and only one user's events
+        are held at a time. Explicitly passed events are filtered in memory.
+        """
+        if events is None:
+            if self.event_dao is None:
+                return
+            async for user_id, user_events in self.event_dao.iter_user_event_groups(
+                start_ms=start_ms,
+                end_ms=end_ms,
+                names=event_names,
+                fields=["name", "timestamp"]
+            ):
+                yield user_id, user_events
+            return
+        
+        names = set(event_names) if event_names else None
+        user_events = defaultdict(list)
+        for event in events:
+            if start_ms <= event['timestamp'] <= end_ms and (names is None or event['name'] in names):
+                user_events[event['user_id']].append(event)
+        for user_id, user_event_list in user_events.items():
+            user_event_list.sort(key=lambda x: x['timestamp'])
+            yield user_id, user_event_list
+
+    async def _prepare_events_for_analysis(
         self,
-        events: List[Dict[str, Any]],
         time_frame: str,
-        conversion_window: str
+        conversion_window: str,
+        event_names: Optional[List[str]] = None,
+        events: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         """
         Prepare and aggregate event data for OpenAI analysis.
         
         Args:
-            events: List of event dictionaries
             time_frame: Time frame string (e.g., "last 7 days")
             conversion_window: Conversion window string (e.g., "24 hours")
+            event_names: Optionally only consider these events
+            events: Optional list of event dictionaries to use instead of querying the event DAO
             
         Returns:
             Aggregated and formatted event data suitable for OpenAI analysis
@@ -47,6 +94,7 @@ Always ask for clarification when needed, especially for events with multiple at
         # Parse time frame and conversion window
         time_frame_days = self._parse_time_to_days(time_frame)
         conversion_window_hours = self._parse_time_to_hours(conversion_window)
+        window_ms = conversion_window_hours * 3600 * 1000
         
         # Calculate time boundaries
         end_time = datetime.now()
@@ -56,38 +104,32 @@ Always ask for clarification when needed, especially for events with multiple at
         start_ms = int(start_time.timestamp() * 1000)
         end_ms = int(end_time.timestamp() * 1000)
         
-        # Filter events within time frame
-        filtered_events = [
-            event for event in events
-            if start_ms <= event['timestamp'] <= end_ms
-        ]
-        
-        # Group events by user
-        user_events = defaultdict(list)
-        for event in filtered_events:
-            user_events[event['user_id']].append(event)
-        
-        # Sort events by timestamp for each user
-        for user_id in user_events:
-            user_events[user_id].sort(key=lambda x: x['timestamp'])
-        
-        # Aggregate event counts and calculate conversion rates
+        # Aggregate event counts and the most frequent sequences of 2-3 events.
+        # Names are integer-coded so sequences are counted as packed int keys
+        # in bounded heavy-hitters sketches instead of one string per occurrence.
         event_counts = defaultdict(int)
-        event_sequences = defaultdict(int)
+        codec = EventCodec()
+        sequences = NgramCounter(n=3, capacity=MAX_EVENT_SEQUENCES * 10)
+        total_users = 0
+        total_events = 0
         
-        for user_id, events in user_events.items():
+        async for user_id, user_events in self._iter_user_events(start_ms, end_ms, event_names, events):
+            total_users += 1
+            total_events += len(user_events)
+            
             # Count individual events
-            for event in events:
+            for event in user_events:
                 event_counts[event['name']] += 1
             
-            # Count event sequences (up to 3 events in sequence)
-            for i in range(len(events) - 1):
-                seq = f"{events[i]['name']} → {events[i+1]['name']}"
-                event_sequences[seq] += 1
-                
-                if i < len(events) - 2:
-                    seq = f"{events[i]['name']} → {events[i+1]['name']} → {events[i+2]['name']}"
-                    event_sequences[seq] += 1
+            # Events further apart than the conversion window can't be steps of
+            # one funnel, so sequences are only counted within each run of events
+            run_start = 0
+            for i in range(1, len(user_events) + 1):
+                if i == len(user_events) or user_events[i]['timestamp'] - user_events[i - 1]['timestamp'] > window_ms:
+                    sequences.add_sequence(codec.encode_all(event['name'] for event in user_events[run_start:i]))
+                    run_start = i
+        
+        event_sequences = sequences.top(MAX_EVENT_SEQUENCES, codec)
         
         # Prepare the final data structure
         analysis_data = {
@@ -99,13 +141,13 @@ Always ask for clarification when needed, especially for events with multiple at
             "conversion_window": {
                 "hours": conversion_window_hours
             },
-            "total_users": len(user_events),
+            "total_users": total_users,
             "event_counts": dict(event_counts),
-            "event_sequences": dict(event_sequences),
+            "event_sequences": event_sequences,
             "summary": {
-                "total_events": len(filtered_events),
+                "total_events": total_events,
                 "unique_events": len(event_counts),
-                "avg_events_per_user": len(filtered_events) / len(user_events) if user_events else 0
+                "avg_events_per_user": total_events / total_users if total_users else 0
             }
         }
         
@@ -158,7 +200,7 @@ Always ask for clarification when needed, especially for events with multiple at
     async def create_funnel(
         self,
         description: str,
-        events: List[Dict[str, Any]],
+        events: Optional[List[Dict[str, Any]]] = None,
         context: Optional[Dict[str, Any]] = None
     ) -> str:
         """
@@ -166,21 +208,23 @@ Always ask for clarification when needed, especially for events with multiple at
         
         Args:
             description: Description of the desired funnel
-            events: List of event dictionaries
-            context: Optional context about available events and their attributes
+            events: Optional list of event dictionaries; read through the event DAO if omitted
+            context: Optional context about available events and their attributes.
+                An "events" list or "available_events" mapping limits which events are read.
         """
         # Extract key components from the description
-        components = self._parse_funnel_components(description)
+        components = self._parse_funnel_components(description, context)
         
         # Check if we need clarification for the starting event
         if components.get('needs_clarification'):
             return self._generate_clarification_request(components)
         
         # Prepare events for analysis
-        analysis_data = self._prepare_events_for_analysis(
-            events,
+        analysis_data = await self._prepare_events_for_analysis(
             components['time_frame'],
-            components['conversion_window']
+            components['conversion_window'],
+            event_names=self._relevant_event_names(components, context),
+            events=events
         )
         
         # Add analysis data to context
@@ -194,7 +238,27 @@ Always ask for clarification when needed, especially for events with multiple at
         # Generate the funnel analysis
         return await self.generate(prompt, context)
 
-    def _parse_funnel_components(self, description: str) -> Dict[str, Any]:
+    @staticmethod
+    def _relevant_event_names(
+        components: Dict[str, Any],
+        context: Optional[Dict[str, Any]]
+    ) -> Optional[List[str]]:
+        """Event names to read, or None for all events if the context doesn't list any."""
+        if not context:
+            return None
+        names = set(context.get('events') or []) | set(context.get('available_events') or {})
+        if not names:
+            return None
+        names.update(
+            event for event in (components.get('starting_event'), components.get('last_event')) if event
+        )
+        return sorted(names)
+
+    def _parse_funnel_components(
+        self,
+        description: str,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """Parse the funnel description to extract key components."""
         import re
         from typing import Optional, Tuple
@@ -10,23 +10,42 @@ class UserBehaviorPrompt:
         Generate a prompt for analyzing individual user behavior.
         
         Args:
-            user_data: Dictionary containing user_id, user_name, and events data
+            user_data: Dictionary containing user_id, user_name and either a precomputed
+                'summary' (see UserHistorySummary) or the raw 'events' list
             
         Returns:
             str: Formatted prompt for user behavior analysis
         """
         user_id = user_data.get('user_id', '')
         user_name = user_data.get('user_name', 'Unknown User')
-        events = user_data.get('events', [])
+        summary = user_data.get('summary')
         
-        # Generate the prompt
-        prompt = f"""You are an expert in analyzing user behavior in mobile apps.
+        if summary is not None:
+            # Precomputed metrics plus a bounded tail keep the prompt size constant
+            summary = dict(summary)
+            recent_events = summary.pop('recent_events', [])
+            history = f"""a summary of the complete event history for {user_name}, and I need you to perform a detailed behavioral analysis.
+The session metrics below were computed from every event; only the most recent events are listed individually.
+
+Here's the user's history summary (times are UTC):
+
+{summary}
+
+Here are the user's {len(recent_events)} most recent events:
 
-I will provide you with the complete event history for {user_name}, and I need you to perform a detailed behavioral analysis.
+{recent_events}"""
+        else:
+            events = user_data.get('events', [])
+            history = f"""the complete event history for {user_name}, and I need you to perform a detailed behavioral analysis.
 
 Here's the user's event data:
 
-{events}
+{events}"""
+        
+        # Generate the prompt
+        prompt = f"""You are an expert in analyzing user behavior in mobile apps.
+
+I will provide you with {history}
 
 Please analyze this data and provide a comprehensive behavioral analysis following these steps:
 
@@ -0,0 +1,184 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.core.cache import TTLCache, MISSING
+from app.core.config import settings
+from app.data_access.interfaces import EventDataAccess
+from app.services.analytics.retention import (
+    DAY_MS, ActivityColumns, cohort_matrix, day_to_date, week_of, week_start_day
+)
+
+# Users whose first-seen time is looked up per round trip while scanning activity
+FIRST_SEEN_BATCH_SIZE = 1000
+
+# Label of the cohorts over all users when no app versions are requested
+ALL_USERS = "all"
+
+# Finished cohort rows, keyed by (label, offsets, week). A cohort is finished once
+# its last user's last reported offset is a complete day, after which it can't change.
+_cohort_cache: TTLCache[Dict[str, Any]] = TTLCache(
+    max_size=settings.RETENTION_CACHE_MAX_SIZE,
+    ttl_seconds=settings.RETENTION_CACHE_TTL_SECONDS
+)
+
+class RetentionService:
+    """
+    Day-N retention of weekly first-seen cohorts, overall or per app version.
+
+    Activity is read as distinct (user, day) pairs and first-seen times come
+    from the (user_id, timestamp) index, so no raw events are loaded; the
+    cohort matrix is computed with array operations. Finished cohorts are
+    cached and only the weeks that can still change are rescanned.
+    """
+
+    def __init__(self, event_dao: EventDataAccess):
+        self.event_dao = event_dao
+
+    async def load_activity(
+        self,
+        start_day: int,
+        end_ms: int,
+        user_ids: Optional[List[str]] = None
+    ) -> ActivityColumns:
+        """
+        Activity since ``start_day`` of the users first seen on or after it.
+
+        Users first seen earlier belong to older cohorts and are dropped as
+        soon as their first-seen time is known.
+        """
+        columns = ActivityColumns()
+        pending: List[Tuple[str, List[int]]] = []
+
+        async def flush():
+            first_seen = await self.event_dao.get_first_seen([user_id for user_id, _ in pending])
+            for user_id, days in pending:
+                first_day = first_seen.get(user_id, days[0] * DAY_MS) // DAY_MS
+                if first_day >= start_day:
+                    columns.add_user(user_id, days, first_day)
+            pending.clear()
+
+        async for user_id, days in self.event_dao.iter_user_active_days(
+            start_ms=start_day * DAY_MS,
+            end_ms=end_ms,
+            user_ids=user_ids
+        ):
+            pending.append((user_id, days))
+            if len(pending) >= FIRST_SEEN_BATCH_SIZE:
+                await flush()
+        if pending:
+            await flush()
+        return columns
+
+    async def compute(
+        self,
+        versions: Optional[List[str]] = None,
+        weeks: int = 8,
+        offsets: Sequence[int] = (1, 7, 30),
+        user_ids: Optional[List[str]] = None,
+        now_ms: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Retention matrix of the last ``weeks`` first-seen weeks (Monday to Sunday, UTC).
+
+        Args:
+            versions: App versions to report separately; None reports all users
+            weeks: Number of weekly cohorts, ending with the current week
+            offsets: Days after first seen to report (D1, D7, ...)
+            user_ids: Optional segment restricting the users (disables caching)
+            now_ms: Current time (ms), for reproducible results
+
+        Returns:
+            Dict with the offsets, the last complete day and, per version (or
+            "all"), one row per cohort week with its size, whether it is final,
+            and retained/eligible users and the rate (%) per offset
+        """
+        offsets = sorted(set(offsets))
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        last_complete_day = now_ms // DAY_MS - 1
+        last_week = int(week_of(now_ms // DAY_MS))
+        cohort_weeks = list(range(last_week - weeks + 1, last_week + 1))
+        labels = list(versions) if versions else [ALL_USERS]
+        use_cache = user_ids is None
+
+        def is_final(week: int) -> bool:
+            return week_start_day(week) + 6 + offsets[-1] <= last_complete_day
+
+        rows: Dict[str, Dict[int, Dict[str, Any]]] = {label: {} for label in labels}
+        if use_cache:
+            for label in labels:
+                for week in cohort_weeks:
+                    cached = _cohort_cache.get((label, tuple(offsets), week))
+                    if cached is not MISSING:
+                        rows[label][week] = cached
+
+        missing = [week for week in cohort_weeks if any(week not in rows[label] for label in labels)]
+        if missing:
+            first_week = missing[0]
+            label_users: Dict[str, Optional[List[str]]] = {ALL_USERS: None}
+            if versions:
+                version_user_ids = await asyncio.gather(
+                    *(self.event_dao.get_version_user_ids(version) for version in labels)
+                )
+                label_users = dict(zip(labels, version_user_ids))
+                scan_user_ids = set().union(*version_user_ids)
+                if user_ids is not None:
+                    scan_user_ids &= set(user_ids)
+                scan_user_ids = list(scan_user_ids)
+            else:
+                scan_user_ids = user_ids
+
+            columns = await self.load_activity(week_start_day(first_week), now_ms, scan_user_ids)
+            users, days, first_days = columns.arrays()
+
+            def matrices():
+                return {
+                    label: cohort_matrix(
+                        users, days, first_days, offsets,
+                        first_week, last_week - first_week + 1, last_complete_day,
+                        columns.mask(label_users[label]) if versions else None
+                    )
+                    for label in labels
+                }
+
+            # Array work is CPU-bound; keep it off the event loop
+            for label, matrix in (await asyncio.to_thread(matrices)).items():
+                for week in range(first_week, last_week + 1):
+                    if week in rows[label]:
+                        continue
+                    row = self._row(matrix, week - first_week, week, offsets, is_final(week))
+                    rows[label][week] = row
+                    if use_cache and row["final"]:
+                        _cohort_cache.set((label, tuple(offsets), week), row)
+
+        return {
+            "offsets": offsets,
+            "last_complete_day": day_to_date(last_complete_day).isoformat(),
+            "cohorts": {
+                label: [rows[label][week] for week in cohort_weeks]
+                for label in labels
+            }
+        }
+
+    @staticmethod
+    def _row(
+        matrix: Dict[str, Any],
+        index: int,
+        week: int,
+        offsets: List[int],
+        final: bool
+    ) -> Dict[str, Any]:
+        retention = {}
+        for j, offset in enumerate(offsets):
+            retained = int(matrix["retained"][index, j])
+            eligible = int(matrix["eligible"][index, j])
+            retention[f"D{offset}"] = {
+                "retained": retained,
+                "eligible": eligible,
+                "rate": round(retained / eligible * 100, 2) if eligible else None
+            }
+        return {
+            "week_start": day_to_date(week_start_day(week)).isoformat(),
+            "users": int(matrix["users"][index]),
+            "final": final,
+            "retention": retention
+        }
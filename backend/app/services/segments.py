@@ -0,0 +1,175 @@
+import time
+from datetime import datetime
+from typing import List, Optional
+from app.core.cache import TTLCache, MISSING
+from app.data_access.interfaces import EventDataAccess, SegmentDataAccess
+from app.models.segment import Segment, SegmentCondition, SegmentCombination, SegmentOperation
+from app.services.analytics.bitmap import Bitmap
+from app.services.jobs import ProgressCallback
+
+# Users are assigned indices in chunks of this size while syncing the index
+INDEX_SYNC_CHUNK_SIZE = 10000
+
+# Decompressed member bitmaps, keyed by (segment_id, computed_at) so recomputation invalidates them,
+# and the assigned-index universe, keyed by ("assigned", index size)
+_bitmap_cache: TTLCache[Bitmap] = TTLCache(max_size=64, ttl_seconds=3600)
+
+class SegmentNotReady(ValueError):
+    """Raised when a segment does not exist or has not been computed yet."""
+    pass
+
+class SegmentService:
+    """
+    Computes segment membership as bitmaps over integer user indices.
+
+    Each condition compiles to one Mongo query returning user ids; those are
+    mapped to dense indices and intersected as bitmaps. Combinations of
+    existing segments are pure bitmap operations and never touch events.
+    """
+
+    def __init__(self, segment_dao: SegmentDataAccess, event_dao: EventDataAccess):
+        self.segment_dao = segment_dao
+        self.event_dao = event_dao
+
+    async def sync_user_index(self) -> None:
+        """
+        Assign indices to every user with events since the last sync.
+
+        This keeps the index universe equal to "all users with events", which
+        is what NOT is evaluated against.
+        """
+        # Driven by insertion order rather than event time, so late events
+        # (old timestamps, inserted now) still get their users indexed
+        event_dao = self.event_dao.primary_reads()
+        watermark = await event_dao.get_insert_watermark()
+        synced = await self.segment_dao.get_user_index_watermark()
+        if watermark is None or watermark == synced:
+            return
+        if synced is None:
+            user_ids = [user_id async for user_id in event_dao.iter_user_ids_by_event_count()]
+        else:
+            user_ids = await event_dao.get_users_inserted_after(synced)
+        for i in range(0, len(user_ids), INDEX_SYNC_CHUNK_SIZE):
+            await self.segment_dao.get_user_indices(user_ids[i:i + INDEX_SYNC_CHUNK_SIZE])
+        await self.segment_dao.set_user_index_watermark(watermark)
+
+    async def _ids_to_bitmap(self, user_ids: List[str]) -> Bitmap:
+        indices = await self.segment_dao.get_user_indices(user_ids)
+        return Bitmap.from_indices(indices.values())
+
+    async def condition_bitmap(self, condition: SegmentCondition) -> Bitmap:
+        """Evaluate one condition against the events collection."""
+        bitmap = None
+        if condition.event_name:
+            start_ms = None
+            if condition.within_days:
+                start_ms = int((time.time() - condition.within_days * 86400) * 1000)
+            user_ids = [
+                user_id async for user_id in self.event_dao.iter_user_ids_by_event_count(
+                    condition.event_name,
+                    start_ms=start_ms,
+                    min_count=condition.min_count,
+                    max_count=condition.max_count
+                )
+            ]
+            bitmap = await self._ids_to_bitmap(user_ids)
+        if condition.version:
+            version_bitmap = await self._ids_to_bitmap(
+                await self.event_dao.get_version_user_ids(condition.version)
+            )
+            bitmap = version_bitmap if bitmap is None else bitmap & version_bitmap
+        return bitmap
+
+    async def get_bitmap(self, segment_id: str) -> Bitmap:
+        """
+        Load a computed segment's members.
+
+        Raises:
+            SegmentNotReady: If the segment does not exist or is not computed
+        """
+        segment = await self.segment_dao.get_segment(segment_id)
+        if segment is None or segment.computed_at is None:
+            raise SegmentNotReady(f"Segment {segment_id} not found or not computed yet")
+        key = (segment_id, segment.computed_at)
+        bitmap = _bitmap_cache.get(key)
+        if bitmap is MISSING:
+            data = await self.segment_dao.get_segment_members(segment_id)
+            if data is None:
+                raise SegmentNotReady(f"Segment {segment_id} has no stored members")
+            bitmap = Bitmap.from_bytes(data)
+            _bitmap_cache.set(key, bitmap)
+        return bitmap
+
+    async def assigned_bitmap(self) -> Bitmap:
+        """
+        Every index mapped to a user, i.e. the universe NOT is evaluated against.
+
+        Indices below the index size can be reserved without being assigned
+        (see get_user_indices), so the universe is not simply [0, size).
+        Cached until the index grows.
+        """
+        key = ("assigned", await self.segment_dao.get_user_index_size())
+        bitmap = _bitmap_cache.get(key)
+        if bitmap is MISSING:
+            bitmap = Bitmap.from_indices(await self.segment_dao.get_assigned_user_indices())
+            _bitmap_cache.set(key, bitmap)
+        return bitmap
+
+    async def combine(self, combination: SegmentCombination) -> Bitmap:
+        """Apply a set operation to computed segments."""
+        operands = [await self.get_bitmap(segment_id) for segment_id in combination.segment_ids]
+        if combination.op == SegmentOperation.NOT:
+            return await self.assigned_bitmap() - operands[0]
+        result = operands[0]
+        for operand in operands[1:]:
+            if combination.op == SegmentOperation.AND:
+                result = result & operand
+            elif combination.op == SegmentOperation.OR:
+                result = result | operand
+            else:
+                result = result - operand
+        return result
+
+    async def compute(
+        self,
+        segment_id: str,
+        report_progress: Optional[ProgressCallback] = None
+    ) -> Optional[Segment]:
+        """
+        (Re)compute and store a segment's members.
+
+        Returns:
+            The updated segment, or None if it does not exist
+        """
+        segment = await self.segment_dao.get_segment(segment_id)
+        if segment is None:
+            return None
+
+        await self.sync_user_index()
+        if segment.combination:
+            bitmap = await self.combine(segment.combination)
+        else:
+            bitmap = None
+            for i, condition in enumerate(segment.conditions):
+                condition_bitmap = await self.condition_bitmap(condition)
+                bitmap = condition_bitmap if bitmap is None else bitmap & condition_bitmap
+                if report_progress:
+                    await report_progress((i + 1) / len(segment.conditions), f"Condition {i + 1} evaluated")
+
+        segment.user_count = bitmap.cardinality()
+        now = datetime.utcnow()
+        # Millisecond precision, as stored by Mongo, so the cache key matches later reads
+        segment.computed_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        await self.segment_dao.save_segment_members(segment, bitmap.to_bytes())
+        _bitmap_cache.set((segment_id, segment.computed_at), bitmap)
+        return segment
+
+    async def get_member_ids(self, segment_id: str) -> List[str]:
+        """
+        Resolve a computed segment to user ids, e.g. to filter flow or funnel queries.
+
+        Raises:
+            SegmentNotReady: If the segment does not exist or is not computed
+        """
+        bitmap = await self.get_bitmap(segment_id)
+        return await self.segment_dao.get_user_ids(list(bitmap.indices()))
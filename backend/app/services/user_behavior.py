@@ -0,0 +1,224 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from app.core.cache import TTLCache, MISSING
+from app.core.config import settings
+from app.core.rate_limit import Priority
+from app.data_access.interfaces import EventDataAccess, UserDataAccess
+from app.services.openai_service import OpenAIService
+from app.services.analytics.user_summary import UserHistorySummary
+from app.services.prompts.user_behavior import UserBehaviorPrompt
+
+# Only these fields are read from each event of the user's history
+HISTORY_FIELDS = ["name", "timestamp"]
+
+# Finished analyses by user_id, shared by the single-user and batch endpoints
+analysis_cache: TTLCache[Dict[str, Any]] = TTLCache(
+    max_size=settings.USER_BEHAVIOR_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_BEHAVIOR_CACHE_TTL_SECONDS
+)
+
+class _RequestPacer:
+    """Spaces out request starts so that at most ``requests_per_minute`` begin per minute."""
+
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60 / requests_per_minute if requests_per_minute > 0 else 0
+        self.next_start = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_start > now:
+                await asyncio.sleep(self.next_start - now)
+            self.next_start = max(now, self.next_start) + self.interval
+
+class UserBehaviorAnalyzer:
+    """Builds compact user history summaries and runs UserBehaviorPrompt analyses on them."""
+
+    def __init__(
+        self,
+        openai_service: OpenAIService,
+        event_dao: EventDataAccess,
+        user_dao: UserDataAccess
+    ):
+        self.openai_service = openai_service
+        self.event_dao = event_dao
+        self.user_dao = user_dao
+
+    def new_summary(self) -> UserHistorySummary:
+        return UserHistorySummary(
+            session_gap_ms=settings.USER_BEHAVIOR_SESSION_GAP_MINUTES * 60 * 1000,
+            recent_events=settings.USER_BEHAVIOR_RECENT_EVENTS
+        )
+
+    async def summarize(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Summarize a user's full history in one streaming pass.
+
+        Returns:
+            The summary dictionary, or None if the user has no events
+        """
+        summary = self.new_summary()
+        async for event in self.event_dao.iter_user_events(user_id, fields=HISTORY_FIELDS):
+            summary.add(event["name"], event["timestamp"])
+        return summary.to_dict() if summary.total_events else None
+
+    async def summarize_many(self, user_ids: List[str]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Summarize many users from batched $in queries.
+
+        Yields (user_id, summary) as each user's history is complete; users
+        without events are not yielded. Only one user's summary is built at a time.
+        """
+        current_id = None
+        summary = None
+        async for event in self.event_dao.iter_events_for_users(
+            user_ids,
+            fields=HISTORY_FIELDS,
+            batch_size=settings.USER_BEHAVIOR_BATCH_FETCH_SIZE
+        ):
+            if event["user_id"] != current_id:
+                if summary is not None:
+                    yield current_id, summary.to_dict()
+                current_id = event["user_id"]
+                summary = self.new_summary()
+            summary.add(event["name"], event["timestamp"])
+        if summary is not None:
+            yield current_id, summary.to_dict()
+
+    async def analyze_summary(
+        self,
+        user_id: str,
+        summary: Dict[str, Any],
+        user_name: Optional[str] = None,
+        priority: Optional[Priority] = None
+    ) -> Dict[str, Any]:
+        """Generate the LLM behaviour analysis for an existing summary and cache it."""
+        if user_name is None:
+            user = await self.user_dao.get_user_by_id(user_id)
+            user_name = user.name if user else user_id
+        prompt = UserBehaviorPrompt.generate_prompt({
+            "user_id": user_id,
+            "user_name": user_name,
+            "summary": summary
+        })
+        result = await self.openai_service.generate_completion(prompt=prompt, priority=priority)
+        analysis = {
+            "user_id": user_id,
+            "summary": summary,
+            "result": result,
+            "analyzed_at": datetime.utcnow().isoformat()
+        }
+        analysis_cache.set(user_id, analysis)
+        return analysis
+
+    async def analyze(self, user_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Summarize and analyze one user, reusing a fresh cached analysis unless ``refresh``.
+
+        Returns:
+            {"user_id", "summary", "result", "analyzed_at"}, or None if the user has no events
+        """
+        if not refresh:
+            cached = analysis_cache.get(user_id)
+            if cached is not MISSING:
+                return cached
+        summary = await self.summarize(user_id)
+        if summary is None:
+            return None
+        return await self.analyze_summary(user_id, summary)
+
+    async def analyze_batch(
+        self,
+        user_ids: List[str],
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        refresh: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Analyze many users concurrently, yielding each result as soon as it completes.
+
+        Users with a fresh cached analysis are yielded first without any database
+        or OpenAI work. Every yielded item has a "status" of "cached", "ok",
+        "not_found" (no events) or "error". OpenAI calls are scheduled at batch
+        priority, behind interactive requests.
+
+        Histories are only read while fewer than ``max_concurrency`` analyses are
+        in flight, so memory stays bounded for large batches. If reading fails,
+        the analyses already started are finished and a last item with status
+        "error" and no user_id is yielded (the response has already begun).
+
+        Args:
+            user_ids: Users to analyze; duplicates are ignored
+            max_concurrency: Maximum analyses in flight (defaults to settings)
+            requests_per_minute: OpenAI request budget for this batch (defaults to settings)
+            refresh: Ignore cached analyses
+        """
+        pending = []
+        for user_id in dict.fromkeys(user_ids):
+            cached = MISSING if refresh else analysis_cache.get(user_id)
+            if cached is MISSING:
+                pending.append(user_id)
+            else:
+                yield {**cached, "status": "cached"}
+        if not pending:
+            return
+
+        users = await self.user_dao.get_users_by_ids(pending)
+        semaphore = asyncio.Semaphore(max_concurrency or settings.USER_BEHAVIOR_BATCH_CONCURRENCY)
+        pacer = _RequestPacer(requests_per_minute or settings.USER_BEHAVIOR_BATCH_REQUESTS_PER_MINUTE)
+        results: asyncio.Queue = asyncio.Queue()
+        done = object()
+        tasks: Set[asyncio.Task] = set()
+
+        async def run(user_id: str, summary: Dict[str, Any]):
+            # The producer acquired the semaphore for this task
+            try:
+                await pacer.wait()
+                user = users.get(user_id)
+                analysis = await self.analyze_summary(
+                    user_id, summary, user.name if user else user_id, priority=Priority.BATCH
+                )
+                item = {**analysis, "status": "ok"}
+            except Exception as e:
+                item = {"user_id": user_id, "status": "error", "error": str(e)}
+            finally:
+                semaphore.release()
+            await results.put(item)
+
+        async def produce():
+            summarized = set()
+            try:
+                async for user_id, summary in self.summarize_many(pending):
+                    summarized.add(user_id)
+                    # Backpressure: stop reading histories while all slots are busy
+                    await semaphore.acquire()
+                    task = asyncio.create_task(run(user_id, summary))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                for user_id in pending:
+                    if user_id not in summarized:
+                        await results.put({"user_id": user_id, "status": "not_found"})
+            except Exception as e:
+                print("Error reading user histories for batch analysis:", str(e))
+                await asyncio.gather(*tasks)
+                await results.put({"status": "error", "error": str(e)})
+            else:
+                await asyncio.gather(*tasks)
+            await results.put(done)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await results.get()
+                if item is done:
+                    break
+                yield item
+        finally:
+            producer.cancel()
+            for task in list(tasks):
+                task.cancel()
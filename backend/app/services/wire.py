@@ -0,0 +1,159 @@
+"""
+Compact binary encoding of flow lists, negotiated with the Accept and
+Accept-Encoding headers.
+
+``application/msgpack`` responses are MessagePack maps of the form::
+
+    {
+        "format": "flows/1",
+        "names": ["App Launched", "Home", ...],    # event-name dictionary
+        "users": ["u1", ...],                      # user id dictionary
+        "flows": [
+            {
+                "user": 0,                         # index into "users"
+                "start": 1700000000000,            # timestamp of the first event (ms)
+                "names": [0, 1, ...],              # indices into "names", one per event
+                "deltas": [0, 1500, ...],          # ms since the previous event (0 for the first)
+                "attributes": [{...}, None, ...]   # only present if any event has attributes
+            },
+            ...
+        ]
+    }
+
+Responses can additionally be zstd (``Content-Encoding: zstd``) or gzip
+compressed. Requires the optional ``msgpack`` dependency, and ``zstandard``
+for zstd (``poetry install -E wire``); JSON stays the default.
+"""
+import gzip
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+FLOWS_FORMAT = "flows/1"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Fast levels: responses are compressed on every request
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 5
+
+class WireFormat(str, Enum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+class ContentEncoding(str, Enum):
+    IDENTITY = "identity"
+    ZSTD = "zstd"
+    GZIP = "gzip"
+
+def _quality(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-style header into {value: q}."""
+    qualities = {}
+    for item in (header or "").split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        qualities[value.lower()] = q
+    return qualities
+
+def negotiate(accept: Optional[str], accept_encoding: Optional[str]) -> Tuple[WireFormat, ContentEncoding]:
+    """
+    Pick the response format and compression for a flows request.
+
+    MessagePack is used only when the client lists a MessagePack media type
+    at least as preferred as JSON (``*/*`` alone means JSON), and msgpack is
+    installed. MessagePack bodies are compressed with zstd when the client
+    accepts it and zstandard is installed, else with gzip if accepted.
+    """
+    accepted = _quality(accept)
+    msgpack_q = max((accepted.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    json_q = accepted.get("application/json", 0.0)
+    if msgpack is None or msgpack_q <= 0 or msgpack_q < json_q:
+        return WireFormat.JSON, ContentEncoding.IDENTITY
+
+    encodings = _quality(accept_encoding)
+    if zstandard is not None and encodings.get("zstd", 0.0) > 0:
+        return WireFormat.MSGPACK, ContentEncoding.ZSTD
+    if encodings.get("gzip", 0.0) > 0:
+        return WireFormat.MSGPACK, ContentEncoding.GZIP
+    return WireFormat.MSGPACK, ContentEncoding.IDENTITY
+
+def _packable(value: Any) -> Any:
+    # Attribute values msgpack can't represent (dates, ObjectIds), as the JSON API renders them
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+def to_columns(flows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert flows (as returned by get_user_flows_by_version) to the columnar "flows/1" layout."""
+    name_codes: Dict[str, int] = {}
+    user_codes: Dict[str, int] = {}
+    columns = []
+    for flow in flows:
+        events = flow["flow"]
+        names = [name_codes.setdefault(event["event_name"], len(name_codes)) for event in events]
+        timestamps = [event["timestamp"] for event in events]
+        column = {
+            "user": user_codes.setdefault(flow["user_id"], len(user_codes)),
+            "start": timestamps[0] if timestamps else 0,
+            "names": names,
+            "deltas": [0] + [later - earlier for earlier, later in zip(timestamps, timestamps[1:])] if timestamps else []
+        }
+        attributes = [event.get("event_attributes") or None for event in events]
+        if any(attributes):
+            column["attributes"] = attributes
+        columns.append(column)
+    return {
+        "format": FLOWS_FORMAT,
+        "names": list(name_codes),
+        "users": list(user_codes),
+        "flows": columns
+    }
+
+def from_columns(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Inverse of ``to_columns``, for Python clients."""
+    names, users = payload["names"], payload["users"]
+    flows = []
+    for column in payload["flows"]:
+        timestamp = column["start"]
+        attributes = column.get("attributes") or [None] * len(column["names"])
+        events = []
+        for code, delta, event_attributes in zip(column["names"], column["deltas"], attributes):
+            timestamp += delta
+            events.append({
+                "event_name": names[code],
+                "event_attributes": event_attributes or {},
+                "timestamp": timestamp
+            })
+        flows.append({"user_id": users[column["user"]], "flow": events})
+    return flows
+
+def encode_flows(flows: List[Dict[str, Any]], encoding: ContentEncoding = ContentEncoding.IDENTITY) -> bytes:
+    """Encode flows as (optionally compressed) columnar MessagePack."""
+    body = msgpack.packb(to_columns(flows), default=_packable, use_bin_type=True)
+    if encoding == ContentEncoding.ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == ContentEncoding.GZIP:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+def decode_flows(data: bytes, encoding: ContentEncoding = ContentEncoding.IDENTITY) -> List[Dict[str, Any]]:
+    """Inverse of ``encode_flows``."""
+    if encoding == ContentEncoding.ZSTD:
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == ContentEncoding.GZIP:
+        data = gzip.decompress(data)
+    return from_columns(msgpack.unpackb(data, raw=False))
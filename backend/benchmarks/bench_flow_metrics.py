@@ -0,0 +1,72 @@
+"""
+Benchmark for flow metrics: in-process vs. partitioned across worker processes.
+
+Builds synthetic columns (users sorted, timestamps ascending) and reports
+events/sec for each worker count, so the speedup over a single core and the
+FLOW_PARALLEL_MIN_EVENTS break-even point can be read off directly.
+
+    poetry run python -m benchmarks.bench_flow_metrics --events 5000000 --workers 1 2 4 8
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.services.analytics.flow_metrics import merge_flow_metrics, partial_flow_metrics, partition
+from app.services.analytics.paths import EventCodec
+from app.services.analytics.sessions import APP_LAUNCHED_EVENT, Sessionizer, SessionMode
+
+NAME_COUNT = 50
+
+
+def generate(events: int, events_per_user: int, seed: int):
+    rng = np.random.default_rng(seed)
+    users = np.repeat(np.arange(events // events_per_user + 1, dtype=np.int32), events_per_user)[:events]
+    names = rng.integers(0, NAME_COUNT, events, dtype=np.int32)
+    steps = rng.choice(np.array([0, 500, 2_000, 10_000, 60_000, 3_600_000]), events)
+    timestamps = 1_700_000_000_000 + np.cumsum(steps)
+    return users, names, timestamps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel flow metrics throughput.")
+    parser.add_argument("--events", type=int, default=5_000_000)
+    parser.add_argument("--events-per-user", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the best is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    users, names, timestamps = generate(args.events, args.events_per_user, args.seed)
+    codec = EventCodec()
+    codec.encode_all([APP_LAUNCHED_EVENT] + [f"Event {i}" for i in range(1, NAME_COUNT)])
+    sessionizer = Sessionizer(SessionMode.HYBRID, gap_ms=30 * 60 * 1000)
+    print(f"{args.events:,} events, {users[-1] + 1:,} users\n")
+
+    baseline = None
+    for workers in args.workers:
+        best = float("inf")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                if workers == 1:
+                    partials = [partial_flow_metrics(users, names, timestamps, sessionizer, 0, NAME_COUNT)]
+                else:
+                    futures = [
+                        pool.submit(
+                            partial_flow_metrics, users[s:e], names[s:e], timestamps[s:e],
+                            sessionizer, 0, NAME_COUNT
+                        )
+                        for s, e in partition(users, workers)
+                    ]
+                    partials = [future.result() for future in futures]
+                metrics = merge_flow_metrics(partials, codec)
+                best = min(best, time.perf_counter() - start)
+        baseline = baseline or best
+        print(f"{workers:>2} worker(s) {args.events / best:>14,.0f} events/s "
+              f"speedup {baseline / best:4.1f}x  flows {metrics['flows']:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Microbenchmark for flow sessionisation.
+
+Generates synthetic per-user event histories and reports events/sec for the
+previous string-key flow splitting, the Sessionizer on dict streams and the
+Sessionizer on columnar arrays, in each session mode.
+
+    poetry run python -m benchmarks.bench_sessions --users 2000 --events-per-user 200
+"""
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from app.services.analytics.sessions import APP_LAUNCHED_EVENT, Sessionizer, SessionMode
+
+EVENT_NAMES = [APP_LAUNCHED_EVENT] + [f"Event {i}" for i in range(30)]
+GAP_MS = 30 * 60 * 1000
+
+
+def generate(users: int, events_per_user: int, seed: int) -> List[List[Dict[str, Any]]]:
+    rng = random.Random(seed)
+    histories = []
+    for _ in range(users):
+        timestamp = 1_700_000_000_000
+        events = []
+        for _ in range(events_per_user):
+            # Mostly short steps, occasional long breaks, some exact duplicates
+            timestamp += rng.choice((0, 500, 2_000, 10_000, 60_000, 3_600_000))
+            name = APP_LAUNCHED_EVENT if rng.random() < 0.05 else rng.choice(EVENT_NAMES)
+            events.append({"name": name, "timestamp": timestamp})
+        histories.append(events)
+    return histories
+
+
+def legacy_split(events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """The previous App Launched split with f-string dedup keys, for comparison."""
+    flows, current_flow, seen_events = [], [], set()
+    for event in events:
+        event_key = f"{event['name']}_{event['timestamp']}"
+        if event["name"] == APP_LAUNCHED_EVENT and current_flow:
+            flows.append(current_flow)
+            current_flow = []
+            seen_events.clear()
+        if event_key not in seen_events:
+            seen_events.add(event_key)
+            current_flow.append(event)
+    if current_flow:
+        flows.append(current_flow)
+    return flows
+
+
+def to_columns(histories: List[List[Dict[str, Any]]]):
+    codes = {name: code for code, name in enumerate(EVENT_NAMES)}
+    users = np.concatenate([np.full(len(events), user) for user, events in enumerate(histories)])
+    names = np.array([codes[event["name"]] for events in histories for event in events])
+    timestamps = np.array([event["timestamp"] for events in histories for event in events], dtype=np.int64)
+    return users, names, timestamps, codes[APP_LAUNCHED_EVENT]
+
+
+def measure(label: str, total_events: int, repeat: int, run: Callable[[], int]):
+    best = float("inf")
+    sessions = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sessions = run()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28} {total_events / best:>14,.0f} events/s {sessions:>10} sessions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark flow sessionisation throughput.")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--events-per-user", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the best is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    histories = generate(args.users, args.events_per_user, args.seed)
+    total_events = sum(len(events) for events in histories)
+    columns = to_columns(histories)
+    print(f"{total_events:,} events across {args.users} users\n")
+
+    measure("legacy (f-string keys)", total_events, args.repeat,
+            lambda: sum(len(legacy_split(events)) for events in histories))
+    for mode in SessionMode:
+        sessionizer = Sessionizer(mode, gap_ms=GAP_MS)
+        measure(f"{mode.value} / dicts", total_events, args.repeat,
+                lambda: sum(sum(1 for _ in sessionizer.split(events)) for events in histories))
+        measure(f"{mode.value} / columns", total_events, args.repeat,
+                lambda: int(sessionizer.split_columns(*columns)[1][-1]) + 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Local OpenAI-compatible stub server for load testing.
+
+Implements just enough of ``POST /v1/chat/completions`` for ``OpenAIService``
+to talk to it. Point the backend at it with ``OPENAI_BASE_URL``:
+
+    poetry run python -m loadtest.fake_openai --port 8001 --latency-ms 1500
+    OPENAI_BASE_URL=http://localhost:8001/v1 poetry run uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 1000.0          # Mean time before the first token
+    jitter_ms: float = 250.0            # Uniform +/- jitter applied to latency
+    tokens_per_second: float = 50.0     # Generation speed (streaming and non-streaming)
+    completion_tokens: int = 200        # Tokens generated per completion (capped by max_tokens)
+    error_rate: float = 0.0             # Fraction of requests failing with a 500
+    rate_limit_rate: float = 0.0        # Fraction of requests failing with a 429
+
+
+config = StubConfig()
+app = FastAPI(title="Fake OpenAI")
+
+STUB_WORD = "insight"
+
+
+def _error(status_code: int, code: str, message: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": code, "param": None, "code": code}}
+    )
+
+
+def _completion_tokens(body: Dict[str, Any]) -> int:
+    max_tokens = body.get("max_tokens") or config.completion_tokens
+    return max(1, min(config.completion_tokens, max_tokens))
+
+
+def _prompt_tokens(body: Dict[str, Any]) -> int:
+    # Rough estimate of ~4 characters per token, good enough for usage accounting
+    chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+    return max(1, chars // 4)
+
+
+async def _first_token_delay() -> None:
+    delay_ms = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+    await asyncio.sleep(max(0.0, delay_ms) / 1000)
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """Return a canned completion after the configured latency."""
+    body = await request.json()
+    model = body.get("model", "fake-model")
+
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        return _error(429, "rate_limit_exceeded", "Rate limit reached for requests (fake)")
+    if roll < config.rate_limit_rate + config.error_rate:
+        return _error(500, "server_error", "The server had an error while processing your request (fake)")
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    n_tokens = _completion_tokens(body)
+    token_delay = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+
+    await _first_token_delay()
+
+    if body.get("stream"):
+        async def stream():
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for _ in range(n_tokens):
+                yield _chunk(completion_id, model, {"content": f"{STUB_WORD} "})
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+            yield _chunk(completion_id, model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    if token_delay:
+        await asyncio.sleep(n_tokens * token_delay)
+
+    prompt_tokens = _prompt_tokens(body)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": " ".join([STUB_WORD] * n_tokens)},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": n_tokens,
+            "total_tokens": prompt_tokens + n_tokens,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=config.jitter_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=config.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=config.completion_tokens)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=config.rate_limit_rate)
+    args = parser.parse_args()
+
+    config.latency_ms = args.latency_ms
+    config.jitter_ms = args.jitter_ms
+    config.tokens_per_second = args.tokens_per_second
+    config.completion_tokens = args.completion_tokens
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Load generator for the Layers API.
+
+Runs two independent worker groups against a running backend for a fixed
+duration: "read" workers hammering the cheap catalogue/event endpoints, and
+"analysis" workers keeping LLM-backed analyses in flight. At the end it prints
+throughput and p50/p95/p99 latency per route, so you can compare `/events`
+latency with and without analyses running (``--analysis-workers 0``).
+
+    poetry run python -m loadtest.run --duration 60 --read-workers 20 --analysis-workers 5
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+API_PREFIX = "/api/v1"
+
+
+@dataclass
+class RouteStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: Dict[int, int] = field(default_factory=lambda: defaultdict(int))
+
+
+@dataclass
+class Scenario:
+    route: str                                   # Label used in the report
+    method: str
+    path: Callable[[], str]
+    body: Optional[Callable[[], Dict[str, Any]]] = None
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def build_scenarios(versions: List[str], user_queries: List[str], flow_sample: List[Dict[str, Any]]):
+    """Build the read and analysis scenario mixes from discovered data."""
+    version = lambda: random.choice(versions)
+
+    read = [
+        Scenario("GET /events/", "GET", lambda: f"{API_PREFIX}/events/?limit=100"),
+        Scenario("GET /events/names", "GET", lambda: f"{API_PREFIX}/events/names"),
+        Scenario("GET /events/versions", "GET", lambda: f"{API_PREFIX}/events/versions"),
+    ]
+    if user_queries:
+        read.append(Scenario(
+            "GET /users/search", "GET",
+            lambda: f"{API_PREFIX}/users/search?query={random.choice(user_queries)}"
+        ))
+    if versions:
+        read.append(Scenario("GET /events/flows/{version}", "GET", lambda: f"{API_PREFIX}/events/flows/{version()}"))
+
+    analysis = [
+        Scenario(
+            "POST /openai/analyze", "POST", lambda: f"{API_PREFIX}/openai/analyze",
+            lambda: {"text": "Users drop off after the KYC step.", "analysis_type": "product analytics"}
+        ),
+    ]
+    if flow_sample:
+        analysis.append(Scenario(
+            "POST /analytics/flows/analyze", "POST", lambda: f"{API_PREFIX}/analytics/flows/analyze",
+            lambda: {"flow_data": {"flows": flow_sample, "prompt": "Where do users drop off?"}}
+        ))
+    return read, analysis
+
+
+async def discover(client: httpx.AsyncClient, user_queries: List[str]):
+    """Fetch app versions and a small flow sample to parameterise the scenarios."""
+    response = await client.get(f"{API_PREFIX}/events/versions")
+    response.raise_for_status()
+    versions = response.json()
+
+    flow_sample = []
+    if versions:
+        response = await client.get(f"{API_PREFIX}/events/flows/{versions[0]}", timeout=300)
+        if response.status_code == 200:
+            flow_sample = response.json()[:50]
+    return versions, user_queries, flow_sample
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    scenarios: List[Scenario],
+    stats: Dict[str, RouteStats],
+    deadline: float
+):
+    while time.monotonic() < deadline:
+        scenario = random.choice(scenarios)
+        route_stats = stats[scenario.route]
+        body = scenario.body() if scenario.body else None
+        started = time.perf_counter()
+        try:
+            response = await client.request(scenario.method, scenario.path(), json=body)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            route_stats.status_codes[response.status_code] += 1
+            if response.status_code >= 400:
+                route_stats.errors += 1
+            else:
+                route_stats.latencies_ms.append(elapsed_ms)
+        except httpx.HTTPError:
+            route_stats.errors += 1
+            route_stats.status_codes[0] += 1
+
+
+def report(stats: Dict[str, RouteStats], elapsed_s: float):
+    header = f"{'route':<36}{'ok':>8}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for route in sorted(stats):
+        route_stats = stats[route]
+        latencies = sorted(route_stats.latencies_ms)
+        print(
+            f"{route:<36}{len(latencies):>8}{route_stats.errors:>6}"
+            f"{len(latencies) / elapsed_s:>9.1f}"
+            f"{percentile(latencies, 50):>10.1f}{percentile(latencies, 95):>10.1f}"
+            f"{percentile(latencies, 99):>10.1f}{(latencies[-1] if latencies else 0):>10.1f}"
+        )
+        codes = ", ".join(f"{code}: {count}" for code, count in sorted(route_stats.status_codes.items()))
+        print(f"{'':<4}status codes -> {codes}")
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.read_workers + args.analysis_workers + 1)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        versions, user_queries, flow_sample = await discover(client, args.user_query)
+        read, analysis = build_scenarios(versions, user_queries, flow_sample)
+
+        stats: Dict[str, RouteStats] = defaultdict(RouteStats)
+        started = time.monotonic()
+        deadline = started + args.duration
+        tasks = [worker(client, read, stats, deadline) for _ in range(args.read_workers)]
+        tasks += [worker(client, analysis, stats, deadline) for _ in range(args.analysis_workers)]
+        print(f"Running {args.read_workers} read and {args.analysis_workers} analysis workers for {args.duration}s...")
+        await asyncio.gather(*tasks)
+        report(stats, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the Layers API under concurrent load.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=30, help="Test duration in seconds")
+    parser.add_argument("--read-workers", type=int, default=10)
+    parser.add_argument("--analysis-workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--user-query", action="append", default=[],
+                        help="User id or phone number for /users/search (repeatable)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+
+# Settings are read at import time; the tests never connect to these services
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DATABASE", "layers_test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
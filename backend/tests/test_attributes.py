@@ -0,0 +1,45 @@
+from app.services.analytics.attributes import AttributeProfile, value_label
+
+def test_value_labels():
+    assert value_label("plain") == "plain"
+    assert value_label(3) == "3"
+    assert value_label({"b": 1, "a": [True]}) == '{"a":[true],"b":1}'
+    assert len(value_label("x" * 500)) == 200
+
+def test_profile_counts_presence_and_top_values():
+    profile = AttributeProfile(top_k=2)
+    for plan in ["free", "free", "pro", None, ""]:
+        profile.add({"plan": plan, "beta": plan == "pro"})
+    profile.add(None)
+
+    attributes = profile.to_dict()["attributes"]
+    plan = attributes["plan"]
+    assert plan["count"] == 3
+    assert plan["null_rate"] == 0.5
+    assert plan["exact"]
+    assert plan["top_values"][0] == {"value": "free", "count": 2, "share": 0.6667}
+    # Booleans are values, not measurements
+    assert "numeric" not in attributes["beta"]
+    assert list(attributes) == ["beta", "plan"]
+
+def test_numeric_histogram_covers_every_value():
+    profile = AttributeProfile(bins=4)
+    for price in range(1, 101):
+        profile.add({"price": price})
+    numeric = profile.to_dict()["attributes"]["price"]["numeric"]
+    histogram = numeric["histogram"]
+
+    assert numeric["min"] == 1
+    assert [bin["start"] for bin in histogram] == [1, 25.75, 50.5, 75.25]
+    assert histogram[-1]["end"] == 100
+    assert sum(bin["count"] for bin in histogram) == 100
+    assert all(20 <= bin["count"] <= 30 for bin in histogram)
+
+def test_single_value_histogram_and_key_limit():
+    profile = AttributeProfile(max_keys=1)
+    for _ in range(3):
+        profile.add({"level": 5, "extra": 1})
+    result = profile.to_dict()
+    assert result["keys_truncated"]
+    assert list(result["attributes"]) == ["level"]
+    assert result["attributes"]["level"]["numeric"]["histogram"] == [{"start": 5, "end": 5, "count": 3}]
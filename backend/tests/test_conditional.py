@@ -0,0 +1,84 @@
+from typing import List, Optional
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.v1.endpoints import events
+from app.dependencies import get_event_dao
+
+class FakeEventDao:
+    """Just enough of EventDataAccess for the catalogue endpoints."""
+
+    def __init__(self):
+        self.watermark: Optional[str] = "000000000000000000000001"
+        self.names: List[str] = ["App Launched", "Home"]
+        self.scans = 0
+
+    def primary_reads(self) -> "FakeEventDao":
+        return self
+
+    async def get_insert_watermark(self) -> Optional[str]:
+        return self.watermark
+
+    async def get_event_names(self) -> List[str]:
+        self.scans += 1
+        return list(self.names)
+
+    async def close(self):
+        pass
+
+@pytest.fixture
+def dao():
+    return FakeEventDao()
+
+@pytest.fixture
+def client(dao):
+    app = FastAPI()
+    app.include_router(events.router, prefix="/events")
+    app.dependency_overrides[get_event_dao] = lambda: dao
+    with TestClient(app) as client:
+        yield client
+
+def test_not_modified_without_scanning(client, dao):
+    first = client.get("/events/names")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert "no-cache" in first.headers["cache-control"]
+    scans = dao.scans
+
+    for header in (etag, etag.removeprefix("W/"), f'"other", {etag}', "*"):
+        revalidated = client.get("/events/names", headers={"If-None-Match": header})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == etag
+        assert revalidated.content == b""
+    assert dao.scans == scans
+
+def test_new_insert_changes_etag(client, dao):
+    etag = client.get("/events/names").headers["etag"]
+    dao.watermark = "000000000000000000000002"
+    response = client.get("/events/names", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+def test_new_etag_never_serves_an_older_body(client, dao):
+    # The first body is kept by the request coalescer; it must not be reused
+    # under the ETag of a later watermark
+    assert client.get("/events/names").json() == dao.names
+    dao.names = dao.names + ["Checkout"]
+    dao.watermark = "000000000000000000000003"
+    response = client.get("/events/names")
+    assert response.json() == dao.names
+    etag = response.headers["etag"]
+    assert client.get("/events/names", headers={"If-None-Match": etag}).status_code == 304
+
+def test_query_parameters_are_part_of_the_etag(client):
+    plain = client.get("/events/names").headers["etag"]
+    other = client.get("/events/names", params={"backend": "mongodb"}).headers["etag"]
+    assert plain != other
+
+def test_empty_store_is_not_cached(client, dao):
+    dao.watermark = None
+    response = client.get("/events/names", headers={"If-None-Match": "*"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
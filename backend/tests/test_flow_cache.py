@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app.core.config import settings
+from app.data_access.common import APP_LAUNCHED_EVENT, APP_VERSION_ATTRIBUTE
+from app.data_access.sqlite import SQLiteEventDataAccess
+from app.services import flow_cache
+from app.services.flow_cache import CachedFlowSet, FlowCacheService
+
+class CountingEventDao(SQLiteEventDataAccess):
+    """SQLite event store recording which users' events were read."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.loaded = []
+
+    async def iter_user_event_groups(self, *args, **kwargs):
+        async for user_id, events in super().iter_user_event_groups(*args, **kwargs):
+            self.loaded.append(user_id)
+            yield user_id, events
+
+def launch(user_id: str, timestamp: int, version: str = "1.0") -> dict:
+    return {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "timestamp": timestamp,
+        "name": APP_LAUNCHED_EVENT,
+        "attributes": {APP_VERSION_ATTRIBUTE: version}
+    }
+
+def screen(user_id: str, timestamp: int, name: str = "Home") -> dict:
+    return {"_id": ObjectId(), "user_id": user_id, "timestamp": timestamp, "name": name, "attributes": {"tab": 1}}
+
+def inserted_earlier(events: list) -> list:
+    """Give events ids 10s apart from a few minutes ago, so each is beyond the slack of the next."""
+    start = datetime.utcnow() - timedelta(minutes=5)
+    return [{**event, "_id": ObjectId.from_datetime(start + timedelta(seconds=10 * i))} for i, event in enumerate(events)]
+
+@pytest.fixture(params=[False, True], ids=["plain", "compressed"])
+def compress(request, monkeypatch):
+    monkeypatch.setattr(settings, "FLOW_CACHE_COMPRESS", request.param)
+    flow_cache._flow_cache.clear()
+    yield request.param
+    flow_cache._flow_cache.clear()
+
+def test_cached_flow_set_updates_size_by_delta(compress):
+    first = {"a": [{"flow": ["x"] * 10}], "b": [{"flow": ["y"]}]}
+    flow_set = CachedFlowSet.build("w1", first, compress)
+    updated = flow_set.updated("w2", {"b": [{"flow": ["y"] * 20}], "0": []})
+    rebuilt = CachedFlowSet.build("w2", {**first, "b": [{"flow": ["y"] * 20}], "0": []}, compress)
+
+    assert updated.size == rebuilt.size
+    assert list(updated.user_flows()) == ["0", "a", "b"]
+    assert updated.user_flows() == rebuilt.user_flows()
+    # The original set is unchanged
+    assert flow_set.user_flows()["b"] == [{"flow": ["y"]}]
+
+def test_new_events_only_reload_affected_users(tmp_path, compress):
+    async def main():
+        dao = CountingEventDao(str(tmp_path / "events.db"))
+        await dao.ensure_indexes()
+        service = FlowCacheService(dao)
+        await dao.insert_events(inserted_earlier([
+            launch("a", 1_000), screen("a", 2_000),
+            launch("b", 1_000), screen("b", 3_000),
+            launch("other", 1_000, "2.0")
+        ]))
+        first = await service.get_user_flows_by_version("1.0")
+        dao.loaded.clear()
+        hit = await service.get_user_flows_by_version("1.0")
+        reads_on_hit = list(dao.loaded)
+
+        await dao.insert_events([
+            screen("b", 4_000, "Cart"),
+            launch("c", 5_000),
+            screen("other", 6_000)
+        ])
+        updated = await service.get_user_flows_by_version("1.0")
+        reloaded = sorted(dao.loaded)
+
+        flow_cache._flow_cache.clear()
+        rebuilt = await service.get_user_flows_by_version("1.0")
+        return first, hit, reads_on_hit, updated, reloaded, rebuilt
+    first, hit, reads_on_hit, updated, reloaded, rebuilt = asyncio.run(main())
+    assert hit == first
+    assert reads_on_hit == []
+    assert reloaded == ["b", "c"]
+    assert updated == rebuilt
+    assert [flow["user_id"] for flow in updated] == ["a", "b", "c"]
+    assert [event["event_name"] for event in updated[1]["flow"]] == [APP_LAUNCHED_EVENT, "Home", "Cart"]
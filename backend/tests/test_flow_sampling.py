@@ -0,0 +1,39 @@
+import asyncio
+from bson import ObjectId
+from app.data_access.common import APP_LAUNCHED_EVENT, APP_VERSION_ATTRIBUTE, draw_launches
+from app.data_access.sqlite import SQLiteEventDataAccess
+
+def launch(user_id: str, timestamp: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "timestamp": timestamp,
+        "name": APP_LAUNCHED_EVENT,
+        "attributes": {APP_VERSION_ATTRIBUTE: "1.0"}
+    }
+
+def test_draw_launches_never_exceeds_a_users_launches():
+    draws = draw_launches({"a": 3, "b": 1}, 10)
+    assert draws == {"a": 3, "b": 1}
+    draws = draw_launches({"a": 3, "b": 1, "c": 2}, 4)
+    assert sum(draws.values()) == 4
+    assert all(draws[user_id] <= limit for user_id, limit in [("a", 3), ("b", 1), ("c", 2)] if user_id in draws)
+    assert draw_launches({}, 5) == {}
+
+def test_flows_are_sampled_in_proportion_to_each_users_flows(tmp_path):
+    async def main():
+        dao = SQLiteEventDataAccess(str(tmp_path / "events.db"))
+        await dao.ensure_indexes()
+        # One user with 10 flows and 10 users with one each: half of all flows are the heavy user's
+        await dao.insert_events([launch("heavy", i * 1000) for i in range(10)])
+        await dao.insert_events([launch(f"light{i}", 0) for i in range(10)])
+        picks = {"sampled": [], "restricted": []}
+        for _ in range(300):
+            flows = await dao.sample_user_flows_by_version("1.0", 1)
+            picks["sampled"].append(flows[0]["user_id"] == "heavy")
+            flows = await dao.sample_user_flows_by_version("1.0", 1, user_ids=["heavy", "light0"])
+            picks["restricted"].append(flows[0]["user_id"] == "heavy")
+        return {key: sum(heavy) / len(heavy) for key, heavy in picks.items()}
+    shares = asyncio.run(main())
+    assert 0.35 < shares["sampled"] < 0.65
+    assert shares["restricted"] > 0.8
@@ -0,0 +1,139 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+import pytest
+from bson import ObjectId
+from app.data_access.interfaces import FunnelDataAccess
+from app.data_access.sqlite import SQLiteEventDataAccess
+from app.models.funnel import Funnel, FunnelStep
+from app.services.funnels import FunnelService, advance_user_state, new_user_state, pack_event_ids, unpack_event_ids
+
+HOUR_MS = 3600 * 1000
+
+class MemoryFunnelDao(FunnelDataAccess):
+    """In-memory funnel storage; ``fail_saves`` makes the next user state saves raise."""
+
+    def __init__(self):
+        self.funnels: Dict[str, Funnel] = {}
+        self.states: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.sketches: Dict[str, Dict[str, bytes]] = {}
+        self.fail_saves = 0
+
+    async def create_funnel(self, funnel: Funnel) -> Funnel:
+        funnel.id = str(len(self.funnels) + 1)
+        self.funnels[funnel.id] = funnel.model_copy(deep=True)
+        return funnel
+
+    async def get_funnel(self, funnel_id: str) -> Optional[Funnel]:
+        funnel = self.funnels.get(funnel_id)
+        return funnel.model_copy(deep=True) if funnel else None
+
+    async def list_funnels(self) -> List[Funnel]:
+        return [funnel.model_copy(deep=True) for funnel in self.funnels.values()]
+
+    async def update_funnel(self, funnel: Funnel) -> Optional[Funnel]:
+        if funnel.id not in self.funnels:
+            return None
+        self.funnels[funnel.id] = funnel.model_copy(deep=True)
+        return funnel
+
+    async def delete_funnel(self, funnel_id: str) -> bool:
+        self.states.pop(funnel_id, None)
+        return self.funnels.pop(funnel_id, None) is not None
+
+    async def get_user_states(self, funnel_id: str, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        stored = self.states.get(funnel_id, {})
+        return {user_id: dict(stored[user_id]) for user_id in user_ids if user_id in stored}
+
+    async def save_user_states(self, funnel_id: str, states: Dict[str, Dict[str, Any]]) -> None:
+        if self.fail_saves:
+            self.fail_saves -= 1
+            raise RuntimeError("connection reset")
+        self.states.setdefault(funnel_id, {}).update({user_id: dict(state) for user_id, state in states.items()})
+
+    async def clear_user_states(self, funnel_id: str) -> None:
+        self.states.pop(funnel_id, None)
+        self.sketches.pop(funnel_id, None)
+
+    async def get_duration_sketches(self, funnel_id: str) -> Dict[str, bytes]:
+        return dict(self.sketches.get(funnel_id, {}))
+
+    async def save_duration_sketches(self, funnel_id: str, sketches: Dict[str, bytes]) -> None:
+        self.sketches[funnel_id] = dict(sketches)
+
+def event(user_id: str, name: str, timestamp: int) -> dict:
+    return {"_id": ObjectId(), "user_id": user_id, "timestamp": timestamp, "name": name, "attributes": {}}
+
+def signup_funnel() -> Funnel:
+    return Funnel(name="signup", steps=[FunnelStep(name="Open"), FunnelStep(name="Signup"), FunnelStep(name="Pay")])
+
+def counts(funnel: Funnel) -> List[int]:
+    return [step.count for step in funnel.steps]
+
+@pytest.fixture
+def event_dao(tmp_path):
+    dao = SQLiteEventDataAccess(str(tmp_path / "events.db"))
+    asyncio.run(dao.ensure_indexes())
+    return dao
+
+def test_user_state_follows_the_conversion_window():
+    steps = ["Open", "Signup", "Pay"]
+    state = new_user_state()
+    assert advance_user_state(state, "Signup", 0, steps, HOUR_MS) is None  # no attempt open
+    advance_user_state(state, "Open", 1_000, steps, HOUR_MS)
+    assert advance_user_state(state, "Signup", 4_000, steps, HOUR_MS) == 3_000
+    # Too late for this attempt, and not a first step
+    assert advance_user_state(state, "Pay", 1_000 + 2 * HOUR_MS, steps, HOUR_MS) is None
+    assert state["best"] == 2 and state["step"] is None
+
+def test_event_ids_pack_round_trip():
+    event_ids = {str(ObjectId()) for _ in range(3)}
+    packed = pack_event_ids(event_ids)
+    assert len(packed) == 36
+    assert unpack_event_ids(packed) == event_ids
+
+def test_incremental_refreshes_match_a_full_rebuild(event_dao):
+    async def main():
+        dao = MemoryFunnelDao()
+        service = FunnelService(dao, event_dao)
+        funnel = await service.create(signup_funnel())
+
+        await event_dao.insert_events([event("a", "Open", 1_000), event("b", "Open", 2_000)])
+        await service.refresh(funnel.id)
+        await event_dao.insert_events([event("a", "Signup", 3_000), event("b", "Signup", 4_000)])
+        await service.refresh(funnel.id)
+        # Late: c opens before any event already counted
+        await event_dao.insert_events([event("a", "Pay", 5_000), event("c", "Open", 500)])
+        incremental = await service.refresh(funnel.id)
+        # No new events: everything within the watermark slack is skipped by id
+        repeated = await service.refresh(funnel.id)
+
+        rebuilt = await service.create(signup_funnel())
+        rebuilt = await service.refresh(rebuilt.id)
+        return incremental, repeated, rebuilt
+    incremental, repeated, rebuilt = asyncio.run(main())
+    assert counts(incremental) == [3, 2, 1]
+    assert counts(repeated) == counts(incremental)
+    assert counts(rebuilt) == counts(incremental)
+    assert incremental.steps[1].time_from_previous_seconds["count"] == 2
+    assert incremental.conversion_time_seconds["max"] == 4.0
+
+def test_interrupted_refresh_is_rebuilt(event_dao):
+    async def main():
+        dao = MemoryFunnelDao()
+        service = FunnelService(dao, event_dao)
+        funnel = await service.create(signup_funnel())
+        await event_dao.insert_events([event("a", "Open", 1_000), event("a", "Signup", 2_000)])
+        await service.refresh(funnel.id)
+
+        await event_dao.insert_events([event("a", "Pay", 3_000), event("b", "Open", 4_000)])
+        dao.fail_saves = 1
+        with pytest.raises(RuntimeError):
+            await service.refresh(funnel.id)
+        interrupted = await dao.get_funnel(funnel.id)
+        recovered = await service.refresh(funnel.id)
+        return interrupted, recovered
+    interrupted, recovered = asyncio.run(main())
+    assert interrupted.refresh_started_at is not None
+    assert counts(interrupted) == [1, 1, 0]
+    assert recovered.refresh_started_at is None
+    assert counts(recovered) == [2, 1, 1]
@@ -0,0 +1,172 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.data_access.interfaces import JobDataAccess
+from app.models.job import Job, JobStatus
+from app.services.jobs import JobManager
+
+class MemoryJobDao(JobDataAccess):
+    """In-memory job storage; one instance stands for the database shared by all processes."""
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self.results: Dict[str, Any] = {}
+        self.leases: Dict[str, datetime] = {}
+        self.fail_updates = 0
+
+    async def create_job(self, job: Job) -> Job:
+        await asyncio.sleep(0)
+        self.jobs[job.id] = job.model_copy()
+        return job
+
+    async def update_job(self, job: Job, result: Any = None) -> None:
+        if self.fail_updates:
+            self.fail_updates -= 1
+            raise RuntimeError("timeout")
+        self.jobs[job.id] = job.model_copy()
+        if result is not None:
+            self.results[job.id] = result
+
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        return job.model_copy() if job else None
+
+    async def get_job_result(self, job_id: str) -> Any:
+        return self.results.get(job_id)
+
+    async def get_unfinished_jobs(self) -> List[Job]:
+        unfinished = [job for job in self.jobs.values() if not job.status.finished]
+        return [job.model_copy() for job in sorted(unfinished, key=lambda job: job.created_at)]
+
+    async def claim_job(self, job_id: str, previous_owner: Optional[str], owner: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None or job.status.finished or job.owner != previous_owner:
+            return None
+        job = self.jobs[job_id] = job.model_copy(update={
+            "owner": owner, "status": JobStatus.QUEUED, "progress": 0.0, "message": None, "started_at": None
+        })
+        return job.model_copy()
+
+    async def renew_owner_lease(self, owner: str, expires_at: datetime) -> None:
+        self.leases[owner] = expires_at
+
+    async def release_owner_lease(self, owner: str) -> None:
+        self.leases.pop(owner, None)
+
+    async def get_live_owners(self) -> List[str]:
+        return [owner for owner, expires_at in self.leases.items() if expires_at > datetime.utcnow()]
+
+def manager(dao: MemoryJobDao) -> JobManager:
+    jobs = JobManager(lambda: dao)
+    order = []
+
+    async def record(params, report_progress):
+        order.append(params["n"])
+        if params.get("fail"):
+            raise ValueError("bad input")
+        return {"n": params["n"]}
+
+    jobs.register("record", record)
+    jobs.order = order
+    return jobs
+
+async def drain(jobs: JobManager):
+    await jobs.queue.join()
+    await jobs.stop()
+
+def test_higher_priority_runs_first_then_fifo():
+    async def main():
+        jobs = manager(MemoryJobDao())
+        jobs.start(0)
+        for n, priority in [(1, 0), (2, 5), (3, 0), (4, 5)]:
+            await jobs.submit("record", {"n": n}, priority=priority)
+        jobs.workers = [asyncio.create_task(jobs._worker())]
+        await drain(jobs)
+        return jobs.order
+    assert asyncio.run(main()) == [2, 4, 1, 3]
+
+def test_concurrent_identical_submits_share_one_job():
+    async def main():
+        dao = MemoryJobDao()
+        jobs = manager(dao)
+        jobs.start(1)
+        first, second = await asyncio.gather(
+            jobs.submit("record", {"n": 1}), jobs.submit("record", {"n": 1})
+        )
+        await drain(jobs)
+        return first.id, second.id, jobs.order, len(dao.jobs)
+    first, second, order, stored = asyncio.run(main())
+    assert first == second
+    assert order == [1]
+    assert stored == 1
+
+def test_failed_job_is_recorded_and_frees_its_key():
+    async def main():
+        dao = MemoryJobDao()
+        jobs = manager(dao)
+        jobs.start(1)
+        job = await jobs.submit("record", {"n": 1, "fail": True})
+        await jobs.queue.join()
+        stored = await jobs.get(job.id)
+        again = await jobs.submit("record", {"n": 1, "fail": True})
+        await drain(jobs)
+        return stored, job.id != again.id
+    stored, resubmitted = asyncio.run(main())
+    assert stored.status == JobStatus.FAILED
+    assert stored.error == "bad input"
+    assert resubmitted
+
+def test_storage_errors_do_not_kill_the_worker():
+    async def main():
+        dao = MemoryJobDao()
+        jobs = manager(dao)
+        jobs.start(1)
+        dao.fail_updates = 1  # marking the first job running fails
+        first = await jobs.submit("record", {"n": 1})
+        await jobs.queue.join()
+        second = await jobs.submit("record", {"n": 2})
+        await drain(jobs)
+        return dao.jobs[first.id], dao.jobs[second.id], first.id in jobs.active
+    first, second, still_active = asyncio.run(main())
+    assert first.status == JobStatus.FAILED
+    assert second.status == JobStatus.SUCCEEDED
+    assert not still_active
+
+def test_unfinished_jobs_are_resumed_by_one_manager():
+    async def main():
+        dao = MemoryJobDao()
+        previous = manager(dao)
+        previous.start(0)
+        job = await previous.submit("record", {"n": 7})
+        await previous.stop()
+
+        managers = [manager(dao) for _ in range(2)]
+        for jobs in managers:
+            jobs.start(1)
+        resumed = await asyncio.gather(*(jobs.resume_unfinished() for jobs in managers))
+        for jobs in managers:
+            await drain(jobs)
+        return job.id, resumed, [jobs.order for jobs in managers], dao
+    job_id, resumed, orders, dao = asyncio.run(main())
+    assert sorted(resumed) == [0, 1]
+    assert sorted(orders) == [[], [7]]
+    assert dao.jobs[job_id].status == JobStatus.SUCCEEDED
+
+def test_jobs_of_a_live_manager_are_not_taken_over():
+    async def main():
+        dao = MemoryJobDao()
+        running = manager(dao)
+        running.start(0)
+        await running.resume_unfinished()
+        job = await running.submit("record", {"n": 1})
+
+        joining = manager(dao)
+        joining.start(1)
+        resumed = await joining.resume_unfinished()
+        # Once the first manager's lease has lapsed, its jobs are taken over
+        dao.leases[running.owner] = datetime.utcnow()
+        taken_over = await joining.resume_unfinished()
+        await drain(joining)
+        await running.stop()
+        return resumed, taken_over, dao.jobs[job.id].owner == joining.owner
+    assert asyncio.run(main()) == (0, 1, True)
@@ -0,0 +1,64 @@
+import random
+from collections import Counter
+from app.services.analytics.paths import EventCodec, NgramCounter, PathAnalyzer, SpaceSaving, pack, unpack
+
+def test_pack_round_trip():
+    codes = [0, 5, 2 ** 21 - 1]
+    assert unpack(pack(codes), 3) == codes
+
+def test_space_saving_is_exact_below_capacity():
+    sketch = SpaceSaving(10)
+    for key in "abacabad":
+        sketch.add(key)
+    assert sketch.top(2) == [("a", 4, 0), ("b", 2, 0)]
+    assert sketch.total == 8
+
+def test_space_saving_keeps_heavy_hitters_within_bounds():
+    rng = random.Random(7)
+    stream = ["hot"] * 300 + ["warm"] * 150 + [f"cold{i}" for i in range(550)]
+    rng.shuffle(stream)
+    sketch = SpaceSaving(20)
+    for key in stream:
+        sketch.add(key)
+    true_counts = Counter(stream)
+
+    assert [key for key, _, _ in sketch.top(2)] == ["hot", "warm"]
+    assert len(sketch.counts) == 20
+    for key, count, error in sketch.top(20):
+        # Counts are upper bounds, overestimating by at most the recorded error
+        assert count - error <= true_counts[key] <= count
+
+def test_space_saving_merge_adds_counts():
+    first, second = SpaceSaving(5), SpaceSaving(5)
+    first.add("a", 3)
+    second.add("a", 2)
+    second.add("b")
+    first.merge(second)
+    assert first.top(2) == [("a", 5, 0), ("b", 1, 0)]
+
+def test_ngram_counts():
+    codec = EventCodec()
+    counter = NgramCounter(n=3)
+    counter.add_sequence(codec.encode_all(["a", "b", "c", "a", "b"]))
+    counter.add_sequence(codec.encode_all(["a", "b"]))
+    top = counter.top(10, codec, separator=">")
+    assert top["a>b"] == 3
+    assert top["a>b>c"] == 1
+    assert top["c>a>b"] == 1
+    assert "b>a" not in top
+
+def test_path_analyzer_transitions_and_sankey():
+    analyzer = PathAnalyzer(top_k=5, depth=2)
+    analyzer.add_names(["Home", "Search", "Buy"])
+    analyzer.add_names(["Home", "Buy"])
+    analyzer.add_names([])
+
+    result = analyzer.to_dict()
+    assert result["sequences"] == 2
+    assert result["transitions"]["Home"]["next"] == [
+        {"event": "Search", "count": 1}, {"event": "Buy", "count": 1}
+    ]
+    assert result["transitions"]["Buy"]["count"] == 2
+    edges = {(edge["source"], edge["target"]): edge["count"] for edge in result["sankey"]["edges"]}
+    # Only the first ``depth`` steps are linked
+    assert edges == {("0:Home", "1:Search"): 1, ("0:Home", "1:Buy"): 1}
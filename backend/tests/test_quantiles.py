@@ -0,0 +1,55 @@
+import numpy as np
+from app.services.analytics.quantiles import TDigest
+
+def rank_error(digest: TDigest, values: np.ndarray, q: float) -> float:
+    """Distance in rank (0..1) between the digest's q-quantile and q."""
+    estimate = digest.quantile(q)
+    return abs(np.searchsorted(np.sort(values), estimate) / len(values) - q)
+
+def test_merged_digest_matches_digest_of_all_values():
+    rng = np.random.default_rng(7)
+    parts = [rng.lognormal(8, 1.5, size=20_000) for _ in range(8)]
+    values = np.concatenate(parts)
+
+    merged = TDigest()
+    for part in parts:
+        merged.merge(TDigest.from_values(part))
+
+    assert merged.count == len(values)
+    assert merged.min == values.min()
+    assert merged.max == values.max()
+    assert abs(merged.mean() - values.mean()) / values.mean() < 1e-9
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        assert rank_error(merged, values, q) < 0.005
+
+def test_merge_survives_serialisation():
+    rng = np.random.default_rng(3)
+    left, right = rng.exponential(1000, size=5000), rng.exponential(5000, size=5000)
+    merged = TDigest.from_bytes(TDigest.from_values(left).to_bytes())
+    merged.merge(TDigest.from_bytes(TDigest.from_values(right).to_bytes()))
+    values = np.concatenate([left, right])
+    assert merged.count == len(values)
+    assert rank_error(merged, values, 0.5) < 0.005
+
+def test_from_groups_matches_one_digest_per_group():
+    rng = np.random.default_rng(11)
+    keys = rng.integers(0, 5, size=10_000)
+    values = rng.integers(0, 100_000, size=10_000)
+    digests = TDigest.from_groups(keys, values)
+    assert sorted(digests) == sorted(set(keys.tolist()))
+    for key, digest in digests.items():
+        group = values[keys == key]
+        assert digest.count == len(group)
+        assert rank_error(digest, group, 0.5) < 0.01
+
+def test_cdf_inverts_quantiles():
+    digest = TDigest.from_values(np.arange(10_000, dtype=np.float64))
+    assert digest.cdf([digest.min])[0] == 0.0
+    assert digest.cdf([digest.max])[0] == 1.0
+    assert abs(digest.cdf([digest.quantile(0.3)])[0] - 0.3) < 0.01
+
+def test_empty_digest():
+    digest = TDigest()
+    assert digest.count == 0
+    assert digest.quantile(0.5) is None
+    assert digest.summary()["count"] == 0
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from app.core.rate_limit import Priority, RateLimitScheduler
+
+def scheduler(**budgets) -> RateLimitScheduler:
+    # 100 requests per second, and a burst of a single request
+    budgets.setdefault("requests_per_minute", 6000)
+    budgets.setdefault("tokens_per_minute", 0)
+    return RateLimitScheduler("test", burst_seconds=0.01, **budgets)
+
+def test_waiting_calls_are_served_by_priority_then_arrival():
+    async def main():
+        limiter = scheduler()
+        await limiter.acquire(0)  # empties the bucket
+        order = []
+
+        async def call(label, priority):
+            await limiter.acquire(0, priority)
+            order.append(label)
+
+        await asyncio.gather(
+            call("background", Priority.BACKGROUND),
+            call("batch 1", Priority.BATCH),
+            call("interactive", Priority.INTERACTIVE),
+            call("batch 2", Priority.BATCH)
+        )
+        return order
+    assert asyncio.run(main()) == ["interactive", "batch 1", "batch 2", "background"]
+
+def test_requests_are_released_at_the_sustained_rate():
+    async def main():
+        limiter = scheduler(requests_per_minute=1200)  # one request every 50ms
+        waits = [await limiter.acquire(0) for _ in range(3)]
+        return waits
+    waits = asyncio.run(main())
+    assert waits[0] < 0.01
+    assert 0.03 < waits[1] < 0.2 and 0.03 < waits[2] < 0.2
+
+def test_oversized_calls_wait_for_a_full_bucket_and_settle_corrects_usage():
+    async def main():
+        limiter = scheduler(requests_per_minute=0, tokens_per_minute=60_000)  # 10 tokens of burst
+        oversized = await limiter.acquire(1_000)
+        limiter.settle(1_000, 2)  # only 2 tokens were used
+        refunded = await limiter.acquire(5)
+        return oversized, refunded, limiter.tokens.level
+    oversized, refunded, level = asyncio.run(main())
+    assert oversized < 0.01
+    assert refunded < 0.01
+    assert 2 <= level <= 10
+
+def test_cancelled_waiters_do_not_block_the_queue():
+    async def main():
+        limiter = scheduler(requests_per_minute=1200)
+        await limiter.acquire(0)
+        cancelled = asyncio.create_task(limiter.acquire(0))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        waited = await limiter.acquire(0, Priority.BACKGROUND)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return waited
+    assert asyncio.run(main()) < 0.2
+
+def test_pause_holds_every_call():
+    async def main():
+        limiter = scheduler()
+        limiter.pause(0.1)
+        return await limiter.acquire(0)
+    assert asyncio.run(main()) >= 0.09
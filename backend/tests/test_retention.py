@@ -0,0 +1,36 @@
+from datetime import date
+from app.services.analytics.retention import ActivityColumns, cohort_matrix, day_to_date, week_of, week_start_day
+
+def test_weeks_start_on_monday():
+    # Day 4 is Monday 1970-01-05
+    assert day_to_date(4) == date(1970, 1, 5)
+    assert week_of(3) == 0
+    assert week_of(4) == week_of(10) == 1
+    assert week_start_day(1) == 4
+
+def activity() -> ActivityColumns:
+    columns = ActivityColumns()
+    columns.add_user("monday", [5, 4, 11], 4)
+    columns.add_user("sunday", [10, 11, 17], 10)
+    columns.add_user("next week", [11, 12, 18], 11)
+    columns.add_user("earlier", [2, 3], 2)
+    return columns
+
+def test_cohort_matrix_counts_only_complete_days():
+    users, days, first_days = activity().arrays()
+    result = cohort_matrix(users, days, first_days, [1, 7], first_week=1, weeks=2, last_complete_day=12)
+    assert result["users"].tolist() == [2, 1]
+    # Day 7 of the Sunday user (day 17) and of next week's user (day 18) is not complete yet
+    assert result["eligible"].tolist() == [[2, 1], [1, 0]]
+    assert result["retained"].tolist() == [[2, 1], [1, 0]]
+
+def test_cohort_matrix_user_mask():
+    columns = activity()
+    users, days, first_days = columns.arrays()
+    result = cohort_matrix(
+        users, days, first_days, [1, 7], first_week=1, weeks=2, last_complete_day=20,
+        user_mask=columns.mask(["sunday", "next week", "unknown"])
+    )
+    assert result["users"].tolist() == [1, 1]
+    assert result["eligible"].tolist() == [[1, 1], [1, 1]]
+    assert result["retained"].tolist() == [[1, 1], [1, 1]]
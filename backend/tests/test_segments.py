@@ -0,0 +1,114 @@
+import asyncio
+from typing import Dict, List, Optional
+from bson import ObjectId
+from app.data_access.interfaces import SegmentDataAccess
+from app.data_access.sqlite import SQLiteEventDataAccess
+from app.models.segment import Segment
+from app.services.analytics.bitmap import Bitmap
+from app.services.segments import SegmentService
+
+class MemorySegmentDao(SegmentDataAccess):
+    """In-memory segment storage with the user index mapping."""
+
+    def __init__(self):
+        self.segments: Dict[str, Segment] = {}
+        self.members: Dict[str, bytes] = {}
+        self.user_indices: Dict[str, int] = {}
+        self.watermark: Optional[str] = None
+
+    async def create_segment(self, segment: Segment) -> Segment:
+        segment.id = str(len(self.segments) + 1)
+        self.segments[segment.id] = segment
+        return segment
+
+    async def get_segment(self, segment_id: str) -> Optional[Segment]:
+        return self.segments.get(segment_id)
+
+    async def list_segments(self) -> List[Segment]:
+        return list(self.segments.values())
+
+    async def delete_segment(self, segment_id: str) -> bool:
+        return self.segments.pop(segment_id, None) is not None
+
+    async def save_segment_members(self, segment: Segment, bitmap: bytes) -> None:
+        self.segments[segment.id] = segment
+        self.members[segment.id] = bitmap
+
+    async def get_segment_members(self, segment_id: str) -> Optional[bytes]:
+        return self.members.get(segment_id)
+
+    async def get_user_indices(self, user_ids: List[str]) -> Dict[str, int]:
+        for user_id in user_ids:
+            self.user_indices.setdefault(user_id, len(self.user_indices))
+        return {user_id: self.user_indices[user_id] for user_id in user_ids}
+
+    async def get_user_ids(self, indices: List[int]) -> List[str]:
+        by_index = {index: user_id for user_id, index in self.user_indices.items()}
+        return [by_index[index] for index in indices]
+
+    async def get_assigned_user_indices(self) -> List[int]:
+        return list(self.user_indices.values())
+
+    async def get_user_index_size(self) -> int:
+        return len(self.user_indices)
+
+    async def get_user_index_watermark(self) -> Optional[str]:
+        return self.watermark
+
+    async def set_user_index_watermark(self, watermark: str) -> None:
+        self.watermark = watermark
+
+def event(user_id: str, timestamp: int, name: str = "Home") -> dict:
+    return {"_id": ObjectId(), "user_id": user_id, "timestamp": timestamp, "name": name, "attributes": {}}
+
+def test_bitmap_set_operations():
+    a = Bitmap.from_indices([0, 3, 9, 200])
+    b = Bitmap.from_indices([3, 4, 200, 1000])
+    assert list((a & b).indices()) == [3, 200]
+    assert list((a | b).indices()) == [0, 3, 4, 9, 200, 1000]
+    assert list((a - b).indices()) == [0, 9]
+    assert list(Bitmap.from_indices([0, 3, 9]).invert(10).indices()) == [1, 2, 4, 5, 6, 7, 8]
+    assert Bitmap.full(5).cardinality() == 5
+    assert 9 in a and 4 not in a
+
+def test_bitmap_round_trips_through_bytes():
+    bitmap = Bitmap.from_indices([7, 1, 65536, 7])
+    assert list(bitmap.indices()) == [1, 7, 65536]
+    assert Bitmap.from_bytes(bitmap.to_bytes()) == bitmap
+    assert Bitmap.from_bytes(Bitmap().to_bytes()).cardinality() == 0
+
+def test_user_index_sync_picks_up_late_events(tmp_path):
+    async def main():
+        event_dao = SQLiteEventDataAccess(str(tmp_path / "events.db"))
+        await event_dao.ensure_indexes()
+        segment_dao = MemorySegmentDao()
+        service = SegmentService(segment_dao, event_dao)
+
+        await event_dao.insert_events([event("a", 5_000), event("b", 6_000)])
+        await service.sync_user_index()
+        first = set(segment_dao.user_indices)
+        # Inserted after the sync, but timestamped before it
+        await event_dao.insert_events([event("c", 1_000)])
+        await service.sync_user_index()
+        return first, set(segment_dao.user_indices), segment_dao.watermark, await event_dao.get_insert_watermark()
+    first, synced, stored, watermark = asyncio.run(main())
+    assert first == {"a", "b"}
+    assert synced == {"a", "b", "c"}
+    assert stored == watermark
+
+def test_not_is_evaluated_against_all_indexed_users(tmp_path):
+    async def main():
+        event_dao = SQLiteEventDataAccess(str(tmp_path / "events.db"))
+        await event_dao.ensure_indexes()
+        segment_dao = MemorySegmentDao()
+        service = SegmentService(segment_dao, event_dao)
+        await event_dao.insert_events([event("a", 1_000, "Buy"), event("b", 2_000), event("c", 3_000, "Buy")])
+
+        buyers = await segment_dao.create_segment(Segment(name="buyers", conditions=[{"event_name": "Buy"}]))
+        await service.compute(buyers.id)
+        others = await segment_dao.create_segment(
+            Segment(name="others", combination={"op": "not", "segment_ids": [buyers.id]})
+        )
+        await service.compute(others.id)
+        return sorted(await service.get_member_ids(buyers.id)), await service.get_member_ids(others.id)
+    assert asyncio.run(main()) == (["a", "c"], ["b"])
@@ -0,0 +1,68 @@
+import random
+import numpy as np
+import pytest
+from app.services.analytics.sessions import APP_LAUNCHED_EVENT, Sessionizer, SessionMode
+
+NAMES = [APP_LAUNCHED_EVENT, "Home", "Cart", "Pay"]
+
+def random_history(rng: random.Random, users: int = 30):
+    """Events sorted by (user, timestamp), with repeated timestamps and exact duplicates."""
+    events = []
+    for user in range(users):
+        timestamp = rng.randrange(10**6)
+        for _ in range(rng.randrange(1, 40)):
+            timestamp += rng.choice([0, 0, 1000, 60_000, 3_600_000])
+            event = {"user": user, "name": rng.choice(NAMES), "timestamp": timestamp}
+            events.append(event)
+            if rng.random() < 0.1:
+                events.append(dict(event))
+    return events
+
+def sessions_from_dicts(sessionizer: Sessionizer, events):
+    sessions = []
+    for user in sorted({event["user"] for event in events}):
+        history = [event for event in events if event["user"] == user]
+        sessions.extend(
+            [(event["user"], event["name"], event["timestamp"]) for event in session]
+            for session in sessionizer.split(history)
+        )
+    return sessions
+
+def sessions_from_columns(sessionizer: Sessionizer, events):
+    users = np.array([event["user"] for event in events], dtype=np.int64)
+    names = np.array([NAMES.index(event["name"]) for event in events], dtype=np.int64)
+    timestamps = np.array([event["timestamp"] for event in events], dtype=np.int64)
+    positions, session_ids = sessionizer.split_columns(users, names, timestamps, launch_code=0)
+    sessions = [[] for _ in range(int(session_ids.max()) + 1 if len(session_ids) else 0)]
+    for position, session in zip(positions, session_ids):
+        event = events[position]
+        sessions[session].append((event["user"], event["name"], event["timestamp"]))
+    return sessions
+
+@pytest.mark.parametrize("mode, gap_ms", [
+    (SessionMode.LAUNCH, None),
+    (SessionMode.INACTIVITY, 30 * 60 * 1000),
+    (SessionMode.HYBRID, 30 * 60 * 1000)
+])
+@pytest.mark.parametrize("seed", range(5))
+def test_split_columns_matches_split(mode, gap_ms, seed):
+    sessionizer = Sessionizer(mode, gap_ms=gap_ms)
+    events = random_history(random.Random(seed))
+    assert sessions_from_columns(sessionizer, events) == sessions_from_dicts(sessionizer, events)
+
+def test_duplicates_are_dropped_and_launch_starts_a_session():
+    events = [
+        {"name": "Home", "timestamp": 1},
+        {"name": "Home", "timestamp": 1},
+        {"name": "Cart", "timestamp": 1},
+        {"name": APP_LAUNCHED_EVENT, "timestamp": 2},
+        {"name": "Pay", "timestamp": 3}
+    ]
+    sessions = list(Sessionizer().split(events))
+    assert [[event["name"] for event in session] for session in sessions] == [
+        ["Home", "Cart"], [APP_LAUNCHED_EVENT, "Pay"]
+    ]
+
+def test_inactivity_mode_requires_a_gap():
+    with pytest.raises(ValueError):
+        Sessionizer(SessionMode.INACTIVITY)
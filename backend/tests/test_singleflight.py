@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+from starlette.requests import Request
+from app.core.cancellation import current_operation
+from app.core.singleflight import SingleFlight, request_key
+
+class Work:
+    """Factory that counts its calls and blocks until released."""
+
+    def __init__(self, result="done", error: Exception = None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.operations = []
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        self.operations.append(current_operation.get())
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.result
+
+def test_concurrent_calls_share_one_computation():
+    async def main():
+        flights = SingleFlight("test", ttl_seconds=60, max_size=10)
+        work = Work()
+        callers = [asyncio.create_task(flights.run("key", work, "op")) for _ in range(3)]
+        await asyncio.sleep(0)
+        work.release.set()
+        results = await asyncio.gather(*callers)
+        # Served from the results cache afterwards
+        again = await flights.run("key", work, "op")
+        return results, again, work
+    results, again, work = asyncio.run(main())
+    assert results == ["done"] * 3
+    assert again == "done"
+    assert work.calls == 1
+    assert work.operations[0].startswith("op:")
+
+def test_results_expire_and_errors_are_not_cached():
+    async def main():
+        flights = SingleFlight("test", ttl_seconds=0.05, max_size=10)
+        work = Work()
+        work.release.set()
+        await flights.run("key", work, "op")
+        await asyncio.sleep(0.1)
+        await flights.run("key", work, "op")
+
+        failing = Work(error=ValueError("boom"))
+        failing.release.set()
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                await flights.run("failing", failing, "op")
+        return work.calls, failing.calls
+    assert asyncio.run(main()) == (2, 2)
+
+def test_work_is_only_cancelled_once_every_caller_is_gone():
+    async def main():
+        killed = []
+
+        async def on_cancel(operation_id):
+            killed.append(operation_id)
+            return 1
+
+        flights = SingleFlight("test", ttl_seconds=60, max_size=10, on_cancel=on_cancel)
+        work = Work()
+        first = asyncio.create_task(flights.run("key", work, "op"))
+        second = asyncio.create_task(flights.run("key", work, "op"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        still_running = not work.cancelled
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        await asyncio.sleep(0)
+        return still_running, work, killed
+    still_running, work, killed = asyncio.run(main())
+    assert still_running
+    assert work.cancelled
+    assert killed == work.operations
+
+def request(query: bytes) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/api/v1/events/names", "query_string": query, "headers": []})
+
+def test_request_key_ignores_query_order():
+    assert request_key(request(b"a=1&b=2")) == request_key(request(b"b=2&a=1"))
+    assert request_key(request(b"a=1")) != request_key(request(b"a=2"))
+    assert request_key(request(b""), {"x": 1, "y": 2}) == request_key(request(b""), {"y": 2, "x": 1})
@@ -0,0 +1,46 @@
+import pytest
+from app.services import wire
+from app.services.wire import ContentEncoding, WireFormat, decode_flows, encode_flows, negotiate, to_columns
+
+pytestmark = pytest.mark.skipif(wire.msgpack is None, reason="msgpack not installed (wire extra)")
+
+FLOWS = [
+    {
+        "user_id": "u1",
+        "flow": [
+            {"event_name": "App Launched", "event_attributes": {}, "timestamp": 1_700_000_000_000},
+            {"event_name": "Home", "event_attributes": {"tab": "feed", "count": 3}, "timestamp": 1_700_000_001_500},
+            {"event_name": "Home", "event_attributes": {}, "timestamp": 1_700_000_001_500}
+        ]
+    },
+    {
+        "user_id": "u2",
+        "flow": [{"event_name": "Home", "event_attributes": {}, "timestamp": 1_700_000_100_000}]
+    },
+    {"user_id": "u1", "flow": []}
+]
+
+@pytest.mark.parametrize("encoding", [
+    ContentEncoding.IDENTITY,
+    ContentEncoding.GZIP,
+    pytest.param(ContentEncoding.ZSTD, marks=pytest.mark.skipif(wire.zstandard is None, reason="zstandard not installed"))
+])
+def test_round_trip(encoding):
+    assert decode_flows(encode_flows(FLOWS, encoding), encoding) == FLOWS
+
+def test_columns_use_dictionaries_and_deltas():
+    columns = to_columns(FLOWS)
+    assert columns["names"] == ["App Launched", "Home"]
+    assert columns["users"] == ["u1", "u2"]
+    first = columns["flows"][0]
+    assert first["names"] == [0, 1, 1]
+    assert first["deltas"] == [0, 1500, 0]
+    assert "attributes" not in columns["flows"][1]
+
+def test_negotiation():
+    assert negotiate(None, None) == (WireFormat.JSON, ContentEncoding.IDENTITY)
+    assert negotiate("*/*", "gzip") == (WireFormat.JSON, ContentEncoding.IDENTITY)
+    assert negotiate("application/json, application/msgpack;q=0.5", None)[0] == WireFormat.JSON
+    assert negotiate("application/msgpack", None) == (WireFormat.MSGPACK, ContentEncoding.IDENTITY)
+    assert negotiate("application/msgpack", "gzip, deflate") == (WireFormat.MSGPACK, ContentEncoding.GZIP)
+    assert negotiate("application/msgpack;q=0", None)[0] == WireFormat.JSON